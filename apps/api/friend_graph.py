@@ -0,0 +1,68 @@
+"""
+Граф дружбы: множества id друзей пользователей.
+
+Множество принятых друзей пользователя хранится в кэше
+(settings.FRIEND_GRAPH) и сбрасывается сигналами при изменении заявки
+в друзья, поэтому списки друзей, лидерборд друзей и чат получают его без
+обхода заявок в друзья, а пользователей загружают одним in_bulk.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.api_auth.models import UserModel
+from .models import FriendEdge
+
+
+DEFAULT_FRIEND_GRAPH_SETTINGS = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 3600,  # секунды
+}
+
+
+def get_friend_graph_settings():
+    return {**DEFAULT_FRIEND_GRAPH_SETTINGS, **getattr(settings, 'FRIEND_GRAPH', {})}
+
+
+def _get_cache():
+    return caches[get_friend_graph_settings()['CACHE_ALIAS']]
+
+
+def _cache_key(user_id):
+    return f'api:friend_ids:{user_id}'
+
+
+def load_friend_ids(user_id):
+    """Друзья пользователя из базы по ребрам графа дружбы"""
+    return set(
+        FriendEdge.objects.filter(user_id=user_id).values_list('friend_id', flat=True)
+    )
+
+
+def get_friend_ids(user_id):
+    """Множество id друзей пользователя из кэша"""
+    cache = _get_cache()
+    friend_ids = cache.get(_cache_key(user_id))
+    if friend_ids is None:
+        friend_ids = load_friend_ids(user_id)
+        cache.set(_cache_key(user_id), friend_ids, get_friend_graph_settings()['TIMEOUT'])
+    return friend_ids
+
+
+def are_friends(user_id, other_id):
+    return other_id in get_friend_ids(user_id)
+
+
+def get_friends(user_id, include_self=False):
+    """
+    Друзья пользователя одним запросом, упорядоченные по id.
+    include_self добавляет в список самого пользователя
+    """
+    ids = set(get_friend_ids(user_id))
+    if include_self:
+        ids.add(user_id)
+    users = UserModel.objects.in_bulk(ids)
+    return [users[user_id] for user_id in sorted(users)]
+
+
+def invalidate_friend_ids(*user_ids):
+    _get_cache().delete_many([_cache_key(user_id) for user_id in user_ids])
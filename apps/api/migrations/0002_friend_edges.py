@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_friend_edges(apps, schema_editor):
+    Friendship = apps.get_model('api', 'Friendship')
+    FriendEdge = apps.get_model('api', 'FriendEdge')
+
+    pairs = set()
+    for from_id, to_id in Friendship.objects.filter(
+        status='accepted'
+    ).values_list('from_user_id', 'to_user_id').iterator():
+        pairs.add((from_id, to_id))
+        pairs.add((to_id, from_id))
+
+    FriendEdge.objects.bulk_create(
+        [FriendEdge(user_id=user_id, friend_id=friend_id) for user_id, friend_id in pairs],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        ('api_auth', '0007_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['from_user', 'status'], name='api_friends_from_us_9722e8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['to_user', 'status'], name='api_friends_to_user_4d930d_idx'),
+        ),
+        migrations.AddField(
+            model_name='friendedge',
+            name='friend',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api_auth.usermodel'),
+        ),
+        migrations.AddField(
+            model_name='friendedge',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_edges', to='api_auth.usermodel'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='friendedge',
+            unique_together={('user', 'friend')},
+        ),
+        migrations.RunPython(fill_friend_edges, migrations.RunPython.noop),
+    ]
@@ -25,7 +25,56 @@ class Friendship(models.Model):
 
     class Meta:
         unique_together = ("from_user", "to_user")  
+        indexes = [
+            models.Index(fields=["from_user", "status"]),
+            models.Index(fields=["to_user", "status"]),
+        ]
 
     def __str__(self):
         return f"{self.from_user} -> {self.to_user} ({self.status})"
+
+
+class FriendEdge(models.Model):
+    """
+    Симметричное ребро графа дружбы: по строке на каждое направление
+    принятой заявки, чтобы проверка дружбы и список друзей были одним
+    поиском по индексу (user, friend). Поддерживается сигналами Friendship
+    """
+    user = models.ForeignKey(
+        UserModel, related_name="friend_edges",
+        on_delete=models.CASCADE
+    )
+    friend = models.ForeignKey(
+        UserModel, related_name="+",
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        unique_together = ("user", "friend")
+
+    def __str__(self):
+        return f"{self.user_id} <-> {self.friend_id}"
+
+    @classmethod
+    def sync_pair(cls, user_id, other_id):
+        """
+        Приводит ребра пары пользователей в соответствие с заявками:
+        ребра есть, если хотя бы одна заявка между ними принята
+        """
+        accepted = Friendship.objects.filter(
+            models.Q(from_user_id=user_id, to_user_id=other_id) |
+            models.Q(from_user_id=other_id, to_user_id=user_id),
+            status="accepted"
+        ).exists()
+
+        if accepted:
+            cls.objects.bulk_create([
+                cls(user_id=user_id, friend_id=other_id),
+                cls(user_id=other_id, friend_id=user_id),
+            ], ignore_conflicts=True)
+        else:
+            cls.objects.filter(
+                models.Q(user_id=user_id, friend_id=other_id) |
+                models.Q(user_id=other_id, friend_id=user_id)
+            ).delete()
     
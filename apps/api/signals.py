@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .friend_graph import invalidate_friend_ids
+from .models import Friendship, FriendEdge
+from .utils import invalidate_friend_recommendations
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def sync_friend_edges(sender, instance, **kwargs):
+    """Ребра графа дружбы следуют за статусом заявки"""
+    FriendEdge.sync_pair(instance.from_user_id, instance.to_user_id)
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_cached_recommendations(sender, instance, **kwargs):
+    """Рекомендации обоих пользователей устаревают при изменении заявки"""
+    invalidate_friend_recommendations(instance.from_user_id, instance.to_user_id)
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_cached_friend_ids(sender, instance, **kwargs):
+    """
+    Списки друзей обоих пользователей сбрасываются после коммита, чтобы
+    параллельный запрос не закэшировал состояние до изменения
+    """
+    user_ids = (instance.from_user_id, instance.to_user_id)
+    transaction.on_commit(lambda: invalidate_friend_ids(*user_ids))
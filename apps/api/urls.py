@@ -9,6 +9,7 @@ urlpatterns = [
     # friendships
     path('friends/add/', views.FriendshipViewSet.as_view()),
     path('friends/', views.UserFrendsView.as_view()),
+    path('friends/list/', views.UserFriendListView.as_view()),
     path('friends/recommendations/', views.UserFrensReomendationView.as_view()),
     path('friends/requests/', views.UserFrensRequests.as_view()),
     path('friends/search/', views.UserSearchView.as_view()),
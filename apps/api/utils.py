@@ -0,0 +1,210 @@
+"""
+Рекомендации друзей на основе графа дружбы.
+
+Кандидаты - только друзья друзей (взаимные друзья считаются по одной
+выборке ребер графа), пользователи с общими интересами и небольшой пул
+активных пользователей высокого уровня. Готовый рейтинг кэшируется на
+пользователя (settings.FRIEND_RECOMMENDATIONS) и сбрасывается при
+изменении его заявок в друзья.
+"""
+import random
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+from apps.api_auth.models import UserModel, UserInterest, normalize_interests
+from server.cache import StaleWhileRevalidateCache
+from .models import Friendship, FriendEdge
+
+
+DEFAULT_FRIEND_RECOMMENDATION_SETTINGS = {
+    'CACHE_ALIAS': 'default',
+    'FRESH_TIMEOUT': 300,  # секунды
+    'STALE_TIMEOUT': 3600,  # секунды
+    'MAX_RESULTS': 50,  # Сколько рекомендаций хранить в кэше
+}
+
+MUTUAL_FRIEND_SCORE = 3  # Баллов за каждого взаимного друга
+COMMON_INTEREST_SCORE = 2  # Баллов за каждый общий интерес
+MAX_LEVEL_BONUS = 5
+ACTIVE_LEVEL = 10  # С этого уровня пользователь считается активным
+
+
+def get_friend_recommendation_settings():
+    return {
+        **DEFAULT_FRIEND_RECOMMENDATION_SETTINGS,
+        **getattr(settings, 'FRIEND_RECOMMENDATIONS', {}),
+    }
+
+
+class FriendRecommendationEngine:
+    """
+    Рекомендации друзей: друзья друзей, общие интересы, активность
+    """
+
+    def recommend(self, user, limit=50):
+        """
+        Возвращает список словарей {'user_id', 'score', 'reasons',
+        'mutual_friends_count', 'common_interests'} по убыванию score
+        """
+        friend_ids, excluded_ids = self._get_relations(user)
+        excluded_ids.add(user.id)
+
+        mutual_friends = self._get_mutual_friends(friend_ids, excluded_ids)
+        user_interests = normalize_interests(user.interests)
+        interest_matches = self._get_interest_matches(user_interests, excluded_ids)
+
+        candidate_ids = set(mutual_friends) | set(interest_matches)
+        candidate_ids.update(self._get_active_users(excluded_ids, limit * 3))
+
+        candidates = UserModel.objects.filter(
+            id__in=candidate_ids, is_active=True
+        ).only('id', 'level')
+
+        recommendations = []
+        for candidate in candidates:
+            recommendation = self._score(
+                candidate,
+                mutual_friends.get(candidate.id, ()),
+                interest_matches.get(candidate.id, ())
+            )
+            if recommendation['score'] > 0:
+                recommendations.append(recommendation)
+
+        # Сортируем по скору и добавляем случайность для равных скоров
+        recommendations.sort(key=lambda x: (x['score'], random.random()), reverse=True)
+        return recommendations[:limit]
+
+    def _get_relations(self, user):
+        """
+        Одним запросом получает друзей пользователя и всех, с кем
+        у него уже есть заявки в любом статусе
+        """
+        friend_ids = set()
+        related_ids = set()
+        for from_id, to_id, status in Friendship.objects.filter(
+            Q(from_user=user) | Q(to_user=user)
+        ).values_list('from_user_id', 'to_user_id', 'status'):
+            other_id = to_id if from_id == user.id else from_id
+            related_ids.add(other_id)
+            if status == 'accepted':
+                friend_ids.add(other_id)
+        return friend_ids, related_ids
+
+    def _get_mutual_friends(self, friend_ids, excluded_ids):
+        """
+        Друзья друзей: {id кандидата: множество общих друзей}.
+        Все ребра второго уровня выбираются одним запросом
+        """
+        if not friend_ids:
+            return {}
+
+        mutual_friends = defaultdict(set)
+        for friend_id, candidate_id in FriendEdge.objects.filter(
+            user_id__in=friend_ids
+        ).exclude(
+            friend_id__in=excluded_ids
+        ).values_list('user_id', 'friend_id'):
+            mutual_friends[candidate_id].add(friend_id)
+        return mutual_friends
+
+    def _get_interest_matches(self, user_interests, excluded_ids):
+        """{id кандидата: общие интересы} по индексу UserInterest"""
+        if not user_interests:
+            return {}
+
+        matches = defaultdict(list)
+        for candidate_id, term in UserInterest.objects.filter(
+            term__in=user_interests,
+            user__is_active=True
+        ).exclude(
+            user_id__in=excluded_ids
+        ).order_by('term').values_list('user_id', 'term'):
+            matches[candidate_id].append(term)
+        return matches
+
+    def _get_active_users(self, excluded_ids, limit):
+        """Пользователи высокого уровня на случай, если связей мало"""
+        return UserModel.objects.filter(
+            is_active=True, level__gt=0
+        ).exclude(
+            id__in=excluded_ids
+        ).order_by('-level').values_list('id', flat=True)[:limit]
+
+    def _score(self, candidate, mutual_friends, common_interests):
+        """Вычисляет скор рекомендации для потенциального друга"""
+        score = 0
+        reasons = []
+
+        # 1. Общие интересы
+        if common_interests:
+            score += len(common_interests) * COMMON_INTEREST_SCORE
+            reasons.append(
+                f"Общие интересы: {', '.join(common_interests[:3])}"
+                f"{'...' if len(common_interests) > 3 else ''}"
+            )
+
+        # 2. Взаимные друзья (друзья друзей)
+        if mutual_friends:
+            score += len(mutual_friends) * MUTUAL_FRIEND_SCORE
+            if len(mutual_friends) == 1:
+                reasons.append("1 общий друг")
+            else:
+                reasons.append(f"{len(mutual_friends)} общих друзей")
+
+        # 3. Бонус за активность (уровень пользователя)
+        if candidate.level > 0:
+            score += min(candidate.level * 0.5, MAX_LEVEL_BONUS)
+            if candidate.level >= ACTIVE_LEVEL:
+                reasons.append(f"Активный пользователь (уровень {candidate.level})")
+
+        # 4. Небольшой случайный фактор для разнообразия
+        if score > 0:
+            score += random.uniform(0, 1)
+
+        return {
+            'user_id': candidate.id,
+            'score': round(score, 2),
+            'reasons': reasons,
+            'mutual_friends_count': len(mutual_friends),
+            'common_interests': list(common_interests),
+        }
+
+
+_recommendations_cache = None
+_recommendations_cache_lock = threading.Lock()
+
+
+def _compute_recommendations(user_id):
+    options = get_friend_recommendation_settings()
+    user = UserModel.objects.get(id=user_id)
+    return FriendRecommendationEngine().recommend(user, limit=options['MAX_RESULTS'])
+
+
+def get_recommendations_cache():
+    global _recommendations_cache
+    if _recommendations_cache is None:
+        with _recommendations_cache_lock:
+            if _recommendations_cache is None:
+                options = get_friend_recommendation_settings()
+                _recommendations_cache = StaleWhileRevalidateCache(
+                    'api:friend_recommendations',
+                    _compute_recommendations,
+                    fresh_timeout=options['FRESH_TIMEOUT'],
+                    stale_timeout=options['STALE_TIMEOUT'],
+                    cache_alias=options['CACHE_ALIAS'],
+                )
+    return _recommendations_cache
+
+
+def get_friend_recommendations(user):
+    """Рекомендации друзей для пользователя из кэша"""
+    return get_recommendations_cache().get(user.id)
+
+
+def invalidate_friend_recommendations(*user_ids):
+    cache = get_recommendations_cache()
+    for user_id in user_ids:
+        cache.invalidate(user_id)
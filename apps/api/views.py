@@ -8,14 +8,18 @@ def index(request):
 from rest_framework.views import APIView
 from .models import Friendship
 from .serializers import FriendshipSerializer, UserRecommendationSerializer
+from .friend_graph import get_friends
+from .utils import get_friend_recommendations, get_friend_recommendation_settings
 
 from apps.api_auth.decorators import token_required
 from apps.api_auth.models import UserModel
+from apps.api_auth.search import user_search_index
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Count, Q
 from collections import defaultdict
-import random
+from server.pagination import KeysetPagination
+from server.search import parse_terms
 
 
 class FriendshipViewSet(APIView):
@@ -79,9 +83,22 @@ class UserFrendsView(APIView):
         user = request.user
         friendships = Friendship.objects.filter(
             Q(from_user=user) | Q(to_user=user)
-        )
+        ).select_related('from_user', 'to_user')
         serializer = FriendshipSerializer(friendships, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class UserFriendListView(APIView):
+    @token_required
+    def get(self, request):
+        """Принятые друзья пользователя из кэша графа дружбы, одним запросом"""
+        from .serializers import UserBasicSerializer
+        friends = get_friends(request.user.id)
+        serializer = UserBasicSerializer(friends, many=True, context={'request': request})
+        return Response({
+            "friends": serializer.data,
+            "count": len(friends)
+        }, status=status.HTTP_200_OK)
     
 class UserFrensRequests(APIView):
     @token_required
@@ -91,12 +108,12 @@ class UserFrensRequests(APIView):
         # Входящие запросы (кто отправил запрос текущему пользователю)
         incoming_requests = Friendship.objects.filter(
             Q(to_user=user) & Q(status="pending")
-        )
+        ).select_related('from_user', 'to_user')
         
         # Исходящие запросы (кому текущий пользователь отправил запрос)
         outgoing_requests = Friendship.objects.filter(
             Q(from_user=user) & Q(status="pending")
-        )
+        ).select_related('from_user', 'to_user')
         
         incoming_serializer = FriendshipSerializer(incoming_requests, many=True)
         outgoing_serializer = FriendshipSerializer(outgoing_requests, many=True)
@@ -112,198 +129,69 @@ class UserFrensReomendationView(APIView):
     @token_required
     def get(self, request):
         user = request.user
-        limit = int(request.GET.get('limit', 10))  # Лимит рекомендаций
-        
-        # Получаем всех друзей пользователя (принятые заявки)
-        user_friends = self._get_user_friends(user)
-        user_friend_ids = [friend.id for friend in user_friends]
-        
-        # Получаем всех пользователей, исключая текущего и его друзей
-        potential_friends = UserModel.objects.exclude(
-            Q(id=user.id) | Q(id__in=user_friend_ids)
-        ).filter(is_active=True)
-        
-        # Исключаем пользователей с которыми уже есть заявки в дружбу
-        existing_requests = Friendship.objects.filter(
-            Q(from_user=user) | Q(to_user=user)
-        ).values_list('from_user_id', 'to_user_id')
-        
-        excluded_ids = set()
-        for from_id, to_id in existing_requests:
-            if from_id != user.id:
-                excluded_ids.add(from_id)
-            if to_id != user.id:
-                excluded_ids.add(to_id)
-        
-        potential_friends = potential_friends.exclude(id__in=excluded_ids)
-        
-        # Вычисляем рекомендации для каждого потенциального друга
-        recommendations = []
-        for potential_friend in potential_friends:
-            score_data = self._calculate_recommendation_score(
-                user, potential_friend, user_friends
-            )
-            if score_data['score'] > 0:  # Только если есть хоть какая-то связь
-                # Добавляем дополнительные поля к объекту пользователя
-                potential_friend.recommendation_score = score_data['score']
-                potential_friend.recommendation_reasons = score_data['reasons']
-                potential_friend.mutual_friends_count = score_data['mutual_friends_count']
-                potential_friend.common_interests = score_data['common_interests']
-                recommendations.append(potential_friend)
-        
-        # Сортируем по скору и добавляем случайность для равных скоров
-        recommendations.sort(key=lambda x: (x.recommendation_score, random.random()), reverse=True)
-        
-        # Ограничиваем количество рекомендаций
-        recommendations = recommendations[:limit]
+        max_results = get_friend_recommendation_settings()['MAX_RESULTS']
+        try:
+            limit = int(request.GET.get('limit', 10))  # Лимит рекомендаций
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, max_results))
+        
+        # Рейтинг считается по графу дружбы и кэшируется на пользователя
+        recommendations = get_friend_recommendations(user)[:limit]
+        
+        users = UserModel.objects.in_bulk([r['user_id'] for r in recommendations])
+        recommended_users = []
+        for recommendation in recommendations:
+            recommended_user = users.get(recommendation['user_id'])
+            if recommended_user is None:
+                continue
+            # Добавляем дополнительные поля к объекту пользователя
+            recommended_user.recommendation_score = recommendation['score']
+            recommended_user.recommendation_reasons = recommendation['reasons']
+            recommended_user.mutual_friends_count = recommendation['mutual_friends_count']
+            recommended_user.common_interests = recommendation['common_interests']
+            recommended_users.append(recommended_user)
         
         # Сериализуем результат
         serializer = UserRecommendationSerializer(
-            recommendations, many=True, context={'request': request}
+            recommended_users, many=True, context={'request': request}
         )
         
         return Response({
             'recommendations': serializer.data,
-            'total_count': len(recommendations),
-            'algorithm_version': '1.0'
+            'total_count': len(recommended_users),
+            'algorithm_version': '2.0'
         }, status=status.HTTP_200_OK)
-    
-    def _get_user_friends(self, user):
-        """Получает всех друзей пользователя (принятые заявки)"""
-        friend_relationships = Friendship.objects.filter(
-            Q(from_user=user, status='accepted') | Q(to_user=user, status='accepted')
-        )
-        
-        friends = []
-        for relationship in friend_relationships:
-            if relationship.from_user == user:
-                friends.append(relationship.to_user)
-            else:
-                friends.append(relationship.from_user)
-        
-        return friends
-    
-    def _calculate_recommendation_score(self, user, potential_friend, user_friends):
-        """Вычисляет скор рекомендации для потенциального друга"""
-        score = 0
-        reasons = []
-        common_interests = []
-        mutual_friends_count = 0
-        
-        # 1. Анализ общих интересов
-        if user.interests and potential_friend.interests:
-            user_interests = self._extract_interests(user.interests)
-            friend_interests = self._extract_interests(potential_friend.interests)
-            
-            common = set(user_interests) & set(friend_interests)
-            if common:
-                common_interests = list(common)
-                interest_score = len(common) * 2  # 2 балла за каждый общий интерес
-                score += interest_score
-                reasons.append(f"Общие интересы: {', '.join(list(common)[:3])}{'...' if len(common) > 3 else ''}")
-        
-        # 2. Анализ взаимных друзей (друзья друзей)
-        potential_friend_friends = self._get_user_friends(potential_friend)
-        mutual_friends = set(friend.id for friend in user_friends) & set(friend.id for friend in potential_friend_friends)
-        
-        if mutual_friends:
-            mutual_friends_count = len(mutual_friends)
-            mutual_score = len(mutual_friends) * 3  # 3 балла за каждого взаимного друга
-            score += mutual_score
-            
-            if len(mutual_friends) == 1:
-                reasons.append("1 общий друг")
-            else:
-                reasons.append(f"{len(mutual_friends)} общих друзей")
-        
-        # 3. Бонус за активность (уровень пользователя)
-        if potential_friend.level > 0:
-            level_bonus = min(potential_friend.level * 0.5, 5)  # Максимум 5 баллов
-            score += level_bonus
-            if potential_friend.level >= 10:
-                reasons.append(f"Активный пользователь (уровень {potential_friend.level})")
-        
-        # 4. Небольшой случайный фактор для разнообразия
-        if score > 0:
-            score += random.uniform(0, 1)
-        
-        # 5. Если нет явных связей, но пользователь активен - минимальный скор
-        if score == 0 and potential_friend.level > 0:
-            score = 0.1
-            reasons.append("Новый пользователь")
-        
-        return {
-            'score': round(score, 2),
-            'reasons': reasons,
-            'common_interests': common_interests,
-            'mutual_friends_count': mutual_friends_count
-        }
-    
-    def _extract_interests(self, interests_data):
-        """Извлекает список интересов из JSON поля"""
-        if isinstance(interests_data, dict):
-            all_interests = []
-            for category, items in interests_data.items():
-                if isinstance(items, list):
-                    all_interests.extend([item.lower().strip() for item in items if item])
-                elif isinstance(items, str):
-                    all_interests.append(items.lower().strip())
-            return all_interests
-        elif isinstance(interests_data, list):
-            return [item.lower().strip() for item in interests_data if item]
-        return []
+
+
+class UserSearchPagination(KeysetPagination):
+    """
+    Курсорная пагинация результатов поиска по (релевантность, id)
+    """
+    page_size = 20
+    max_page_size = 50
+    ordering = ('-search_rank', 'id')
 
 
 class UserSearchView(APIView):
     @token_required
     def get(self, request):
-        """Поиск пользователей по email, имени и интересам"""
+        """Поиск пользователей по имени, интересам и email через полнотекстовый индекс"""
         query = request.query_params.get('q', '').strip()
         
-        if not query:
+        if not parse_terms(query):
             return Response({"error": "Search query is required"}, status=status.HTTP_400_BAD_REQUEST)
         
         # Исключаем текущего пользователя из результатов поиска
         users = UserModel.objects.exclude(id=request.user.id)
+        search_results = user_search_index.search(users, query).order_by('-search_rank', 'id')
         
-        # Поиск по email, имени пользователя и полному имени
-        name_email_filter = Q(email__icontains=query) | Q(username__icontains=query) | Q(full_name__icontains=query)
-        
-        # Поиск по интересам
-        interests_filter = Q()
-        query_lower = query.lower()
-        
-        # Ищем пользователей, у которых в интересах есть совпадения
-        for user in UserModel.objects.exclude(id=request.user.id):
-            if user.interests:
-                user_interests = self._extract_interests(user.interests)
-                if any(query_lower in interest for interest in user_interests):
-                    interests_filter |= Q(id=user.id)
-        
-        # Объединяем все фильтры
-        final_filter = name_email_filter | interests_filter
-        search_results = users.filter(final_filter).distinct()[:20]  # Ограничиваем результаты
+        paginator = UserSearchPagination()
+        page = paginator.paginate_queryset(search_results, request, view=self)
         
         # Сериализуем результаты
         from .serializers import UserBasicSerializer
-        serializer = UserBasicSerializer(search_results, many=True, context={'request': request})
+        serializer = UserBasicSerializer(page, many=True, context={'request': request})
         
-        return Response({
-            "results": serializer.data,
-            "count": len(serializer.data)
-        }, status=status.HTTP_200_OK)
-    
-    def _extract_interests(self, interests_data):
-        """Извлекает список интересов из JSON поля"""
-        if isinstance(interests_data, dict):
-            all_interests = []
-            for category, items in interests_data.items():
-                if isinstance(items, list):
-                    all_interests.extend([item.lower().strip() for item in items if item])
-                elif isinstance(items, str):
-                    all_interests.append(items.lower().strip())
-            return all_interests
-        elif isinstance(interests_data, list):
-            return [item.lower().strip() for item in interests_data if item]
-        return []
+        return paginator.get_paginated_response(serializer.data)
         
\ No newline at end of file
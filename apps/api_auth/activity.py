@@ -0,0 +1,232 @@
+"""
+Write-behind tracking of UserModel.last_active.
+
+Authenticated requests only record a touch in a buffer; touches are
+coalesced per user and written with a single bulk UPDATE by flush().
+Configured via settings.LAST_ACTIVE_TRACKING:
+
+- BACKEND 'redis' (default) keeps the buffer in a Redis hash shared by
+  all processes, flushed by the flush_last_active Celery task / command;
+- BACKEND 'memory' (development only) keeps the buffer in the process
+  and flushes it from requests every FLUSH_INTERVAL seconds and at exit.
+  The task and the command cannot reach such a buffer and skip it.
+
+Touches closer than STALENESS seconds to the last known activity are
+dropped, so last_active is accurate to within that window.
+
+Drained touches are removed from the buffer only after the UPDATE commits.
+On failure the memory buffer takes them back, and the Redis buffer leaves
+them in place for a later flush to claim after RECOVERY_DELAY seconds.
+"""
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .models import UserModel
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LAST_ACTIVE_SETTINGS = {
+    'BACKEND': 'redis',
+    'STALENESS': 60,
+    'FLUSH_INTERVAL': 30,
+    'RECOVERY_DELAY': 600,
+    'REDIS_KEY': 'kadio:last_active',
+}
+
+FLUSH_BATCH_SIZE = 500
+
+
+class MemoryActivityBuffer:
+    """
+    Buffer of pending touches inside the current process
+    """
+    shared = False
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def record(self, user_id, timestamp):
+        with self._lock:
+            self._record(user_id, timestamp)
+
+    def _record(self, user_id, timestamp):
+        current = self._pending.get(user_id)
+        if current is None or current < timestamp:
+            self._pending[user_id] = timestamp
+
+    @contextmanager
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            yield pending
+        except Exception:
+            # Запись не удалась - возвращаем касания в буфер
+            with self._lock:
+                for user_id, timestamp in pending.items():
+                    self._record(user_id, timestamp)
+            raise
+
+
+class RedisActivityBuffer:
+    """
+    Buffer of pending touches in a Redis hash: user_id -> unix timestamp
+    """
+    shared = True
+
+    def __init__(self, key, recovery_delay):
+        self.key = key
+        self.recovery_delay = recovery_delay
+
+    @property
+    def client(self):
+        from server.redis_client import get_redis_client
+
+        return get_redis_client()
+
+    def record(self, user_id, timestamp):
+        self.client.hset(self.key, user_id, timestamp.timestamp())
+
+    @contextmanager
+    def drain(self):
+        from server.redis_client import claim_buffer_keys
+
+        # Атомарно забираем накопленный хэш, новые касания пишутся уже в новый ключ.
+        # Забранные ключи удаляются только после успешной записи в базу
+        with claim_buffer_keys(self.client, self.key, self.recovery_delay) as keys:
+            pending = {}
+            for key in keys:
+                for user_id, ts in self.client.hgetall(key).items():
+                    user_id = int(user_id)
+                    timestamp = datetime.fromtimestamp(float(ts), tz=dt_timezone.utc)
+                    if user_id not in pending or pending[user_id] < timestamp:
+                        pending[user_id] = timestamp
+            yield pending
+
+
+class LastActiveTracker:
+    """
+    Records user activity and periodically writes it to the database
+    """
+
+    def __init__(self, buffer, staleness, flush_interval, auto_flush):
+        self.buffer = buffer
+        self.staleness = timedelta(seconds=staleness)
+        self.flush_interval = flush_interval
+        self.auto_flush = auto_flush
+        self._recorded = {}
+        self._last_prune = time.monotonic()
+        self._last_flush = time.monotonic()
+        self._flush_lock = threading.Lock()
+
+    def touch(self, user):
+        """Records activity of the user, skipping touches inside the staleness window"""
+        now = timezone.now()
+        last_seen = self._recorded.get(user.pk)
+        if user.last_active and (last_seen is None or user.last_active > last_seen):
+            last_seen = user.last_active
+
+        if last_seen is not None and now - last_seen < self.staleness:
+            user.last_active = last_seen
+        else:
+            self.buffer.record(user.pk, now)
+            self._recorded[user.pk] = now
+            user.last_active = now
+
+        # Без auto_flush (бэкенд redis) flush() в веб-процессе не вызывается,
+        # поэтому устаревшие отметки чистятся здесь, раз в окно STALENESS
+        if time.monotonic() - self._last_prune >= self.staleness.total_seconds():
+            self._forget_stale()
+
+        if self.auto_flush and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffered touches with bulk UPDATE statements.
+        Returns the number of updated users.
+        """
+        if not self._flush_lock.acquire(blocking=False):
+            # Сброс уже выполняется в другом потоке
+            return 0
+        try:
+            self._last_flush = time.monotonic()
+
+            with self.buffer.drain() as pending:
+                if not pending:
+                    return 0
+
+                items = list(pending.items())
+                updated = 0
+                with transaction.atomic():
+                    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+                        batch = items[start:start + FLUSH_BATCH_SIZE]
+                        updated += UserModel.objects.filter(
+                            pk__in=[user_id for user_id, _ in batch]
+                        ).update(
+                            last_active=Case(
+                                *[When(pk=user_id, then=Value(ts)) for user_id, ts in batch],
+                                output_field=DateTimeField(),
+                            )
+                        )
+                return updated
+        finally:
+            self._flush_lock.release()
+
+    def _forget_stale(self):
+        self._last_prune = time.monotonic()
+        threshold = timezone.now() - self.staleness
+        self._recorded = {
+            user_id: ts for user_id, ts in list(self._recorded.items()) if ts >= threshold
+        }
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def _flush_at_exit(tracker):
+    try:
+        tracker.flush()
+    except Exception as e:
+        logger.error(f"Error flushing last_active buffer at exit: {str(e)}")
+
+
+def get_last_active_tracker():
+    """Returns the tracker configured in settings.LAST_ACTIVE_TRACKING"""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                options = {
+                    **DEFAULT_LAST_ACTIVE_SETTINGS,
+                    **getattr(settings, 'LAST_ACTIVE_TRACKING', {}),
+                }
+                if options['BACKEND'] == 'redis':
+                    tracker = LastActiveTracker(
+                        RedisActivityBuffer(options['REDIS_KEY'], options['RECOVERY_DELAY']),
+                        staleness=options['STALENESS'],
+                        flush_interval=options['FLUSH_INTERVAL'],
+                        auto_flush=False,
+                    )
+                else:
+                    tracker = LastActiveTracker(
+                        MemoryActivityBuffer(),
+                        staleness=options['STALENESS'],
+                        flush_interval=options['FLUSH_INTERVAL'],
+                        auto_flush=True,
+                    )
+                    atexit.register(_flush_at_exit, tracker)
+                _tracker = tracker
+    return _tracker
@@ -0,0 +1,193 @@
+"""
+Token authentication resolver shared by TokenAuthenticationMiddleware,
+the token_required decorator and the chat websocket consumer.
+
+Resolved users are cached by token, so an authenticated request does not
+touch the database while the cache entry is alive. By default the cache is
+the shared Django cache (Redis), so invalidate_token() from any process -
+a web worker rotating a token or a Celery worker applying a payout - drops
+the entry for every process. The in-process LRU ('locmem') is only meant
+for single-process development. Configured via settings.AUTH_TOKEN_CACHE.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .activity import get_last_active_tracker
+from .models import UserModel
+
+
+DEFAULT_TOKEN_CACHE_SETTINGS = {
+    'BACKEND': 'django',
+    'CACHE_ALIAS': 'default',
+    'KEY_PREFIX': 'auth_token',
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 300,
+}
+
+
+class LocMemTokenCache:
+    """
+    In-process LRU cache with per-entry TTL.
+    Invalidation does not reach other processes, so use it only
+    with a single process (development)
+    """
+
+    def __init__(self, max_size=10000, timeout=300):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            item = self._entries.get(token)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry
+
+    def set(self, token, entry):
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.timeout, entry)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoTokenCache:
+    """
+    Token cache on top of a configured Django cache backend (e.g. Redis),
+    shared between processes
+    """
+
+    def __init__(self, alias='default', key_prefix='auth_token', timeout=300):
+        self.alias = alias
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, token):
+        return f'{self.key_prefix}:{token}'
+
+    def get(self, token):
+        return self.cache.get(self.make_key(token))
+
+    def set(self, token, entry):
+        self.cache.set(self.make_key(token), entry, self.timeout)
+
+    def delete(self, token):
+        self.cache.delete(self.make_key(token))
+
+    def clear(self):
+        # Общий кэш может содержать чужие ключи, поэтому не очищаем его целиком
+        pass
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """Returns the token cache configured in settings.AUTH_TOKEN_CACHE"""
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                options = {
+                    **DEFAULT_TOKEN_CACHE_SETTINGS,
+                    **getattr(settings, 'AUTH_TOKEN_CACHE', {}),
+                }
+                if options['BACKEND'] == 'locmem':
+                    _token_cache = LocMemTokenCache(
+                        max_size=options['MAX_SIZE'],
+                        timeout=options['TIMEOUT'],
+                    )
+                else:
+                    _token_cache = DjangoTokenCache(
+                        alias=options['CACHE_ALIAS'],
+                        key_prefix=options['KEY_PREFIX'],
+                        timeout=options['TIMEOUT'],
+                    )
+    return _token_cache
+
+
+def _entry_from_user(user):
+    """Packs user field values into a picklable cache entry"""
+    fields = UserModel._meta.concrete_fields
+    return {
+        'db': user._state.db,
+        'field_names': [field.attname for field in fields],
+        'values': [field.get_prep_value(field.value_from_object(user)) for field in fields],
+    }
+
+
+def _user_from_entry(entry):
+    """Builds a fresh UserModel instance from a cache entry"""
+    # Каждый запрос получает собственный экземпляр, чтобы изменения
+    # request.user в одном запросе не протекали в другие
+    return UserModel.from_db(
+        entry['db'],
+        entry['field_names'],
+        copy.deepcopy(entry['values']),
+    )
+
+
+def resolve_token(token):
+    """
+    Returns the user that owns the token or None.
+    Cache hits do not query the database.
+    """
+    if not token:
+        return None
+
+    token_cache = get_token_cache()
+    entry = token_cache.get(token)
+    if entry is not None:
+        return _user_from_entry(entry)
+
+    user = UserModel.objects.filter(token=token).first()
+    if user is None:
+        return None
+
+    token_cache.set(token, _entry_from_user(user))
+    return user
+
+
+def invalidate_token(token):
+    """Drops the cached user for the token"""
+    if token:
+        get_token_cache().delete(token)
+
+
+def authenticate_token(token):
+    """
+    Resolves the token and records user activity.
+    Used by the middleware and the token_required decorator.
+    """
+    user = resolve_token(token)
+    if user is None:
+        return None
+
+    # last_active пишется отложенно, пачками (см. activity.py)
+    get_last_active_tracker().touch(user)
+    return user
@@ -1,7 +1,6 @@
 from functools import wraps
 from django.http import JsonResponse
-from django.utils import timezone
-from .models import UserModel
+from .authentication import authenticate_token
 
 
 def token_required(view_func):
@@ -41,22 +40,22 @@ def token_required(view_func):
         # Извлекаем токен
         token = auth_header.split(' ')[1]
         
-        # Ищем пользователя по токену
-        try:
-            user = UserModel.objects.get(token=token)
-            user.last_active = timezone.now()
-            user.save()
-            
-            # Добавляем пользователя в request
-            request.user = user
-            request._authenticated_user = user
-            
-            return view_func(*args, **kwargs)
-            
-        except UserModel.DoesNotExist:
+        # Если middleware уже аутентифицировал этот токен, повторно не ищем
+        user = getattr(request, '_authenticated_user', None)
+        if user is None or user.token != token:
+            # Ищем пользователя по токену (через кэш токенов)
+            user = authenticate_token(token)
+        
+        if user is None:
             return JsonResponse(
                 {'error': 'Access denied. Invalid token.'},
                 status=401
             )
+        
+        # Добавляем пользователя в request
+        request.user = user
+        request._authenticated_user = user
+        
+        return view_func(*args, **kwargs)
     
     return wrapper
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Balance ledger for UserModel.coins and UserModel.diamonds.
+
+Balances are never changed by read-modify-write on a model instance.
+Every change is a single UPDATE with an F() expression. Debits are
+conditional (... SET coins = coins - X WHERE coins >= X), so concurrent
+requests cannot lose updates or overdraw a balance. apply_balance_changes()
+applies a batch of changes for many users atomically (one UPDATE per
+currency), then logs them to BalanceTransaction with one bulk insert.
+
+After the transaction commits, the cached users of the affected tokens
+are dropped and balance_changed is sent with the new balances, so
+subsystems that mirror balances (leaderboards) stay in sync even though
+post_save is not fired.
+"""
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .authentication import invalidate_token
+from .models import BalanceTransaction, UserModel
+
+
+CURRENCIES = [currency for currency, _ in BalanceTransaction.CURRENCY_CHOICES]
+
+# Sent after commit with balances={user_id: {'coins': ..., 'diamonds': ...}}
+balance_changed = Signal()
+
+
+class InsufficientFunds(Exception):
+    """A debit would make a balance negative; nothing was applied"""
+
+    def __init__(self, user_ids, currency):
+        self.user_ids = user_ids
+        self.currency = currency
+        super().__init__(f"Insufficient {currency} for users {sorted(user_ids)}")
+
+
+class BalanceChange(NamedTuple):
+    user_id: int
+    currency: str
+    amount: int  # > 0 - начисление, < 0 - списание
+    reference: str = ''  # по умолчанию - reference из apply_balance_changes
+
+
+def get_balances(user_ids):
+    """Current balances of many users in one query: {user_id: {currency: balance}}"""
+    return {
+        user_id: dict(zip(CURRENCIES, balances))
+        for user_id, *balances in UserModel.objects.filter(
+            pk__in=user_ids
+        ).values_list('pk', *CURRENCIES)
+    }
+
+
+def _update_balances(currency, deltas):
+    """
+    Applies {user_id: delta} to one currency with a single UPDATE.
+    Returns the number of updated rows.
+    """
+    condition = Q()
+    for user_id, delta in deltas.items():
+        if delta < 0:
+            condition |= Q(pk=user_id, **{f'{currency}__gte': -delta})
+        else:
+            condition |= Q(pk=user_id)
+
+    if len(deltas) == 1:
+        (delta,) = deltas.values()
+        expression = F(currency) + delta
+    else:
+        expression = F(currency) + Case(
+            *[When(pk=user_id, then=Value(delta)) for user_id, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    return UserModel.objects.filter(condition).update(
+        **{currency: expression, 'updated': timezone.now()}
+    )
+
+
+def apply_balance_changes(changes, reason, reference=''):
+    """
+    Atomically applies BalanceChange items and logs them.
+    Changes of the same user and currency are summed up into one UPDATE;
+    they are logged per reference (a change without its own reference
+    uses the reference argument). Raises
+    InsufficientFunds (and applies nothing) if any debit cannot be covered,
+    UserModel.DoesNotExist if a user is missing.
+    Returns the new balances: {user_id: {currency: balance}}
+    """
+    deltas = defaultdict(dict)
+    entries = defaultdict(int)  # (currency, user_id, reference) -> amount
+    for change in changes:
+        if change.currency not in CURRENCIES:
+            raise ValueError(f"Unknown currency: {change.currency}")
+        user_deltas = deltas[change.currency]
+        user_deltas[change.user_id] = user_deltas.get(change.user_id, 0) + change.amount
+        entries[change.currency, change.user_id, change.reference or reference] += change.amount
+
+    deltas = {
+        currency: {user_id: delta for user_id, delta in user_deltas.items() if delta}
+        for currency, user_deltas in deltas.items()
+    }
+    user_ids = {user_id for user_deltas in deltas.values() for user_id in user_deltas}
+    if not user_ids:
+        return {}
+
+    with transaction.atomic():
+        for currency, user_deltas in deltas.items():
+            if not user_deltas:
+                continue
+            if _update_balances(currency, user_deltas) != len(user_deltas):
+                # Откатываем всю пачку и выясняем причину
+                existing = set(
+                    UserModel.objects.filter(pk__in=user_deltas).values_list('pk', flat=True)
+                )
+                if existing != set(user_deltas):
+                    raise UserModel.DoesNotExist(
+                        f"Users not found: {sorted(set(user_deltas) - existing)}"
+                    )
+                raise InsufficientFunds(
+                    [user_id for user_id, delta in user_deltas.items() if delta < 0],
+                    currency,
+                )
+
+        rows = UserModel.objects.filter(pk__in=user_ids).values_list('pk', 'token', *CURRENCIES)
+        balances = {}
+        tokens = []
+        for user_id, token, *values in rows:
+            balances[user_id] = dict(zip(CURRENCIES, values))
+            tokens.append(token)
+
+        # balance_after нарастает от баланса до изменений по записям в порядке поступления
+        running = {
+            (currency, user_id): balances[user_id][currency] - delta
+            for currency, user_deltas in deltas.items()
+            for user_id, delta in user_deltas.items()
+        }
+        log = []
+        for (currency, user_id, entry_reference), amount in entries.items():
+            if not amount or (currency, user_id) not in running:
+                continue
+            running[currency, user_id] += amount
+            log.append(BalanceTransaction(
+                user_id=user_id,
+                currency=currency,
+                amount=amount,
+                balance_after=running[currency, user_id],
+                reason=reason,
+                reference=entry_reference,
+            ))
+        BalanceTransaction.objects.bulk_create(log)
+
+        transaction.on_commit(lambda: _notify(balances, tokens))
+
+    return balances
+
+
+def _notify(balances, tokens):
+    for token in tokens:
+        invalidate_token(token)
+    balance_changed.send(sender=BalanceTransaction, balances=balances)
+
+
+def _apply_to_user(user, currency, amount, reason, reference):
+    balances = apply_balance_changes(
+        [BalanceChange(user.pk, currency, amount)], reason, reference
+    )
+    # Обновляем экземпляр, чтобы вызывающий код видел новый баланс
+    for name, value in balances[user.pk].items():
+        setattr(user, name, value)
+    return balances[user.pk][currency]
+
+
+def credit(user, currency, amount, reason, reference=''):
+    """Adds amount to the user's balance, returns the new balance"""
+    if amount <= 0:
+        raise ValueError("Credit amount must be positive")
+    return _apply_to_user(user, currency, amount, reason, reference)
+
+
+def debit(user, currency, amount, reason, reference=''):
+    """
+    Takes amount from the user's balance if it is covered,
+    returns the new balance or raises InsufficientFunds
+    """
+    if amount <= 0:
+        raise ValueError("Debit amount must be positive")
+    return _apply_to_user(user, currency, -amount, reason, reference)
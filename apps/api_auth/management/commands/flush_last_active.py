@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from apps.api_auth.activity import get_last_active_tracker
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered last_active timestamps to the database'
+
+    def handle(self, *args, **options):
+        tracker = get_last_active_tracker()
+        if not tracker.buffer.shared:
+            self.stdout.write(
+                self.style.WARNING(
+                    'The last_active buffer is process-local (BACKEND "memory"), '
+                    'it is flushed by the web processes themselves'
+                )
+            )
+            return
+        
+        updated_count = tracker.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated last_active for {updated_count} users')
+        )
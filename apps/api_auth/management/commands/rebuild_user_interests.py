@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.api_auth.models import UserModel, UserInterest, normalize_interests
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the normalized interest index of users'
+
+    def handle(self, *args, **options):
+        rows = [
+            UserInterest(user_id=user_id, term=term)
+            for user_id, interests in UserModel.objects.values_list('id', 'interests').iterator()
+            for term in normalize_interests(interests)
+        ]
+
+        with transaction.atomic():
+            UserInterest.objects.all().delete()
+            UserInterest.objects.bulk_create(rows, batch_size=1000)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {len(rows)} user interests')
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from apps.api_auth.search import user_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users indexed per batch',
+        )
+
+    def handle(self, *args, **options):
+        indexed_count = user_search_index.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {indexed_count} users')
+        )
@@ -1,9 +1,7 @@
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 
-from .models import UserModel
-
-from datetime import datetime
+from .authentication import authenticate_token
 
 class TokenAuthenticationMiddleware(MiddlewareMixin):
     """
@@ -46,21 +44,19 @@ class TokenAuthenticationMiddleware(MiddlewareMixin):
                 status=401
             )
         
-        # Find user by token
-        try:
-            user = UserModel.objects.get(token=token)
-            user.last_active = datetime.now()
-            user.save()
-            # Add user to request for use in views
-            # Store in custom attribute to avoid Django's AuthenticationMiddleware override
-            request._authenticated_user = user
-            request.user = user
-            return None
-        except UserModel.DoesNotExist:
+        # Find user by token (served from the token cache when possible)
+        user = authenticate_token(token)
+        if user is None:
             return JsonResponse(
                 {'error': 'Access denied. Invalid token.'},
                 status=401
             )
+        
+        # Add user to request for use in views
+        # Store in custom attribute to avoid Django's AuthenticationMiddleware override
+        request._authenticated_user = user
+        request.user = user
+        return None
     
     def is_exempt_url(self, path):
         """
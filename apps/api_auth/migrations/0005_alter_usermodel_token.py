@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0004_usermodel_coins_usermodel_date_of_birth_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usermodel',
+            name='token',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='Authentication token'),
+        ),
+    ]
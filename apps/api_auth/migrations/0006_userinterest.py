@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_user_interests(apps, schema_editor):
+    UserModel = apps.get_model('api_auth', 'UserModel')
+    UserInterest = apps.get_model('api_auth', 'UserInterest')
+
+    batch = []
+    for user_id, interests in UserModel.objects.values_list('id', 'interests').iterator():
+        if isinstance(interests, dict):
+            items = []
+            for value in interests.values():
+                items.extend(value if isinstance(value, list) else [value])
+        elif isinstance(interests, list):
+            items = interests
+        else:
+            continue
+
+        seen = set()
+        for item in items:
+            if not isinstance(item, str):
+                continue
+            term = item.lower().strip()[:100]
+            if term and term not in seen:
+                seen.add(term)
+                batch.append(UserInterest(user_id=user_id, term=term))
+        if len(batch) >= 1000:
+            UserInterest.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    UserInterest.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0005_alter_usermodel_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserInterest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, verbose_name='Interest')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest_terms', to='api_auth.usermodel', verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'User interest',
+                'verbose_name_plural': 'User interests',
+                'indexes': [models.Index(fields=['term', 'user'], name='api_auth_us_term_09ae80_idx')],
+                'unique_together': {('user', 'term')},
+            },
+        ),
+        migrations.RunPython(fill_user_interests, migrations.RunPython.noop),
+    ]
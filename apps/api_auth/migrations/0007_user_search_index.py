@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from server.search import get_search_backend
+
+
+def user_search_index(apps):
+    from apps.api_auth.search import UserSearchIndex
+
+    return UserSearchIndex(
+        'api_auth_user_search',
+        apps.get_model('api_auth', 'UserModel'),
+        {'username': 10.0, 'full_name': 8.0, 'interests': 4.0, 'email': 2.0},
+    )
+
+
+def create_user_search_index(apps, schema_editor):
+    get_search_backend(schema_editor.connection).rebuild(user_search_index(apps))
+
+
+def drop_user_search_index(apps, schema_editor):
+    get_search_backend(schema_editor.connection).drop_index(user_search_index(apps))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0006_userinterest'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_search_index, drop_user_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0007_user_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usermodel',
+            index=models.Index(fields=['-coins', '-id'], name='api_auth_us_coins_f5a66b_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0008_usermodel_coins_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('coins', 'Coins'), ('diamonds', 'Diamonds')], max_length=10, verbose_name='Currency')),
+                ('amount', models.IntegerField(verbose_name='Amount')),
+                ('balance_after', models.IntegerField(verbose_name='Balance after')),
+                ('reason', models.CharField(max_length=50, verbose_name='Reason')),
+                ('reference', models.CharField(blank=True, default='', max_length=100, verbose_name='Reference')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created timestamp')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_transactions', to='api_auth.usermodel', verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Balance transaction',
+                'verbose_name_plural': 'Balance transactions',
+                'indexes': [models.Index(fields=['user', '-created_at'], name='api_auth_ba_user_id_fbbce2_idx')],
+            },
+        ),
+    ]
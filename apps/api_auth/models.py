@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.hashers import make_password, check_password
 import uuid
 class UserModel(models.Model):
@@ -98,6 +98,7 @@ class UserModel(models.Model):
     token = models.CharField(
         max_length=255,
         blank=True,
+        db_index=True,
         verbose_name="Authentication token"
     )
 
@@ -113,14 +114,22 @@ class UserModel(models.Model):
         verbose_name = "User"
         verbose_name_plural = "Users"
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['-coins', '-id']),
+        ]
 
     def __str__(self):
         return self.email
 
     def generate_token(self):
         """Generate unique token for user authentication"""
+        from .authentication import invalidate_token
+
+        old_token = self.token
         self.token = str(uuid.uuid4())
         self.save()
+        # Старый токен больше не должен резолвиться из кэша
+        invalidate_token(old_token)
         return self.token
 
     def set_password(self, raw_password):
@@ -172,26 +181,161 @@ class UserModel(models.Model):
     
     def purchase_course(self, course):
         """Купить курс"""
+        from apps.cours.models import UserCourseModel
+        from .ledger import InsufficientFunds, debit
+
         can_purchase, message = self.can_purchase_course(course)
         if not can_purchase:
             return False, message
         
-        # Списываем монеты
-        self.coins -= course.price
-        self.save()
-        
-        # Создаем запись о покупке курса
-        from apps.cours.models import UserCourseModel
-        user_course, created = UserCourseModel.objects.get_or_create(
-            user=self,
-            course=course,
-            defaults={'is_purchased': True}
-        )
-        
-        if not created:
-            user_course.is_purchased = True
-            user_course.save()
+        try:
+            with transaction.atomic():
+                # Списываем монеты условным UPDATE, баланс не уйдет в минус при гонке
+                if course.price > 0:
+                    debit(self, 'coins', course.price, 'course_purchase', f'course:{course.pk}')
+                
+                # Отмечаем покупку; параллельная покупка того же курса откатывает списание
+                purchased = UserCourseModel.objects.filter(
+                    user=self, course=course, is_purchased=False
+                ).update(is_purchased=True)
+                if not purchased:
+                    UserCourseModel.objects.create(user=self, course=course, is_purchased=True)
+        except InsufficientFunds:
+            return False, "Недостаточно монет"
+        except IntegrityError:
+            self.refresh_from_db(fields=['coins', 'diamonds'])
+            return False, "Курс уже куплен"
         
         return True, "Курс успешно куплен"
 
 
+
+
+def normalize_interests(interests_data):
+    """
+    Extracts unique lowercased interest terms from the interests JSON
+    (a dict of category -> list/str, or a plain list)
+    """
+    if isinstance(interests_data, dict):
+        items = []
+        for value in interests_data.values():
+            if isinstance(value, list):
+                items.extend(value)
+            else:
+                items.append(value)
+    elif isinstance(interests_data, list):
+        items = interests_data
+    else:
+        return []
+
+    terms = []
+    for item in items:
+        if not isinstance(item, str):
+            continue
+        term = item.lower().strip()[:UserInterest.TERM_MAX_LENGTH]
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+class UserInterest(models.Model):
+    """
+    Normalized interest terms of a user, indexed by term.
+    Kept in sync with UserModel.interests by a post_save signal
+    """
+    TERM_MAX_LENGTH = 100
+
+    user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        related_name='interest_terms',
+        verbose_name="User"
+    )
+    term = models.CharField(
+        max_length=TERM_MAX_LENGTH,
+        verbose_name="Interest"
+    )
+
+    class Meta:
+        verbose_name = "User interest"
+        verbose_name_plural = "User interests"
+        unique_together = ['user', 'term']
+        indexes = [
+            models.Index(fields=['term', 'user']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.term}"
+
+    @classmethod
+    def sync_user(cls, user):
+        """Brings the stored terms in line with user.interests"""
+        new_terms = set(normalize_interests(user.interests))
+        existing_terms = set(
+            cls.objects.filter(user=user).values_list('term', flat=True)
+        )
+
+        removed_terms = existing_terms - new_terms
+        if removed_terms:
+            cls.objects.filter(user=user, term__in=removed_terms).delete()
+
+        added_terms = new_terms - existing_terms
+        if added_terms:
+            cls.objects.bulk_create(
+                [cls(user=user, term=term) for term in added_terms],
+                ignore_conflicts=True
+            )
+
+
+class BalanceTransaction(models.Model):
+    """
+    Append-only log of balance changes made through apps.api_auth.ledger
+    """
+    CURRENCY_COINS = 'coins'
+    CURRENCY_DIAMONDS = 'diamonds'
+    CURRENCY_CHOICES = [
+        (CURRENCY_COINS, 'Coins'),
+        (CURRENCY_DIAMONDS, 'Diamonds'),
+    ]
+
+    user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        related_name='balance_transactions',
+        verbose_name="User"
+    )
+    currency = models.CharField(
+        max_length=10,
+        choices=CURRENCY_CHOICES,
+        verbose_name="Currency"
+    )
+    amount = models.IntegerField(
+        verbose_name="Amount"
+    )
+    balance_after = models.IntegerField(
+        verbose_name="Balance after"
+    )
+    reason = models.CharField(
+        max_length=50,
+        verbose_name="Reason"
+    )
+    reference = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name="Reference"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Created timestamp"
+    )
+
+    class Meta:
+        verbose_name = "Balance transaction"
+        verbose_name_plural = "Balance transactions"
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.amount:+} {self.currency} ({self.reason})"
@@ -0,0 +1,26 @@
+"""
+Full-text index of users (see server/search.py) for user search.
+Usernames weigh the most, emails the least; interests are indexed as
+their normalized terms. Kept in sync by signals.
+"""
+from server.search import SearchIndex
+
+from .models import UserModel, normalize_interests
+
+
+USER_SEARCH_FIELDS = {
+    'username': 10.0,
+    'full_name': 8.0,
+    'interests': 4.0,
+    'email': 2.0,
+}
+
+
+class UserSearchIndex(SearchIndex):
+    def get_text(self, instance, field):
+        if field == 'interests':
+            return ' '.join(normalize_interests(instance.interests))
+        return super().get_text(instance, field)
+
+
+user_search_index = UserSearchIndex('api_auth_user_search', UserModel, USER_SEARCH_FIELDS)
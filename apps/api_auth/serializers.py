@@ -1,5 +1,5 @@
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
-from .models import UserModel
+from .models import BalanceTransaction, UserModel
 
 class UserAuthSerializer(ModelSerializer):
     class Meta:
@@ -25,8 +25,18 @@ class UserSerializer(ModelSerializer):
     class Meta:
         model = UserModel
         fields = ['id', 'username', 'email', 'streak_days', 'level', 'interests', 'avatar', 'avatar_url', 'bio', 'user_time_zone', 'last_active', 'full_name', 'link', 'date_of_birth', 'diamonds', 'coins']
+        # Балансы меняются только через apps.api_auth.ledger
+        read_only_fields = ['diamonds', 'coins']
         extra_kwargs = {'avatar': {'write_only': True}}
     
+    def update(self, instance, validated_data):
+        # Сохраняем только переданные поля: полный save() перезаписал бы
+        # балансы значениями из (возможно, закэшированного) экземпляра
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated'])
+        return instance
+    
     def get_avatar_url(self, obj):
         """Возвращает полный URL аватарки пользователя"""
         if obj.avatar:
@@ -34,4 +44,10 @@ class UserSerializer(ModelSerializer):
             if request:
                 return request.build_absolute_uri(obj.avatar.url)
             return obj.avatar.url
-        return None
\ No newline at end of file
+        return None
+
+
+class BalanceTransactionSerializer(ModelSerializer):
+    class Meta:
+        model = BalanceTransaction
+        fields = ['currency', 'amount', 'balance_after', 'reason', 'reference', 'created_at']
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_token
+from .models import UserModel, UserInterest
+from .search import USER_SEARCH_FIELDS, user_search_index
+
+
+@receiver(post_save, sender=UserModel)
+@receiver(post_delete, sender=UserModel)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Cached user data becomes stale after any save or delete"""
+    invalidate_token(instance.token)
+
+
+@receiver(post_save, sender=UserModel)
+def sync_user_interests(sender, instance, update_fields=None, **kwargs):
+    """Keeps the interest index in line with user.interests"""
+    if update_fields is not None and 'interests' not in update_fields:
+        return
+    UserInterest.sync_user(instance)
+
+
+@receiver(post_save, sender=UserModel)
+def sync_user_search_index(sender, instance, update_fields=None, **kwargs):
+    """Reindexes the user when searchable fields change"""
+    if update_fields is not None and not USER_SEARCH_FIELDS.keys() & set(update_fields):
+        return
+    user_search_index.update([instance])
+
+
+@receiver(post_delete, sender=UserModel)
+def remove_user_from_search_index(sender, instance, **kwargs):
+    user_search_index.delete([instance.pk])
@@ -0,0 +1,22 @@
+from celery import shared_task
+from .activity import get_last_active_tracker
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def flush_last_active():
+    """
+    Сбрасывает накопленные отметки активности пользователей в базу
+    """
+    tracker = get_last_active_tracker()
+    if not tracker.buffer.shared:
+        # Буфер в памяти веб-процессов, из воркера его не сбросить
+        return "Skipped: last_active buffer is process-local"
+    
+    updated_count = tracker.flush()
+    
+    if updated_count > 0:
+        logger.info(f"Updated last_active for {updated_count} users")
+    
+    return f"Updated last_active for {updated_count} users"
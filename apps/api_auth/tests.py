@@ -1,3 +1,174 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from apps.api_auth import activity
+from apps.api_auth.ledger import BalanceChange, InsufficientFunds, apply_balance_changes, credit, debit
+from apps.api_auth.models import BalanceTransaction, UserModel
+from apps.cours.models import CourseLessonModel, CourseModel, UserCourseModel
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_user(name, coins=0, diamonds=0):
+    user = UserModel(username=name, email=f'{name}@example.com', coins=coins, diamonds=diamonds)
+    user.set_password('password')
+    user.generate_token()
+    return user
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LedgerTests(TestCase):
+
+    def setUp(self):
+        self.alice = create_user('alice', coins=100, diamonds=10)
+        self.bob = create_user('bob', coins=5, diamonds=0)
+
+    def test_credit_and_debit_update_balance_and_log(self):
+        self.assertEqual(credit(self.alice, 'coins', 20, 'test', 'ref:1'), 120)
+        self.assertEqual(debit(self.alice, 'coins', 70, 'test', 'ref:2'), 50)
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.coins, 50)
+        log = list(BalanceTransaction.objects.filter(user=self.alice).order_by('pk').values_list(
+            'currency', 'amount', 'balance_after', 'reference'
+        ))
+        self.assertEqual(log, [('coins', 20, 120, 'ref:1'), ('coins', -70, 50, 'ref:2')])
+
+    def test_uncovered_debit_changes_nothing(self):
+        with self.assertRaises(InsufficientFunds):
+            debit(self.bob, 'coins', 6, 'test')
+
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.coins, 5)
+        self.assertFalse(BalanceTransaction.objects.exists())
+
+    def test_multi_currency_change_is_all_or_nothing(self):
+        changes = [
+            BalanceChange(self.alice.pk, 'coins', -30),
+            BalanceChange(self.bob.pk, 'coins', 30),
+            BalanceChange(self.alice.pk, 'diamonds', 5),
+            BalanceChange(self.bob.pk, 'diamonds', -1),
+        ]
+        with self.assertRaises(InsufficientFunds) as raised:
+            apply_balance_changes(changes, 'test')
+        self.assertEqual(raised.exception.currency, 'diamonds')
+        self.assertEqual(raised.exception.user_ids, [self.bob.pk])
+
+        self.assertEqual(
+            dict(UserModel.objects.values_list('username', 'coins')), {'alice': 100, 'bob': 5}
+        )
+        self.assertEqual(
+            dict(UserModel.objects.values_list('username', 'diamonds')), {'alice': 10, 'bob': 0}
+        )
+        self.assertFalse(BalanceTransaction.objects.exists())
+
+    def test_multi_currency_change_applies_every_currency(self):
+        balances = apply_balance_changes([
+            BalanceChange(self.alice.pk, 'coins', -30),
+            BalanceChange(self.bob.pk, 'coins', 30),
+            BalanceChange(self.alice.pk, 'diamonds', -4),
+        ], 'test', 'transfer:1')
+
+        self.assertEqual(balances[self.alice.pk], {'coins': 70, 'diamonds': 6})
+        self.assertEqual(balances[self.bob.pk], {'coins': 35, 'diamonds': 0})
+        self.assertEqual(BalanceTransaction.objects.filter(reference='transfer:1').count(), 3)
+
+    def test_missing_user_changes_nothing(self):
+        with self.assertRaises(UserModel.DoesNotExist):
+            apply_balance_changes([
+                BalanceChange(self.alice.pk, 'coins', 10),
+                BalanceChange(self.bob.pk + 1000, 'coins', 10),
+            ], 'test')
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.coins, 100)
+        self.assertFalse(BalanceTransaction.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PurchaseCourseTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('buyer', coins=100)
+        self.course = CourseModel.objects.create(name='Course', price=60)
+
+    def test_purchase_debits_once(self):
+        self.assertEqual(self.user.purchase_course(self.course), (True, "Курс успешно куплен"))
+        self.assertEqual(self.user.purchase_course(self.course), (False, "Курс уже куплен"))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 40)
+        self.assertEqual(BalanceTransaction.objects.filter(reason='course_purchase').count(), 1)
+
+    def test_concurrent_purchase_rolls_back_second_debit(self):
+        user = create_user('rich_buyer', coins=200)
+        user.purchase_course(self.course)
+
+        # Вторая покупка прошла проверку до того, как первая была записана
+        with mock.patch.object(UserModel, 'can_purchase_course', return_value=(True, "Можно купить")):
+            self.assertEqual(user.purchase_course(self.course), (False, "Курс уже куплен"))
+
+        user.refresh_from_db()
+        self.assertEqual(user.coins, 140)
+        self.assertEqual(BalanceTransaction.objects.filter(reason='course_purchase').count(), 1)
+
+    def test_purchase_without_funds_changes_nothing(self):
+        expensive = CourseModel.objects.create(name='Expensive', price=500)
+
+        self.assertEqual(self.user.purchase_course(expensive), (False, "Недостаточно монет"))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 100)
+        self.assertFalse(UserCourseModel.objects.filter(user=self.user, course=expensive).exists())
+        self.assertFalse(BalanceTransaction.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LessonCompleteTests(TestCase):
+
+    def setUp(self):
+        tracker = activity.LastActiveTracker(
+            activity.MemoryActivityBuffer(), staleness=60, flush_interval=30, auto_flush=False
+        )
+        patcher = mock.patch.object(activity, '_tracker', tracker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = create_user('student')
+        self.course = CourseModel.objects.create(name='Course', total_reward_points=50)
+        self.first = CourseLessonModel.objects.create(course=self.course, name='First', order=1, reward_points=10)
+        self.second = CourseLessonModel.objects.create(course=self.course, name='Second', order=2, reward_points=15)
+        UserCourseModel.objects.create(user=self.user, course=self.course, is_purchased=True)
+
+    def complete(self, lesson):
+        return self.client.post(
+            '/api/cours/lessons/complete/',
+            {'lesson_id': lesson.pk},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {self.user.token}',
+        )
+
+    def test_repeated_completion_credits_once(self):
+        self.assertEqual(self.complete(self.first).status_code, 200)
+        response = self.complete(self.first)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], "Урок уже завершен")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 10)
+        self.assertEqual(BalanceTransaction.objects.filter(reason='lesson_reward').count(), 1)
+        self.assertEqual(UserCourseModel.objects.get(user=self.user).earned_points, 10)
+
+    def test_course_bonus_credited_once(self):
+        self.complete(self.first)
+        response = self.complete(self.second)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['progress']['is_completed'])
+        self.assertEqual(self.complete(self.second).status_code, 400)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.coins, 10 + 15 + 50)
+        self.assertEqual(BalanceTransaction.objects.filter(reason='course_completion').count(), 1)
+        self.assertEqual(UserCourseModel.objects.get(user=self.user).earned_points, 75)
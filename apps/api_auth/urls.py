@@ -11,5 +11,6 @@ urlpatterns = [
     path('profile/', views.get_user_profile, name='user_profile'),
     path('profile/update/', views.update_user_profile, name='update_user_profile'),
     path('profile/upload-avatar/', views.upload_avatar, name='upload_avatar'),
+    path('balance/', views.get_user_balance, name='user_balance'),
     
 ]
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Batch resolution of flags that depend on the current user (is_liked, ...).
+
+A serializer declares its flags in ``viewer_flags`` as
+``{name: resolver(user, object_ids) -> set of ids with the flag set}``
+and sets ``Meta.list_serializer_class = ViewerFlagsListSerializer``.
+With many=True every flag is then resolved for the whole page with one
+query; a single object falls back to a query for that object only.
+"""
+from django.db import models
+from rest_framework import serializers
+
+from .models import UserModel
+
+
+def get_request_user(context):
+    """Returns the authenticated UserModel from serializer context or None"""
+    request = context.get('request')
+    user = getattr(request, 'user', None)
+    return user if isinstance(user, UserModel) else None
+
+
+class ViewerFlagsListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that prefetches viewer flags of the child for all items
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        instances = list(iterable)
+        self.child.prefetch_viewer_flags(instances)
+        return super().to_representation(instances)
+
+
+class ViewerFlagsMixin:
+    """
+    Serializer mixin resolving viewer_flags from a per-serializer cache
+    """
+    viewer_flags = {}
+
+    def prefetch_viewer_flags(self, instances):
+        """Resolves all viewer flags for the instances at once"""
+        user = get_request_user(self.context)
+        object_ids = [obj.pk for obj in instances]
+
+        self._viewer_flag_ids = set(object_ids)
+        self._viewer_flag_values = {
+            name: resolver(user, object_ids) if user and object_ids else set()
+            for name, resolver in self.viewer_flags.items()
+        }
+
+    def get_viewer_flag(self, name, obj):
+        if obj.pk not in getattr(self, '_viewer_flag_ids', ()):
+            self.prefetch_viewer_flags([obj])
+        return obj.pk in self._viewer_flag_values[name]
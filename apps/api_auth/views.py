@@ -10,8 +10,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 # Local imports
+from .ledger import get_balances
 from .models import UserModel
-from .serializers import UserAuthSerializer, UserSerializer
+from .serializers import BalanceTransactionSerializer, UserAuthSerializer, UserSerializer
 from .decorators import token_required
 
 
@@ -137,7 +138,7 @@ def upload_avatar(request):
     
     # Сохранение аватарки
     user.avatar = avatar_file
-    user.save()
+    user.save(update_fields=['avatar', 'updated'])
     
     return Response(
         {
@@ -145,4 +146,23 @@ def upload_avatar(request):
             'avatar_url': request.build_absolute_uri(user.avatar.url) if user.avatar else None
         }, 
         status=status.HTTP_200_OK
-    )
\ No newline at end of file
+    )
+
+
+@api_view(['GET'])
+@token_required
+def get_user_balance(request):
+    """
+    Текущий баланс пользователя и последние операции по нему
+    """
+    user = request.user
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+    
+    transactions = user.balance_transactions.order_by('-created_at', '-id')[:limit]
+    return Response({
+        'balance': get_balances([user.pk]).get(user.pk, {}),
+        'transactions': BalanceTransactionSerializer(transactions, many=True).data,
+    }, status=status.HTTP_200_OK)
@@ -2,7 +2,7 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from apps.api_auth.models import UserModel
+from apps.api_auth.authentication import resolve_token
 from .models import ChatRoom, Message
 from apps.api.models import Friendship
 from django.db.models import Q
@@ -124,8 +124,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     break
             
             if token:
-                user = UserModel.objects.filter(token=token).first()
-                return user
+                return resolve_token(token)
             return None
         except Exception:
             return None
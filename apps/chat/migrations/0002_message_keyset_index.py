@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0005_alter_usermodel_token'),
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat_room', '-timestamp', '-id'], name='chat_messag_chat_ro_f8e040_idx'),
+        ),
+    ]
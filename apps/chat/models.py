@@ -1,7 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from apps.api_auth.models import UserModel
-from apps.api.models import Friendship
+from apps.api.models import FriendEdge
 
 
 class ChatRoom(models.Model):
@@ -35,16 +35,8 @@ class ChatRoom(models.Model):
         Получить или создать комнату между двумя пользователями
         Проверяет, что пользователи являются друзьями
         """
-        # Проверяем, что пользователи друзья
-        friendship_exists = Friendship.objects.filter(
-            models.Q(
-                from_user=user1, to_user=user2, status='accepted'
-            ) | models.Q(
-                from_user=user2, to_user=user1, status='accepted'
-            )
-        ).exists()
-        
-        if not friendship_exists:
+        # Проверяем, что пользователи друзья (одна проверка по индексу ребер)
+        if not FriendEdge.objects.filter(user=user1, friend=user2).exists():
             raise ValueError("Users are not friends")
         
         # Упорядочиваем пользователей по ID для консистентности
@@ -86,6 +78,9 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['chat_room', '-timestamp', '-id']),
+        ]
         verbose_name = "Message"
         verbose_name_plural = "Messages"
     
@@ -4,29 +4,26 @@ from rest_framework import status
 from django.db.models import Q
 from apps.api_auth.decorators import token_required
 from apps.api_auth.models import UserModel
-from apps.api.models import Friendship
+from apps.api.friend_graph import get_friends
+from server.pagination import KeysetPagination
 from .models import ChatRoom, Message
 from .serializers import ChatRoomSerializer, MessageSerializer, FriendSerializer
 
 
+class MessagePagination(KeysetPagination):
+    """Курсорная пагинация истории чата по (timestamp, id)"""
+    page_size = 50
+    max_page_size = 100
+    ordering = ('-timestamp', '-id')
+
+
 class FriendsListView(APIView):
     """Получение списка друзей для чата"""
     
     @token_required
     def get(self, request):
-        user = request.user
-        
-        # Получаем всех друзей (принятые заявки)
-        friendships = Friendship.objects.filter(
-            Q(from_user=user, status='accepted') | Q(to_user=user, status='accepted')
-        )
-        
-        friends = []
-        for friendship in friendships:
-            if friendship.from_user == user:
-                friends.append(friendship.to_user)
-            else:
-                friends.append(friendship.from_user)
+        # Друзья из кэша графа дружбы, пользователи одним запросом
+        friends = get_friends(request.user.id)
         
         serializer = FriendSerializer(friends, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -102,22 +99,12 @@ class ChatMessagesView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Получаем параметры пагинации
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 50))
-        
-        # Получаем сообщения с пагинацией (последние сообщения)
-        total_messages = room.messages.count()
-        
-        if page == 1:
-            # Для первой страницы возвращаем последние сообщения
-            messages = room.messages.order_by('-timestamp')[:page_size]
-            messages = list(reversed(messages))  # Возвращаем в хронологическом порядке
-        else:
-            # Для остальных страниц загружаем более старые сообщения
-            offset = (page - 1) * page_size
-            messages = room.messages.order_by('-timestamp')[offset:offset + page_size]
-            messages = list(reversed(messages))  # Возвращаем в хронологическом порядке
+        # Курсорная пагинация от последних сообщений к более старым
+        paginator = MessagePagination()
+        page = paginator.paginate_queryset(
+            room.messages.order_by('-timestamp', '-id'), request, view=self
+        )
+        messages = list(reversed(page))  # Возвращаем в хронологическом порядке
         
         # Отмечаем сообщения как прочитанные
         unread_messages = room.messages.filter(
@@ -128,12 +115,17 @@ class ChatMessagesView(APIView):
             message.mark_as_read()
         
         serializer = MessageSerializer(messages, many=True)
-        return Response({
+        data = {
             'messages': serializer.data,
-            'page': page,
-            'page_size': page_size,
-            'total_messages': room.messages.count()
-        }, status=status.HTTP_200_OK)
+            'page_size': paginator.page_size,
+            # Более старые сообщения
+            'next': paginator.get_next_link(),
+            # Более новые сообщения
+            'previous': paginator.get_previous_link(),
+        }
+        if paginator.count is not None:
+            data['total_messages'] = paginator.count
+        return Response(data, status=status.HTTP_200_OK)
     
     @token_required
     def post(self, request, room_id):
@@ -1,11 +1,13 @@
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view
 from apps.api_auth.decorators import token_required
+from apps.api_auth.ledger import credit
 from .models import (
     CourseModel, 
     CourseLessonModel, 
@@ -25,6 +27,9 @@ from .serializers import (
 )
 
 
+CompletedLesson = UserCourseModel.completed_lessons.through
+
+
 class CourseListView(APIView):
     """Получение списка всех курсов (публичный endpoint)"""
     
@@ -229,49 +234,61 @@ class LessonCompleteView(APIView):
             try:
                 lesson = CourseLessonModel.objects.get(id=lesson_id)
                 
-                # Проверяем, купил ли пользователь курс
-                try:
-                    user_course = UserCourseModel.objects.get(
-                        user=request.user,
-                        course=lesson.course,
-                        is_purchased=True
+                with transaction.atomic():
+                    # Проверяем, купил ли пользователь курс; строка блокируется,
+                    # чтобы параллельные завершения уроков курса шли по очереди
+                    try:
+                        user_course = UserCourseModel.objects.select_for_update().get(
+                            user=request.user,
+                            course=lesson.course,
+                            is_purchased=True
+                        )
+                    except UserCourseModel.DoesNotExist:
+                        return Response({
+                            'success': False,
+                            'error': 'Курс не куплен'
+                        }, status=status.HTTP_403_FORBIDDEN)
+                    
+                    # Завершаем урок; повторная вставка упирается в уникальность
+                    # и ничего не начисляет
+                    try:
+                        with transaction.atomic():
+                            CompletedLesson.objects.create(
+                                usercoursemodel_id=user_course.pk,
+                                courselessonmodel_id=lesson.pk
+                            )
+                    except IntegrityError:
+                        return Response({
+                            'success': False,
+                            'error': 'Урок уже завершен'
+                        }, status=status.HTTP_400_BAD_REQUEST)
+                    
+                    UserCourseModel.objects.filter(pk=user_course.pk).update(
+                        earned_points=F('earned_points') + lesson.reward_points
                     )
-                except UserCourseModel.DoesNotExist:
-                    return Response({
-                        'success': False,
-                        'error': 'Курс не куплен'
-                    }, status=status.HTTP_403_FORBIDDEN)
-                
-                # Проверяем, не завершен ли уже урок
-                if user_course.completed_lessons.filter(id=lesson.id).exists():
-                    return Response({
-                        'success': False,
-                        'error': 'Урок уже завершен'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Завершаем урок
-                user_course.completed_lessons.add(lesson)
-                user_course.earned_points += lesson.reward_points
-                
-                # Добавляем баллы пользователю
-                request.user.coins += lesson.reward_points
-                request.user.save()
-                
-                # Проверяем, завершен ли весь курс
-                total_lessons = lesson.course.lessons.count()
-                completed_lessons = user_course.completed_lessons.count()
-                
-                if completed_lessons == total_lessons and not user_course.is_completed:
-                    user_course.is_completed = True
-                    user_course.completion_date = timezone.now()
                     
-                    # Добавляем бонусные баллы за завершение курса
-                    bonus_points = lesson.course.total_reward_points
-                    user_course.earned_points += bonus_points
-                    request.user.coins += bonus_points
-                    request.user.save()
-                
-                user_course.save()
+                    # Добавляем баллы пользователю (атомарным UPDATE через леджер)
+                    if lesson.reward_points > 0:
+                        credit(request.user, 'coins', lesson.reward_points, 'lesson_reward', f'lesson:{lesson.pk}')
+                    
+                    # Проверяем, завершен ли весь курс
+                    total_lessons = lesson.course.lessons.count()
+                    completed_lessons = user_course.completed_lessons.count()
+                    
+                    if completed_lessons == total_lessons:
+                        # Бонус за завершение курса начисляется один раз
+                        bonus_points = lesson.course.total_reward_points
+                        course_completed = UserCourseModel.objects.filter(
+                            pk=user_course.pk, is_completed=False
+                        ).update(
+                            is_completed=True,
+                            completion_date=timezone.now(),
+                            earned_points=F('earned_points') + bonus_points
+                        )
+                        if course_completed and bonus_points > 0:
+                            credit(request.user, 'coins', bonus_points, 'course_completion', f'course:{lesson.course_id}')
+                    
+                    user_course.refresh_from_db(fields=['earned_points', 'is_completed', 'completion_date'])
                 
                 return Response({
                     'success': True,
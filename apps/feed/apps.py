@@ -5,3 +5,6 @@ class FeedConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.feed'
     verbose_name = 'Feed System'
+
+    def ready(self):
+        from . import signals  # noqa: F401
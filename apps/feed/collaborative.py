@@ -0,0 +1,130 @@
+"""
+Офлайн-расчет похожих пользователей для коллаборативной фильтрации.
+
+Лайки собираются в разреженную матрицу пользователь x пост (CSR на
+обычных списках Python), схожесть считается как коэффициент Жаккара
+по пересечению лайков. Для каждого пользователя сохраняются top-K
+соседей в UserSimilarity, поэтому онлайн-рекомендации делают один
+индексированный запрос вместо перебора всех пользователей.
+"""
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Like, UserSimilarity
+
+
+DEFAULT_TOP_K = 10
+DEFAULT_MIN_COMMON_LIKES = 2  # Минимум общих лайков для схожести
+
+
+class LikeMatrix:
+    """
+    Разреженная матрица лайков в формате CSR.
+    Строки - пользователи, столбцы - посты.
+    """
+
+    def __init__(self, user_ids, indptr, indices, posts_count):
+        self.user_ids = user_ids  # номер строки -> id пользователя
+        self.indptr = indptr  # границы строк в indices
+        self.indices = indices  # номера столбцов (постов)
+        self.posts_count = posts_count
+
+    @classmethod
+    def from_likes(cls):
+        """Строит матрицу одним проходом по таблице лайков"""
+        user_ids = []
+        indptr = [0]
+        indices = []
+        post_columns = {}
+
+        current_user = None
+        for user_id, post_id in Like.objects.order_by('user_id').values_list(
+            'user_id', 'post_id'
+        ).iterator(chunk_size=5000):
+            if user_id != current_user:
+                if current_user is not None:
+                    indptr.append(len(indices))
+                user_ids.append(user_id)
+                current_user = user_id
+            column = post_columns.setdefault(post_id, len(post_columns))
+            indices.append(column)
+
+        if current_user is not None:
+            indptr.append(len(indices))
+
+        return cls(user_ids, indptr, indices, len(post_columns))
+
+    def row(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def row_length(self, i):
+        return self.indptr[i + 1] - self.indptr[i]
+
+    def transpose(self):
+        """Столбцы матрицы: пост -> строки пользователей, лайкнувших его"""
+        columns = [[] for _ in range(self.posts_count)]
+        for i in range(len(self.user_ids)):
+            for column in self.row(i):
+                columns[column].append(i)
+        return columns
+
+
+def compute_neighbours(matrix, top_k=DEFAULT_TOP_K, min_common_likes=DEFAULT_MIN_COMMON_LIKES):
+    """
+    Возвращает {user_id: [(similar_user_id, score, common_likes), ...]}
+    с top_k соседями по коэффициенту Жаккара
+    """
+    columns = matrix.transpose()
+    neighbours = {}
+
+    for i, user_id in enumerate(matrix.user_ids):
+        # Пересечения строки i со всеми строками: (A * A^T)[i]
+        common = defaultdict(int)
+        for column in matrix.row(i):
+            for j in columns[column]:
+                if j != i:
+                    common[j] += 1
+
+        row_length = matrix.row_length(i)
+        scored = []
+        for j, intersection in common.items():
+            if intersection < min_common_likes:
+                continue
+            union = row_length + matrix.row_length(j) - intersection
+            scored.append((intersection / union, intersection, j))
+
+        if scored:
+            neighbours[user_id] = [
+                (matrix.user_ids[j], score, intersection)
+                for score, intersection, j in heapq.nlargest(top_k, scored)
+            ]
+
+    return neighbours
+
+
+def rebuild_user_similarity(top_k=DEFAULT_TOP_K, min_common_likes=DEFAULT_MIN_COMMON_LIKES):
+    """
+    Пересчитывает таблицу UserSimilarity целиком.
+    Возвращает количество сохраненных пар.
+    """
+    matrix = LikeMatrix.from_likes()
+    neighbours = compute_neighbours(matrix, top_k, min_common_likes)
+
+    rows = [
+        UserSimilarity(
+            user_id=user_id,
+            similar_user_id=similar_user_id,
+            score=score,
+            common_likes=intersection
+        )
+        for user_id, user_neighbours in neighbours.items()
+        for similar_user_id, score, intersection in user_neighbours
+    ]
+
+    with transaction.atomic():
+        UserSimilarity.objects.all().delete()
+        UserSimilarity.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
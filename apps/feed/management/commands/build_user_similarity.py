@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from apps.feed.collaborative import (
+    rebuild_user_similarity, DEFAULT_TOP_K, DEFAULT_MIN_COMMON_LIKES
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild similar users (top-K neighbours) for collaborative filtering'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=DEFAULT_TOP_K,
+            help='Number of neighbours stored per user',
+        )
+        parser.add_argument(
+            '--min-common-likes',
+            type=int,
+            default=DEFAULT_MIN_COMMON_LIKES,
+            help='Minimum number of common likes for two users to be similar',
+        )
+
+    def handle(self, *args, **options):
+        pairs_count = rebuild_user_similarity(
+            top_k=options['top_k'],
+            min_common_likes=options['min_common_likes']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Stored {pairs_count} similar user pairs')
+        )
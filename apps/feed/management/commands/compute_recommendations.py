@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from apps.api_auth.models import UserModel
+from apps.feed.utils import RecommendationEngine, materialize_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Compute and store post recommendations for active users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            help='Compute recommendations for a specific user only',
+        )
+        parser.add_argument(
+            '--active-days',
+            type=int,
+            default=7,
+            help='Users active within this number of days are processed',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of users processed per bulk upsert',
+        )
+
+    def handle(self, *args, **options):
+        if options['user_id']:
+            try:
+                user = UserModel.objects.get(id=options['user_id'])
+            except UserModel.DoesNotExist:
+                self.stdout.write(
+                    self.style.ERROR(f'User with ID {options["user_id"]} not found')
+                )
+                return
+            
+            recommendations_count = RecommendationEngine().materialize_for_users([user])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Stored {recommendations_count} recommendations for {user.email}'
+                )
+            )
+            return
+        
+        users_count, recommendations_count = materialize_recommendations(
+            active_days=options['active_days'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Stored {recommendations_count} recommendations for {users_count} users'
+            )
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from apps.feed.view_tracking import get_post_view_recorder
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered post views to the database'
+
+    def handle(self, *args, **options):
+        recorder = get_post_view_recorder()
+        if not recorder.buffer.shared:
+            self.stdout.write(
+                self.style.WARNING(
+                    'The post views buffer is process-local (BACKEND "memory"), '
+                    'it is flushed by the web processes themselves'
+                )
+            )
+            return
+        
+        views_count = recorder.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'Saved {views_count} post views')
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from apps.feed.search import post_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of posts indexed per batch',
+        )
+
+    def handle(self, *args, **options):
+        indexed_count = post_search_index.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {indexed_count} posts')
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from apps.feed.related import rebuild_related_posts, RELATED_POSTS_LIMIT
+
+
+class Command(BaseCommand):
+    help = 'Rebuild related posts (top-N by common tags) for every post'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=RELATED_POSTS_LIMIT,
+            help='Number of related posts stored per post',
+        )
+
+    def handle(self, *args, **options):
+        pairs_count = rebuild_related_posts(limit=options['limit'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Stored {pairs_count} related post pairs')
+        )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.feed.utils import rebuild_tag_daily_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-day tag counters used for trending tags'
+
+    def handle(self, *args, **options):
+        rows_count = rebuild_tag_daily_counts()
+        self.stdout.write(
+            self.style.SUCCESS(f'Stored {rows_count} daily tag counters')
+        )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.feed.utils import recount_post_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored likes/comments/views counters of posts'
+
+    def handle(self, *args, **options):
+        updated_count = recount_post_counters()
+        self.stdout.write(
+            self.style.SUCCESS(f'Recounted counters for {updated_count} posts')
+        )
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_post_tags(apps, schema_editor):
+    Post = apps.get_model('feed', 'Post')
+    PostTag = apps.get_model('feed', 'PostTag')
+
+    batch = []
+    for post_id, tags in Post.objects.values_list('id', 'tags').iterator():
+        if not isinstance(tags, list):
+            continue
+        seen = set()
+        for tag in tags:
+            if not isinstance(tag, str):
+                continue
+            tag = tag[:100]
+            if tag and tag not in seen:
+                seen.add(tag)
+                batch.append(PostTag(post_id=post_id, tag=tag))
+        if len(batch) >= 1000:
+            PostTag.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    PostTag.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100, verbose_name='Тег')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='feed.post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Тег поста',
+                'verbose_name_plural': 'Теги постов',
+                'indexes': [models.Index(fields=['tag', 'post'], name='feed_postta_tag_bc6794_idx')],
+                'unique_together': {('post', 'tag')},
+            },
+        ),
+        migrations.RunPython(fill_post_tags, migrations.RunPython.noop),
+    ]
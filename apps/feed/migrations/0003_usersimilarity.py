@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0005_alter_usermodel_token'),
+        ('feed', '0002_posttag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0.0, verbose_name='Коэффициент схожести')),
+                ('common_likes', models.PositiveIntegerField(default=0, verbose_name='Общие лайки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата расчета')),
+                ('similar_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api_auth.usermodel', verbose_name='Похожий пользователь')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_users', to='api_auth.usermodel', verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Похожий пользователь',
+                'verbose_name_plural': 'Похожие пользователи',
+                'indexes': [models.Index(fields=['user', '-score'], name='feed_usersi_user_id_1d93f5_idx')],
+                'unique_together': {('user', 'similar_user')},
+            },
+        ),
+    ]
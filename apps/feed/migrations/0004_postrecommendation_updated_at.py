@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0003_usersimilarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postrecommendation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата расчета'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_post_counters(apps, schema_editor):
+    Post = apps.get_model('feed', 'Post')
+
+    def count_of(model_name):
+        model = apps.get_model('feed', model_name)
+        return Coalesce(
+            Subquery(
+                model.objects.filter(post=OuterRef('pk')).order_by().values('post')
+                .annotate(total=Count('pk')).values('total')
+            ),
+            0
+        )
+
+    Post.objects.update(
+        likes_count=count_of('Like'),
+        comments_count=count_of('Comment'),
+        views_count=count_of('PostView'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0005_alter_usermodel_token'),
+        ('feed', '0004_postrecommendation_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество лайков'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество просмотров'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-likes_count', '-created_at'], name='feed_post_likes_c_25c37a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-views_count', '-created_at'], name='feed_post_views_c_87d370_idx'),
+        ),
+        migrations.RunPython(fill_post_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0005_post_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postview',
+            name='viewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата просмотра'),
+        ),
+    ]
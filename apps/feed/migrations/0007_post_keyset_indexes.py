@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0005_alter_usermodel_token'),
+        ('feed', '0006_postview_viewed_at_default'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='feed_post_created_e5d35a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='feed_post_author__48a596_idx',
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='feed_post_created_1a2ede_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='feed_post_author__4b069c_idx'),
+        ),
+    ]
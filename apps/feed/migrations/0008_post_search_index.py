@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from server.search import SearchIndex, get_search_backend
+
+
+def post_search_index(apps):
+    return SearchIndex(
+        'feed_post_search',
+        apps.get_model('feed', 'Post'),
+        {'title': 10.0, 'content': 1.0},
+    )
+
+
+def create_post_search_index(apps, schema_editor):
+    get_search_backend(schema_editor.connection).rebuild(post_search_index(apps))
+
+
+def drop_post_search_index(apps, schema_editor):
+    get_search_backend(schema_editor.connection).drop_index(post_search_index(apps))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0007_post_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_post_search_index, drop_post_search_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:16
+
+from datetime import timezone
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def fill_tag_daily_counts(apps, schema_editor):
+    PostTag = apps.get_model('feed', 'PostTag')
+    TagDailyCount = apps.get_model('feed', 'TagDailyCount')
+
+    rows = PostTag.objects.filter(post__is_published=True).annotate(
+        date=TruncDate('post__created_at', tzinfo=timezone.utc)
+    ).order_by().values('tag', 'date').annotate(total=Count('pk'))
+    TagDailyCount.objects.bulk_create(
+        [TagDailyCount(tag=row['tag'], date=row['date'], count=row['total']) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0008_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100, verbose_name='Тег')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+            ],
+            options={
+                'verbose_name': 'Счетчик тега за день',
+                'verbose_name_plural': 'Счетчики тегов по дням',
+                'indexes': [models.Index(fields=['date', 'tag'], name='feed_tagdai_date_6b41d2_idx')],
+                'unique_together': {('tag', 'date')},
+            },
+        ),
+        migrations.RunPython(fill_tag_daily_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:20
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_related_posts(apps, schema_editor):
+    PostTag = apps.get_model('feed', 'PostTag')
+    RelatedPost = apps.get_model('feed', 'RelatedPost')
+
+    post_tags = defaultdict(set)
+    tag_posts = defaultdict(list)
+    for post_id, tag, is_published in PostTag.objects.values_list(
+        'post_id', 'tag', 'post__is_published'
+    ).iterator():
+        post_tags[post_id].add(tag)
+        if is_published:
+            tag_posts[tag].append(post_id)
+
+    rows = []
+    for post_id, tags in post_tags.items():
+        common = defaultdict(int)
+        for tag in tags:
+            for other_id in tag_posts[tag]:
+                if other_id != post_id:
+                    common[other_id] += 1
+        related = sorted(
+            (
+                (count, count / (len(tags) + len(post_tags[other_id]) - count), str(other_id), other_id)
+                for other_id, count in common.items()
+            ),
+            reverse=True,
+        )[:10]
+        rows.extend(
+            RelatedPost(post_id=post_id, related_post_id=other_id, common_tags=count, score=score)
+            for count, score, _, other_id in related
+        )
+    RelatedPost.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0009_tagdailycount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('common_tags', models.PositiveIntegerField(default=0, verbose_name='Общие теги')),
+                ('score', models.FloatField(default=0.0, verbose_name='Коэффициент схожести')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата расчета')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_posts', to='feed.post', verbose_name='Пост')),
+                ('related_post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='feed.post', verbose_name='Похожий пост')),
+            ],
+            options={
+                'verbose_name': 'Похожий пост',
+                'verbose_name_plural': 'Похожие посты',
+                'indexes': [models.Index(fields=['post', '-common_tags', '-score'], name='feed_relate_post_id_3bf61b_idx')],
+                'unique_together': {('post', 'related_post')},
+            },
+        ),
+        migrations.RunPython(fill_related_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def fill_recommendation_states(apps, schema_editor):
+    PostRecommendation = apps.get_model('feed', 'PostRecommendation')
+    RecommendationState = apps.get_model('feed', 'RecommendationState')
+
+    RecommendationState.objects.bulk_create(
+        [
+            RecommendationState(user_id=user_id, computed_at=computed_at)
+            for user_id, computed_at in PostRecommendation.objects.order_by().values(
+                'user_id'
+            ).annotate(computed_at=Max('updated_at')).values_list('user_id', 'computed_at')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0009_balancetransaction'),
+        ('feed', '0010_relatedpost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation_state', serialize=False, to='api_auth.usermodel', verbose_name='Пользователь')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчета')),
+            ],
+            options={
+                'verbose_name': 'Состояние рекомендаций',
+                'verbose_name_plural': 'Состояния рекомендаций',
+            },
+        ),
+        migrations.RunPython(fill_recommendation_states, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from apps.api_auth.models import UserModel
 import uuid
@@ -42,6 +43,22 @@ class Post(models.Model):
         default=True,
         verbose_name="Опубликован"
     )
+    
+    # Денормализованные счетчики, обновляются атомарно через F()
+    # (см. update_counter) и сверяются командой reconcile_post_counters
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество лайков"
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество комментариев"
+    )
+    views_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество просмотров"
+    )
+    
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата создания"
@@ -56,25 +73,33 @@ class Post(models.Model):
         verbose_name_plural = "Посты"
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['-created_at']),
-            models.Index(fields=['author']),
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['author', '-created_at', '-id']),
             models.Index(fields=['is_published']),
+            models.Index(fields=['-likes_count', '-created_at']),
+            models.Index(fields=['-views_count', '-created_at']),
         ]
     
     def __str__(self):
         return f"{self.title} - {self.author.username}"
     
-    @property
-    def likes_count(self):
-        return self.likes.count()
-    
-    @property
-    def comments_count(self):
-        return self.comments.count()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Загруженное значение: сигналы сравнивают с ним, снят ли пост с публикации
+        instance._loaded_is_published = instance.__dict__.get('is_published')
+        return instance
     
-    @property
-    def views_count(self):
-        return self.views.count()
+    @classmethod
+    def update_counter(cls, post_id, field, delta):
+        """
+        Атомарно изменяет счетчик поста:
+        UPDATE ... SET field = GREATEST(field + delta, 0)
+        """
+        # Счетчик не уходит в минус, но уменьшение не пропускается целиком
+        cls.objects.filter(pk=post_id).update(
+            **{field: Greatest(models.F(field) + delta, 0)}
+        )
 
 
 class Comment(models.Model):
@@ -206,7 +231,7 @@ class PostView(models.Model):
         blank=True
     )
     viewed_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         verbose_name="Дата просмотра"
     )
     
@@ -258,6 +283,10 @@ class PostRecommendation(models.Model):
         auto_now_add=True,
         verbose_name="Дата создания"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата расчета"
+    )
     
     class Meta:
         verbose_name = "Рекомендация поста"
@@ -270,4 +299,245 @@ class PostRecommendation(models.Model):
         ]
     
     def __str__(self):
-        return f"Рекомендация {self.post.title} для {self.user.username}"
\ No newline at end of file
+        return f"Рекомендация {self.post.title} для {self.user.username}"
+
+
+class RecommendationState(models.Model):
+    """
+    Когда рекомендации пользователя последний раз сохранялись в
+    PostRecommendation: пустой список у рассчитанного пользователя не
+    пересчитывается на лету, а ждет фоновой задачи
+    """
+    user = models.OneToOneField(
+        UserModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation_state',
+        verbose_name="Пользователь"
+    )
+    computed_at = models.DateTimeField(
+        verbose_name="Дата расчета"
+    )
+    
+    class Meta:
+        verbose_name = "Состояние рекомендаций"
+        verbose_name_plural = "Состояния рекомендаций"
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.computed_at}"
+
+
+def normalize_tags(tags):
+    """
+    Приводит JSON-список тегов поста к списку уникальных непустых строк
+    """
+    if not isinstance(tags, list):
+        return []
+    
+    result = []
+    for tag in tags:
+        if not isinstance(tag, str):
+            continue
+        tag = tag[:PostTag.TAG_MAX_LENGTH]
+        if tag and tag not in result:
+            result.append(tag)
+    return result
+
+
+class PostTag(models.Model):
+    """
+    Инвертированный индекс тегов: тег -> пост.
+    Синхронизируется с Post.tags при сохранении поста (см. signals.py)
+    """
+    TAG_MAX_LENGTH = 100
+    
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        verbose_name="Пост"
+    )
+    tag = models.CharField(
+        max_length=TAG_MAX_LENGTH,
+        verbose_name="Тег"
+    )
+    
+    class Meta:
+        verbose_name = "Тег поста"
+        verbose_name_plural = "Теги постов"
+        unique_together = ['post', 'tag']
+        indexes = [
+            models.Index(fields=['tag', 'post']),
+        ]
+    
+    def __str__(self):
+        return f"{self.tag} -> {self.post_id}"
+    
+    @classmethod
+    def sync_post(cls, post):
+        """
+        Приводит записи индекса к текущему списку тегов поста.
+        Возвращает множества добавленных и удаленных тегов
+        """
+        new_tags = set(normalize_tags(post.tags))
+        existing_tags = set(
+            cls.objects.filter(post=post).values_list('tag', flat=True)
+        )
+        
+        removed_tags = existing_tags - new_tags
+        if removed_tags:
+            cls.objects.filter(post=post, tag__in=removed_tags).delete()
+        
+        added_tags = new_tags - existing_tags
+        if added_tags:
+            cls.objects.bulk_create(
+                [cls(post=post, tag=tag) for tag in added_tags],
+                ignore_conflicts=True
+            )
+        
+        return added_tags, removed_tags
+
+
+class TagDailyCount(models.Model):
+    """
+    Количество опубликованных постов с тегом по дням создания.
+    Пересчитывается для затронутых тегов при сохранении/удалении поста
+    (см. signals.py), используется для трендовых тегов
+    """
+    tag = models.CharField(
+        max_length=PostTag.TAG_MAX_LENGTH,
+        verbose_name="Тег"
+    )
+    date = models.DateField(verbose_name="Дата")
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество постов"
+    )
+    
+    class Meta:
+        verbose_name = "Счетчик тега за день"
+        verbose_name_plural = "Счетчики тегов по дням"
+        unique_together = ['tag', 'date']
+        indexes = [
+            models.Index(fields=['date', 'tag']),
+        ]
+    
+    def __str__(self):
+        return f"{self.tag} {self.date}: {self.count}"
+    
+    @classmethod
+    def refresh(cls, tags, created_at):
+        """
+        Пересчитывает счетчики тегов за день, в который создан пост
+        """
+        tags = set(tags)
+        if not tags:
+            return
+        
+        day_start = created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+        counts = dict(
+            PostTag.objects.filter(
+                tag__in=tags,
+                post__is_published=True,
+                post__created_at__gte=day_start,
+                post__created_at__lt=day_start + timezone.timedelta(days=1)
+            ).order_by().values('tag').annotate(
+                total=models.Count('pk')
+            ).values_list('tag', 'total')
+        )
+        
+        day = day_start.date()
+        empty_tags = tags - counts.keys()
+        if empty_tags:
+            cls.objects.filter(tag__in=empty_tags, date=day).delete()
+        if counts:
+            cls.objects.bulk_create(
+                [cls(tag=tag, date=day, count=total) for tag, total in counts.items()],
+                update_conflicts=True,
+                unique_fields=['tag', 'date'],
+                update_fields=['count']
+            )
+
+
+class UserSimilarity(models.Model):
+    """
+    Похожие пользователи (соседи) для коллаборативной фильтрации.
+    Пересчитывается офлайн, см. collaborative.py
+    """
+    user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        related_name='similar_users',
+        verbose_name="Пользователь"
+    )
+    similar_user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Похожий пользователь"
+    )
+    score = models.FloatField(
+        default=0.0,
+        verbose_name="Коэффициент схожести"
+    )
+    common_likes = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Общие лайки"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата расчета"
+    )
+    
+    class Meta:
+        verbose_name = "Похожий пользователь"
+        verbose_name_plural = "Похожие пользователи"
+        unique_together = ['user', 'similar_user']
+        indexes = [
+            models.Index(fields=['user', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} ~ {self.similar_user_id} ({self.score:.2f})"
+
+
+class RelatedPost(models.Model):
+    """
+    Похожие посты по общим тегам (top-N для каждого поста).
+    Обновляется при изменении тегов поста, см. related.py
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_posts',
+        verbose_name="Пост"
+    )
+    related_post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Похожий пост"
+    )
+    common_tags = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Общие теги"
+    )
+    score = models.FloatField(
+        default=0.0,
+        verbose_name="Коэффициент схожести"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата расчета"
+    )
+    
+    class Meta:
+        verbose_name = "Похожий пост"
+        verbose_name_plural = "Похожие посты"
+        unique_together = ['post', 'related_post']
+        indexes = [
+            models.Index(fields=['post', '-common_tags', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.post_id} ~ {self.related_post_id} ({self.common_tags})"
@@ -0,0 +1,229 @@
+"""
+Похожие посты по общим тегам.
+
+Для каждого поста в RelatedPost хранится top-N опубликованных постов
+с наибольшим числом общих тегов (при равенстве - по коэффициенту Жаккара).
+Кандидаты ищутся через инвертированный индекс PostTag, поэтому при
+изменении тегов поста пересчитываются только его список, списки постов,
+где он уже был, и списки соседей, в которые он теперь попадает. Этот
+пересчет ставится задачей после коммита (schedule_related_posts_refresh)
+и не выполняется в запросе, сохраняющем пост; так же после удаления поста
+задачей пересчитываются списки, где он был
+(schedule_related_posts_of_refresh).
+"""
+import logging
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import PostTag, RelatedPost
+
+logger = logging.getLogger(__name__)
+
+
+RELATED_POSTS_LIMIT = 10  # Сколько похожих постов хранить для поста
+CANDIDATES_LIMIT = 200  # Сколько кандидатов с наибольшим пересечением рассматривать
+
+
+def _rank(item):
+    related_id, common_tags, score = item
+    return common_tags, score, str(related_id)
+
+
+def _similarity(common_tags, tags_count, other_tags_count):
+    return common_tags / (tags_count + other_tags_count - common_tags)
+
+
+def _tags_count_of(post_ids):
+    return dict(
+        PostTag.objects.filter(post_id__in=post_ids).order_by().values('post_id').annotate(
+            total=Count('pk')
+        ).values_list('post_id', 'total')
+    )
+
+
+def find_related_posts(post_id, limit=RELATED_POSTS_LIMIT):
+    """
+    Возвращает [(id похожего поста, общие теги, коэффициент Жаккара), ...]
+    по убыванию схожести
+    """
+    tags = list(PostTag.objects.filter(post_id=post_id).values_list('tag', flat=True))
+    if not tags:
+        return []
+
+    candidates = list(
+        PostTag.objects.filter(
+            tag__in=tags,
+            post__is_published=True
+        ).exclude(
+            post_id=post_id
+        ).order_by().values('post_id').annotate(
+            common=Count('pk')
+        ).order_by('-common').values_list('post_id', 'common')[:CANDIDATES_LIMIT]
+    )
+    tags_count = _tags_count_of([candidate_id for candidate_id, _ in candidates])
+
+    related = [
+        (candidate_id, common, _similarity(common, len(tags), tags_count[candidate_id]))
+        for candidate_id, common in candidates
+    ]
+    related.sort(key=_rank, reverse=True)
+    return related[:limit]
+
+
+def _replace_related(post_id, related):
+    RelatedPost.objects.filter(post_id=post_id).delete()
+    RelatedPost.objects.bulk_create([
+        RelatedPost(post_id=post_id, related_post_id=related_id, common_tags=common, score=score)
+        for related_id, common, score in related
+    ])
+
+
+@transaction.atomic
+def refresh_related_posts(post):
+    """
+    Обновляет похожие посты после изменения тегов или публикации поста
+    """
+    # Посты, в списках которых был этот пост, пересчитываем полностью:
+    # пост мог потерять общие теги или сняться с публикации
+    listed_in = set(
+        RelatedPost.objects.filter(related_post_id=post.pk).values_list('post_id', flat=True)
+    )
+    for other_id in listed_in:
+        _replace_related(other_id, find_related_posts(other_id))
+
+    candidates = find_related_posts(post.pk, limit=CANDIDATES_LIMIT)
+    _replace_related(post.pk, candidates[:RELATED_POSTS_LIMIT])
+
+    if not post.is_published:
+        return
+
+    # Схожесть симметрична: добавляем пост в списки соседей, если он туда проходит
+    neighbours = {
+        related_id: (common, score)
+        for related_id, common, score in candidates
+        if related_id not in listed_in
+    }
+    if not neighbours:
+        return
+
+    current = defaultdict(list)
+    for row in RelatedPost.objects.filter(post_id__in=neighbours):
+        current[row.post_id].append((row.related_post_id, row.common_tags, row.score))
+
+    new_rows = []
+    trimmed = []
+    for neighbour_id, (common, score) in neighbours.items():
+        entries = sorted(current[neighbour_id] + [(post.pk, common, score)], key=_rank, reverse=True)
+        kept = entries[:RELATED_POSTS_LIMIT]
+        if (post.pk, common, score) not in kept:
+            continue
+        new_rows.append(RelatedPost(
+            post_id=neighbour_id, related_post_id=post.pk, common_tags=common, score=score
+        ))
+        trimmed.extend((neighbour_id, related_id) for related_id, _, _ in entries[RELATED_POSTS_LIMIT:])
+
+    if trimmed:
+        RelatedPost.objects.filter(reduce(operator.or_, (
+            Q(post_id=neighbour_id, related_post_id=related_id)
+            for neighbour_id, related_id in trimmed
+        ))).delete()
+    RelatedPost.objects.bulk_create(new_rows)
+
+
+def schedule_related_posts_refresh(post_id):
+    """
+    После коммита ставит задачу refresh_related_posts для поста.
+    Если брокер недоступен, списки поправит rebuild_related_posts_task
+    """
+    from .tasks import refresh_related_posts_task
+
+    def enqueue():
+        try:
+            refresh_related_posts_task.delay(str(post_id))
+        except Exception:
+            logger.warning(
+                f"Could not schedule related posts refresh for post {post_id}, "
+                f"it will be fixed by rebuild_related_posts_task",
+                exc_info=True
+            )
+
+    transaction.on_commit(enqueue)
+
+
+def schedule_related_posts_of_refresh(post_ids):
+    """
+    После коммита ставит задачу refresh_related_posts_of для постов.
+    Если брокер недоступен, списки поправит rebuild_related_posts_task
+    """
+    from .tasks import refresh_related_posts_of_task
+
+    post_ids = [str(post_id) for post_id in post_ids]
+    if not post_ids:
+        return
+
+    def enqueue():
+        try:
+            refresh_related_posts_of_task.delay(post_ids)
+        except Exception:
+            logger.warning(
+                f"Could not schedule related posts refresh for {len(post_ids)} posts, "
+                f"they will be fixed by rebuild_related_posts_task",
+                exc_info=True
+            )
+
+    transaction.on_commit(enqueue)
+
+
+def refresh_related_posts_of(post_ids):
+    """Пересчитывает списки похожих постов для переданных постов"""
+    with transaction.atomic():
+        for post_id in post_ids:
+            _replace_related(post_id, find_related_posts(post_id))
+
+
+def rebuild_related_posts(limit=RELATED_POSTS_LIMIT):
+    """
+    Пересчитывает таблицу RelatedPost целиком в памяти.
+    Возвращает количество сохраненных пар
+    """
+    post_tags = defaultdict(set)
+    published = set()
+    for post_id, tag, is_published in PostTag.objects.values_list(
+        'post_id', 'tag', 'post__is_published'
+    ).iterator(chunk_size=5000):
+        post_tags[post_id].add(tag)
+        if is_published:
+            published.add(post_id)
+
+    tag_posts = defaultdict(list)
+    for post_id in published:
+        for tag in post_tags[post_id]:
+            tag_posts[tag].append(post_id)
+
+    rows = []
+    for post_id, tags in post_tags.items():
+        common = defaultdict(int)
+        for tag in tags:
+            for other_id in tag_posts[tag]:
+                if other_id != post_id:
+                    common[other_id] += 1
+
+        related = [
+            (other_id, count, _similarity(count, len(tags), len(post_tags[other_id])))
+            for other_id, count in common.items()
+        ]
+        related.sort(key=_rank, reverse=True)
+        rows.extend(
+            RelatedPost(post_id=post_id, related_post_id=other_id, common_tags=count, score=score)
+            for other_id, count, score in related[:limit]
+        )
+
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
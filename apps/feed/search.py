@@ -0,0 +1,15 @@
+"""
+Полнотекстовый индекс постов (см. server/search.py).
+Заголовок весит больше содержания; индекс обновляется сигналами.
+"""
+from server.search import SearchIndex
+
+from .models import Post
+
+
+POST_SEARCH_FIELDS = {
+    'title': 10.0,
+    'content': 1.0,
+}
+
+post_search_index = SearchIndex('feed_post_search', Post, POST_SEARCH_FIELDS)
@@ -1,6 +1,15 @@
 from rest_framework import serializers
 from .models import Post, Comment, Like, PostView, PostRecommendation
 from apps.api_auth.models import UserModel
+from apps.api_auth.viewer_flags import ViewerFlagsMixin, ViewerFlagsListSerializer
+from .utils import CommentTree, get_comment_tree_options
+
+
+def get_liked_post_ids(user, post_ids):
+    """ID постов из списка, которые лайкнул пользователь (один запрос)"""
+    return set(
+        Like.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', flat=True)
+    )
 
 
 class UserBasicSerializer(serializers.ModelSerializer):
@@ -15,27 +24,58 @@ class UserBasicSerializer(serializers.ModelSerializer):
 
 class CommentSerializer(serializers.ModelSerializer):
     """
-    Сериализатор для комментариев
+    Сериализатор для комментариев.
+    Ответы берутся из дерева комментариев поста (context['comment_tree']),
+    которое загружается одним запросом на весь пост
     """
     author = UserBasicSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
     replies_count = serializers.SerializerMethodField()
+    has_more_replies = serializers.SerializerMethodField()
     
     class Meta:
         model = Comment
         fields = [
             'id', 'post', 'author', 'parent', 'content', 
-            'created_at', 'updated_at', 'replies', 'replies_count'
+            'created_at', 'updated_at', 'replies', 'replies_count',
+            'has_more_replies'
         ]
         read_only_fields = ['id', 'author', 'created_at', 'updated_at']
     
+    def _get_tree(self, obj):
+        tree = self.context.get('comment_tree')
+        if tree is None or tree.post_id != obj.post_id:
+            tree = CommentTree.for_post(obj.post_id)
+            self.context['comment_tree'] = tree
+        return tree
+    
+    def _get_options(self):
+        if 'comment_max_depth' not in self.context:
+            self.context.update(get_comment_tree_options())
+        return self.context['comment_max_depth'], self.context['comment_replies_limit']
+    
     def get_replies(self, obj):
-        if obj.replies.exists():
-            return CommentSerializer(obj.replies.all(), many=True, context=self.context).data
-        return []
+        max_depth, replies_limit = self._get_options()
+        depth = self.context.get('comment_depth', 0)
+        if depth + 1 >= max_depth:
+            return []
+        
+        replies = self._get_tree(obj).get_replies(obj.id)[:replies_limit]
+        if not replies:
+            return []
+        
+        context = {**self.context, 'comment_depth': depth + 1}
+        return CommentSerializer(replies, many=True, context=context).data
     
     def get_replies_count(self, obj):
-        return obj.replies.count()
+        return len(self._get_tree(obj).get_replies(obj.id))
+    
+    def get_has_more_replies(self, obj):
+        max_depth, replies_limit = self._get_options()
+        total = self.get_replies_count(obj)
+        if self.context.get('comment_depth', 0) + 1 >= max_depth:
+            return total > 0
+        return total > replies_limit
     
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
@@ -58,10 +98,12 @@ class LikeSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PostListSerializer(serializers.ModelSerializer):
+class PostListSerializer(ViewerFlagsMixin, serializers.ModelSerializer):
     """
     Сериализатор для списка постов (краткая информация)
     """
+    viewer_flags = {'is_liked': get_liked_post_ids}
+    
     author = UserBasicSerializer(read_only=True)
     likes_count = serializers.SerializerMethodField()
     comments_count = serializers.SerializerMethodField()
@@ -80,12 +122,10 @@ class PostListSerializer(serializers.ModelSerializer):
             'id', 'author', 'likes_count', 'comments_count', 
             'views_count', 'created_at', 'updated_at'
         ]
+        list_serializer_class = ViewerFlagsListSerializer
     
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request, 'user') and request.user and request.user.is_authenticated:
-            return Like.objects.filter(post=obj, user=request.user).exists()
-        return False
+        return self.get_viewer_flag('is_liked', obj)
     
     def get_likes_count(self, obj):
         return obj.likes_count
@@ -101,10 +141,12 @@ class PostListSerializer(serializers.ModelSerializer):
         return obj.content[:200] + '...' if len(obj.content) > 200 else obj.content
 
 
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostDetailSerializer(ViewerFlagsMixin, serializers.ModelSerializer):
     """
     Сериализатор для детального просмотра поста
     """
+    viewer_flags = {'is_liked': get_liked_post_ids}
+    
     author = UserBasicSerializer(read_only=True)
     likes_count = serializers.SerializerMethodField()
     comments_count = serializers.SerializerMethodField()
@@ -134,15 +176,18 @@ class PostDetailSerializer(serializers.ModelSerializer):
         return obj.views_count
     
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request, 'user') and request.user and request.user.is_authenticated:
-            return Like.objects.filter(post=obj, user=request.user).exists()
-        return False
+        return self.get_viewer_flag('is_liked', obj)
     
     def get_comments(self, obj):
-        # Получаем только комментарии верхнего уровня (без родителя)
-        top_level_comments = obj.comments.filter(parent=None).order_by('created_at')
-        return CommentSerializer(top_level_comments, many=True, context=self.context).data
+        # Все комментарии поста одним запросом, в ответе - дерево от верхнего уровня
+        tree = CommentTree.for_post(obj.id)
+        request = self.context.get('request')
+        context = {
+            **self.context,
+            **get_comment_tree_options(request.query_params if request else None),
+            'comment_tree': tree,
+        }
+        return CommentSerializer(tree.roots, many=True, context=context).data
 
 
 class PostCreateUpdateSerializer(serializers.ModelSerializer):
@@ -195,6 +240,11 @@ class PostRecommendationSerializer(serializers.ModelSerializer):
         model = PostRecommendation
         fields = ['id', 'user', 'post', 'score', 'reason', 'created_at']
         read_only_fields = ['id', 'user', 'post', 'score', 'reason', 'created_at']
+        list_serializer_class = ViewerFlagsListSerializer
+    
+    def prefetch_viewer_flags(self, instances):
+        # Флаги вложенных постов разрешаем сразу для всей страницы
+        self.fields['post'].prefetch_viewer_flags([obj.post for obj in instances])
 
 
 class PostSearchSerializer(serializers.Serializer):
@@ -210,7 +260,8 @@ class PostSearchSerializer(serializers.Serializer):
     author = serializers.CharField(max_length=255, required=False, allow_blank=True)
     date_from = serializers.DateTimeField(required=False)
     date_to = serializers.DateTimeField(required=False)
+    # По умолчанию: relevance при наличии query, иначе -created_at
     ordering = serializers.ChoiceField(
-        choices=['-created_at', 'created_at', '-likes_count', '-views_count'],
-        default='-created_at'
+        choices=['relevance', '-created_at', 'created_at', '-likes_count', '-views_count'],
+        required=False
     )
\ No newline at end of file
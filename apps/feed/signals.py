@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Post, PostTag, RelatedPost, TagDailyCount, normalize_tags
+from .related import schedule_related_posts_of_refresh, schedule_related_posts_refresh
+from .search import POST_SEARCH_FIELDS, post_search_index
+
+
+@receiver(post_save, sender=Post)
+def sync_post_tag_index(sender, instance, update_fields=None, **kwargs):
+    """
+    Обновляет инвертированный индекс тегов, дневные счетчики тегов
+    и похожие посты, если у поста изменились теги или публикация
+    """
+    if update_fields is not None and not {'tags', 'is_published'} & set(update_fields):
+        return
+    added_tags, removed_tags = PostTag.sync_post(instance)
+    published_changed = getattr(instance, '_loaded_is_published', None) != instance.is_published
+    instance._loaded_is_published = instance.is_published
+    if not (added_tags or removed_tags or published_changed):
+        return
+
+    TagDailyCount.refresh(
+        set(normalize_tags(instance.tags)) | removed_tags, instance.created_at
+    )
+    # Пересчет списков похожих постов не ограничен по объему - выполняется задачей
+    schedule_related_posts_refresh(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def sync_post_search_index(sender, instance, update_fields=None, **kwargs):
+    """Обновляет полнотекстовый индекс при изменении заголовка или содержания"""
+    if update_fields is not None and not POST_SEARCH_FIELDS.keys() & set(update_fields):
+        return
+    post_search_index.update([instance])
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_search_index(sender, instance, **kwargs):
+    post_search_index.delete([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_tag_counts(sender, instance, **kwargs):
+    TagDailyCount.refresh(normalize_tags(instance.tags), instance.created_at)
+
+
+
+@receiver(pre_delete, sender=Post)
+def remember_posts_listing_post(sender, instance, **kwargs):
+    instance._listed_in_related = list(
+        RelatedPost.objects.filter(related_post=instance).values_list('post_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def refresh_related_posts_after_delete(sender, instance, **kwargs):
+    """Заполняет освободившиеся места в списках похожих постов задачей после коммита"""
+    schedule_related_posts_of_refresh(getattr(instance, '_listed_in_related', []))
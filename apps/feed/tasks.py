@@ -0,0 +1,96 @@
+from celery import shared_task
+from .collaborative import rebuild_user_similarity
+from .models import Post
+from .related import rebuild_related_posts, refresh_related_posts, refresh_related_posts_of
+from .utils import materialize_recommendations
+from .trending import refresh_trending
+from .view_tracking import get_post_view_recorder
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def rebuild_user_similarity_task():
+    """
+    Пересчитывает похожих пользователей для коллаборативной фильтрации
+    """
+    pairs_count = rebuild_user_similarity()
+    logger.info(f"Rebuilt user similarity: {pairs_count} pairs")
+    return f"Rebuilt user similarity: {pairs_count} pairs"
+
+
+@shared_task
+def compute_post_recommendations():
+    """
+    Пересчитывает сохраненные рекомендации постов для активных пользователей
+    """
+    users_count, recommendations_count = materialize_recommendations()
+    logger.info(
+        f"Computed {recommendations_count} recommendations for {users_count} active users"
+    )
+    return f"Computed {recommendations_count} recommendations for {users_count} users"
+
+
+@shared_task
+def flush_post_views():
+    """
+    Сохраняет накопленные просмотры постов в базу
+    """
+    recorder = get_post_view_recorder()
+    if not recorder.buffer.shared:
+        # Буфер в памяти веб-процессов, они сбрасывают его сами
+        return "Skipped: post views buffer is process-local"
+    
+    views_count = recorder.flush()
+    
+    if views_count > 0:
+        logger.info(f"Saved {views_count} post views")
+    
+    return f"Saved {views_count} post views"
+
+
+@shared_task
+def refresh_feed_trending():
+    """
+    Пересчитывает трендовые теги и популярные посты в общем кэше
+    """
+    trending = refresh_trending()
+    return (
+        f"Cached {len(trending['tags'])} trending tags "
+        f"and {len(trending['popular_posts'])} popular posts"
+    )
+
+
+@shared_task
+def refresh_related_posts_task(post_id):
+    """
+    Обновляет похожие посты после изменения тегов или публикации поста
+    """
+    post = Post.objects.filter(pk=post_id).only('id', 'is_published').first()
+    if post is None:
+        return "Post not found"
+    refresh_related_posts(post)
+    return f"Refreshed related posts of {post_id}"
+
+
+@shared_task
+def refresh_related_posts_of_task(post_ids):
+    """
+    Заполняет освободившиеся места в списках похожих постов
+    после удаления поста, который в них был
+    """
+    # Посты могли быть удалены, пока задача ждала в очереди
+    existing_ids = list(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+    refresh_related_posts_of(existing_ids)
+    return f"Refreshed related posts of {len(existing_ids)} posts"
+
+
+@shared_task
+def rebuild_related_posts_task():
+    """
+    Полностью пересчитывает похожие посты (поправляет приближения
+    инкрементального обновления)
+    """
+    pairs_count = rebuild_related_posts()
+    logger.info(f"Rebuilt related posts: {pairs_count} pairs")
+    return f"Rebuilt related posts: {pairs_count} pairs"
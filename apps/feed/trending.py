@@ -0,0 +1,112 @@
+"""
+Трендовые теги и рейтинг популярных постов за неделю.
+
+Оба списка общие для всех пользователей, поэтому считаются только задачей
+refresh_feed_trending по расписанию и хранятся в общем кэше
+(CACHES[CACHE_ALIAS], см. server/cache.py). Запросы лишь читают
+сохраненное значение и считают его сами, только если записи нет
+(первый запуск, очищенный кэш). Настраивается через settings.FEED_TRENDING.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from server.cache import StaleWhileRevalidateCache
+from .models import Post, TagDailyCount
+
+
+DEFAULT_TRENDING_SETTINGS = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 3600,  # секунды, больше интервала refresh_feed_trending
+    'DAYS': 7,
+    'TAGS_LIMIT': 20,
+    'POPULAR_LIMIT': 100,
+}
+
+
+def get_trending_settings():
+    return {**DEFAULT_TRENDING_SETTINGS, **getattr(settings, 'FEED_TRENDING', {})}
+
+
+def compute_trending_tags(days=7, limit=20):
+    """
+    Популярные теги за последние дни по дневным счетчикам тегов.
+    Возвращает список (тег, количество постов)
+    """
+    since_date = (timezone.now() - timedelta(days=days)).date()
+
+    trending_tags = TagDailyCount.objects.filter(
+        date__gte=since_date
+    ).values('tag').annotate(
+        total=Sum('count')
+    ).order_by('-total', 'tag').values_list('tag', 'total')
+
+    return [(tag, total) for tag, total in trending_tags[:limit]]
+
+
+def compute_popular_posts(days=7, limit=100):
+    """
+    Рейтинг опубликованных постов за последние дни.
+    Возвращает список (id поста, рейтинг популярности)
+    """
+    since = timezone.now() - timedelta(days=days)
+
+    popular_posts = Post.objects.filter(
+        is_published=True,
+        created_at__gte=since
+    ).annotate(
+        popularity_score=(
+            F('likes_count') * 3 +  # Лайки весят больше
+            F('comments_count') * 2 +  # Комментарии тоже важны
+            F('views_count')  # Просмотры учитываются
+        )
+    ).filter(
+        popularity_score__gt=0
+    ).order_by('-popularity_score', '-created_at').values_list('id', 'popularity_score')
+
+    return [(str(post_id), score) for post_id, score in popular_posts[:limit]]
+
+
+def compute_trending():
+    options = get_trending_settings()
+    return {
+        'tags': compute_trending_tags(options['DAYS'], options['TAGS_LIMIT']),
+        'popular_posts': compute_popular_posts(options['DAYS'], options['POPULAR_LIMIT']),
+    }
+
+
+_trending_cache = None
+_trending_cache_lock = threading.Lock()
+
+
+def get_trending_cache():
+    global _trending_cache
+    if _trending_cache is None:
+        with _trending_cache_lock:
+            if _trending_cache is None:
+                options = get_trending_settings()
+                _trending_cache = StaleWhileRevalidateCache(
+                    'feed:trending',
+                    compute_trending,
+                    fresh_timeout=options['TIMEOUT'],
+                    stale_timeout=options['TIMEOUT'],
+                    cache_alias=options['CACHE_ALIAS'],
+                    revalidate=False,
+                )
+    return _trending_cache
+
+
+def get_trending():
+    """
+    Возвращает {'tags': [...], 'popular_posts': [...], 'computed_at': unix time}
+    """
+    entry = get_trending_cache().get_entry()
+    return {**entry['value'], 'computed_at': entry['computed_at']}
+
+
+def refresh_trending():
+    """Пересчитывает трендовые теги и популярные посты в кэше"""
+    return get_trending_cache().refresh()
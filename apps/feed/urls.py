@@ -7,6 +7,7 @@ urlpatterns = [
     # Посты
     path('posts/', views.PostListCreateView.as_view(), name='post-list-create'),
     path('posts/<int:pk>/', views.PostDetailView.as_view(), name='post-detail'),
+    path('posts/<uuid:post_id>/similar/', views.get_similar_posts, name='similar-posts'),
     
     # Комментарии
     path('posts/<int:post_id>/comments/', views.CommentListCreateView.as_view(), name='comment-list-create'),
@@ -20,6 +21,7 @@ urlpatterns = [
     
     # Рекомендации
     path('recommendations/', views.get_recommendations, name='recommendations'),
+    path('trending/', views.get_trending_feed, name='trending'),
     
     # Посты пользователя
     path('my-posts/', views.get_user_posts, name='my-posts'),
@@ -1,9 +1,79 @@
-from django.db.models import Count, Q, F
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, F, Sum, Case, When, Value, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
-from datetime import timedelta
-from .models import Post, Like, PostView, Comment
+from datetime import timedelta, timezone as dt_timezone
+from .models import (
+    Post, Like, PostView, Comment, PostTag, TagDailyCount, UserSimilarity, PostRecommendation,
+    RecommendationState, RelatedPost
+)
 from apps.api_auth.models import UserModel
-import random
+from .related import find_related_posts
+from .trending import compute_trending_tags, get_trending, get_trending_settings
+from collections import defaultdict
+
+
+MATERIALIZED_RECOMMENDATIONS_LIMIT = 50  # Сколько рекомендаций хранить на пользователя
+
+DEFAULT_COMMENT_TREE_SETTINGS = {
+    'MAX_DEPTH': 5,  # Уровней вложенности в ответе, включая верхний
+    'REPLIES_PER_LEVEL': 10,  # Ответов на комментарий по умолчанию
+    'MAX_REPLIES_PER_LEVEL': 50,  # Верхняя граница для параметра replies_limit
+}
+
+
+class CommentTree:
+    """
+    Дерево комментариев поста, загруженное одним запросом
+    и собранное в памяти по parent_id
+    """
+    
+    def __init__(self, post_id, comments):
+        self.post_id = post_id
+        self.roots = []
+        self._replies = defaultdict(list)
+        for comment in comments:
+            if comment.parent_id is None:
+                self.roots.append(comment)
+            else:
+                self._replies[comment.parent_id].append(comment)
+    
+    @classmethod
+    def for_post(cls, post_id):
+        comments = Comment.objects.filter(
+            post_id=post_id
+        ).select_related('author').order_by('created_at')
+        return cls(post_id, comments)
+    
+    def get_replies(self, comment_id):
+        return self._replies.get(comment_id, [])
+
+
+def get_comment_tree_options(query_params=None):
+    """
+    Параметры вывода дерева комментариев для контекста сериализатора.
+    depth и replies_limit из запроса ограничены настройками FEED_COMMENT_TREE
+    """
+    options = {
+        **DEFAULT_COMMENT_TREE_SETTINGS,
+        **getattr(settings, 'FEED_COMMENT_TREE', {}),
+    }
+    query_params = query_params or {}
+    
+    def read_int(name, default, maximum):
+        try:
+            value = int(query_params.get(name, default))
+        except (TypeError, ValueError):
+            value = default
+        return max(1, min(value, maximum))
+    
+    return {
+        'comment_max_depth': read_int('depth', options['MAX_DEPTH'], options['MAX_DEPTH']),
+        'comment_replies_limit': read_int(
+            'replies_limit', options['REPLIES_PER_LEVEL'], options['MAX_REPLIES_PER_LEVEL']
+        ),
+    }
 
 
 class RecommendationEngine:
@@ -24,34 +94,46 @@ class RecommendationEngine:
         self.collaborative_weight = 0.3  # Вес коллаборативной фильтрации
         self.popularity_weight = 0.2  # Вес популярности
         self.freshness_weight = 0.1  # Вес новизны
+        
+        self.max_user_tags = 20  # Сколько любимых тегов пользователя учитывать
+        self.content_candidates_limit = 100  # Кандидатов из индекса тегов
     
     def get_recommendations_for_user(self, user, limit=20):
         """
         Получить рекомендации для пользователя
         """
+        return [post for post, score, reason in self.score_recommendations(user, limit)]
+    
+    def score_recommendations(self, user, limit=20):
+        """
+        Рассчитать рекомендации для пользователя.
+        Возвращает список (post, score, reason), отсортированный по убыванию рейтинга
+        """
         # Получаем все посты, исключая посты самого пользователя
-        base_queryset = Post.objects.filter(
+        # и посты, которые пользователь уже просматривал
+        viewed_posts = PostView.objects.filter(user=user).values_list('post_id', flat=True)
+        candidates = Post.objects.filter(
             is_published=True
         ).exclude(
             author=user
-        ).select_related('author').annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments'),
-            views_count=Count('views')
+        ).exclude(
+            id__in=viewed_posts
         )
         
-        # Исключаем посты, которые пользователь уже просматривал
-        viewed_posts = PostView.objects.filter(user=user).values_list('post_id', flat=True)
-        base_queryset = base_queryset.exclude(id__in=viewed_posts)
+        base_queryset = candidates.select_related('author')
         
         recommendations = []
         
         # 1. Контентная фильтрация
-        content_recommendations = self._get_content_based_recommendations(user, base_queryset)
+        content_recommendations = self._get_content_based_recommendations(
+            user, base_queryset, candidates
+        )
         recommendations.extend(content_recommendations)
         
         # 2. Коллаборативная фильтрация
-        collaborative_recommendations = self._get_collaborative_recommendations(user, base_queryset)
+        collaborative_recommendations = self._get_collaborative_recommendations(
+            user, base_queryset, candidates
+        )
         recommendations.extend(collaborative_recommendations)
         
         # 3. Популярные посты
@@ -81,108 +163,145 @@ class RecommendationEngine:
             reverse=True
         )
         
-        return [post for post, score, reason in sorted_recommendations[:limit]]
+        return sorted_recommendations[:limit]
     
-    def _get_content_based_recommendations(self, user, queryset):
+    def materialize_for_users(self, users, limit=MATERIALIZED_RECOMMENDATIONS_LIMIT):
         """
-        Контентная фильтрация на основе тегов лайкнутых постов
+        Рассчитать и сохранить рекомендации в PostRecommendation.
+        Записи пользователей обновляются одним bulk upsert, устаревшие удаляются.
+        Возвращает количество сохраненных рекомендаций
         """
-        # Получаем теги постов, которые лайкал пользователь
-        liked_posts = Like.objects.filter(user=user).values_list('post', flat=True)
-        user_tags = []
-        
-        for post in Post.objects.filter(id__in=liked_posts):
-            if post.tags:
-                user_tags.extend(post.tags)
+        users = list(users)
+        if not users:
+            return 0
+        
+        computed_at = timezone.now()
+        rows = []
+        for user in users:
+            for post, score, reason in self.score_recommendations(user, limit):
+                rows.append(PostRecommendation(
+                    user=user,
+                    post=post,
+                    score=score,
+                    reason=reason[:255]
+                ))
+        
+        with transaction.atomic():
+            PostRecommendation.objects.bulk_create(
+                rows,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['user', 'post'],
+                update_fields=['score', 'reason', 'updated_at']
+            )
+            # Рекомендации, не попавшие в новый расчет
+            PostRecommendation.objects.filter(
+                user__in=users,
+                updated_at__lt=computed_at
+            ).delete()
+            # Отмечаем расчет, даже если рекомендаций не нашлось
+            RecommendationState.objects.bulk_create(
+                [RecommendationState(user=user, computed_at=computed_at) for user in users],
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['computed_at']
+            )
         
-        if not user_tags:
+        return len(rows)
+    
+    def _get_content_based_recommendations(self, user, queryset, candidates):
+        """
+        Контентная фильтрация на основе тегов лайкнутых постов.
+        Кандидаты берутся из индекса PostTag по любимым тегам пользователя,
+        поэтому стоимость зависит от числа подходящих постов, а не всех постов
+        """
+        # Частота тегов среди постов, которые лайкал пользователь
+        user_tags = PostTag.objects.filter(
+            post__likes__user=user
+        ).values('tag').annotate(
+            weight=Count('id')
+        ).order_by('-weight')[:self.max_user_tags]
+        
+        tag_counts = {row['tag']: row['weight'] for row in user_tags}
+        if not tag_counts:
             return []
         
-        # Подсчитываем частоту тегов
-        tag_counts = {}
-        for tag in user_tags:
-            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        # Суммарный вес совпавших тегов для каждого поста-кандидата
+        scored_posts = PostTag.objects.filter(
+            tag__in=tag_counts.keys(),
+            post__in=candidates
+        ).values('post_id').annotate(
+            tag_score=Sum(
+                Case(
+                    *[When(tag=tag, then=Value(count)) for tag, count in tag_counts.items()],
+                    default=Value(0),
+                    output_field=IntegerField()
+                )
+            )
+        ).order_by('-tag_score')[:self.content_candidates_limit]
         
-        recommendations = []
+        scores = {row['post_id']: row['tag_score'] for row in scored_posts}
+        if not scores:
+            return []
         
-        # Ищем посты с похожими тегами
-        for post in queryset:
-            if not post.tags:
-                continue
-            
-            score = 0
-            for tag in post.tags:
-                if tag in tag_counts:
-                    score += tag_counts[tag] * self.content_weight
-            
-            if score > 0:
-                recommendations.append((post, score, "похожие интересы"))
+        recommendations = []
+        for post in queryset.filter(id__in=scores.keys()):
+            score = scores[post.id] * self.content_weight
+            recommendations.append((post, score, "похожие интересы"))
         
         return recommendations
     
-    def _get_collaborative_recommendations(self, user, queryset):
+    def _get_collaborative_recommendations(self, user, queryset, candidates):
         """
-        Коллаборативная фильтрация на основе похожих пользователей
+        Коллаборативная фильтрация на основе похожих пользователей.
+        Соседи пользователя заранее рассчитаны в UserSimilarity (см. collaborative.py)
         """
-        # Находим пользователей с похожими интересами
-        user_likes = set(Like.objects.filter(user=user).values_list('post_id', flat=True))
+        # Топ 10 похожих пользователей
+        similar_users = dict(
+            UserSimilarity.objects.filter(
+                user=user
+            ).order_by('-score').values_list('similar_user_id', 'score')[:10]
+        )
         
-        if not user_likes:
+        if not similar_users:
             return []
         
-        similar_users = []
-        
-        # Ищем пользователей, которые лайкали те же посты
-        for other_user in UserModel.objects.exclude(id=user.id):
-            other_likes = set(Like.objects.filter(user=other_user).values_list('post_id', flat=True))
-            
-            if not other_likes:
-                continue
-            
-            # Вычисляем коэффициент Жаккара (пересечение / объединение)
-            intersection = len(user_likes.intersection(other_likes))
-            union = len(user_likes.union(other_likes))
-            
-            if union > 0 and intersection >= 2:  # Минимум 2 общих лайка
-                similarity = intersection / union
-                similar_users.append((other_user, similarity))
+        # Рекомендуем посты, которые лайкали похожие пользователи
+        post_scores = defaultdict(float)
+        similar_likes = Like.objects.filter(
+            user_id__in=similar_users.keys(),
+            post__in=candidates
+        ).values_list('user_id', 'post_id')
         
-        # Сортируем по схожести
-        similar_users.sort(key=lambda x: x[1], reverse=True)
+        for similar_user_id, post_id in similar_likes:
+            post_scores[post_id] += similar_users[similar_user_id] * self.collaborative_weight
         
         recommendations = []
-        
-        # Рекомендуем посты от похожих пользователей
-        for similar_user, similarity in similar_users[:10]:  # Топ 10 похожих пользователей
-            similar_user_likes = Like.objects.filter(user=similar_user).values_list('post_id', flat=True)
-            
-            for post in queryset.filter(id__in=similar_user_likes):
-                score = similarity * self.collaborative_weight
-                recommendations.append((post, score, "похожие пользователи"))
+        for post in queryset.filter(id__in=post_scores.keys()):
+            recommendations.append((post, post_scores[post.id], "похожие пользователи"))
         
         return recommendations
     
     def _get_popular_recommendations(self, queryset):
         """
-        Рекомендации на основе популярности за последнюю неделю
+        Рекомендации на основе популярности за последнюю неделю.
+        Общий рейтинг берется из кэша трендов, здесь только отбрасываются
+        посты, недоступные пользователю
         """
-        week_ago = timezone.now() - timedelta(days=7)
+        popularity = dict(get_trending()['popular_posts'])
+        if not popularity:
+            return []
         
-        popular_posts = queryset.filter(
-            created_at__gte=week_ago
-        ).annotate(
-            popularity_score=(
-                F('likes_count') * 3 +  # Лайки весят больше
-                F('comments_count') * 2 +  # Комментарии тоже важны
-                F('views_count')  # Просмотры учитываются
-            )
-        ).filter(
-            popularity_score__gt=0
-        ).order_by('-popularity_score')[:20]
+        popular_posts = sorted(
+            queryset.filter(id__in=list(popularity)),
+            key=lambda post: popularity[str(post.id)],
+            reverse=True
+        )[:20]
         
         recommendations = []
         for post in popular_posts:
-            score = (post.popularity_score or 0) * self.popularity_weight
+            score = popularity[str(post.id)] * self.popularity_weight
             recommendations.append((post, score, "популярное"))
         
         return recommendations
@@ -207,55 +326,93 @@ class RecommendationEngine:
     
     def get_trending_tags(self, days=7):
         """
-        Получить популярные теги за последние дни
+        Получить популярные теги за последние дни (по дневным счетчикам тегов).
+        За стандартный период теги берутся из кэша трендов
         """
-        since_date = timezone.now() - timedelta(days=days)
-        
-        posts = Post.objects.filter(
-            created_at__gte=since_date,
-            is_published=True
-        ).exclude(tags__isnull=True)
-        
-        tag_counts = {}
-        for post in posts:
-            if post.tags:
-                for tag in post.tags:
-                    tag_counts[tag] = tag_counts.get(tag, 0) + 1
-        
-        # Сортируем по популярности
-        trending_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)
-        return trending_tags[:20]  # Топ 20 тегов
+        if days == get_trending_settings()['DAYS']:
+            return get_trending()['tags']
+        return compute_trending_tags(days)
     
     def get_similar_posts(self, post, limit=5):
         """
-        Получить похожие посты на основе тегов
+        Получить похожие посты на основе тегов (из таблицы RelatedPost)
         """
-        if not post.tags:
-            return Post.objects.none()
-        
-        similar_posts = Post.objects.filter(
-            is_published=True
-        ).exclude(
-            id=post.id
-        ).select_related('author').annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments'),
-            views_count=Count('views')
+        related = RelatedPost.objects.filter(
+            post=post,
+            related_post__is_published=True
+        ).select_related('related_post__author').order_by('-common_tags', '-score')[:limit]
+        similar_posts = [row.related_post for row in related]
+        
+        if not similar_posts and post.tags:
+            # Похожие посты еще не рассчитаны (например, до rebuild_related_posts)
+            related_ids = [related_id for related_id, _, _ in find_related_posts(post.pk, limit)]
+            posts = Post.objects.select_related('author').in_bulk(related_ids)
+            similar_posts = [posts[related_id] for related_id in related_ids if related_id in posts]
+        
+        return similar_posts
+
+
+def materialize_recommendations(active_days=7, batch_size=100):
+    """
+    Пересчитывает сохраненные рекомендации для активных пользователей пачками.
+    Возвращает (количество пользователей, количество рекомендаций)
+    """
+    engine = RecommendationEngine()
+    active_since = timezone.now() - timedelta(days=active_days)
+    user_ids = list(
+        UserModel.objects.filter(
+            is_active=True,
+            last_active__gte=active_since
+        ).values_list('id', flat=True)
+    )
+    
+    recommendations_count = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = UserModel.objects.filter(id__in=user_ids[start:start + batch_size])
+        recommendations_count += engine.materialize_for_users(batch)
+    
+    return len(user_ids), recommendations_count
+
+
+def recount_post_counters(queryset=None):
+    """
+    Пересчитывает счетчики лайков, комментариев и просмотров одним UPDATE.
+    Возвращает количество обновленных постов
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    
+    def count_of(model):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(
+                    total=Count('pk')
+                ).values('total')
+            ),
+            0
         )
-        
-        # Ищем посты с пересекающимися тегами
-        scored_posts = []
-        for similar_post in similar_posts:
-            if not similar_post.tags:
-                continue
-            
-            # Подсчитываем количество общих тегов
-            common_tags = set(post.tags).intersection(set(similar_post.tags))
-            if common_tags:
-                score = len(common_tags)
-                scored_posts.append((similar_post, score))
-        
-        # Сортируем по количеству общих тегов
-        scored_posts.sort(key=lambda x: x[1], reverse=True)
-        
-        return [post for post, score in scored_posts[:limit]]
\ No newline at end of file
+    
+    return queryset.update(
+        likes_count=count_of(Like),
+        comments_count=count_of(Comment),
+        views_count=count_of(PostView)
+    )
+
+
+def rebuild_tag_daily_counts():
+    """
+    Пересчитывает дневные счетчики тегов целиком.
+    Возвращает количество сохраненных счетчиков
+    """
+    rows = [
+        TagDailyCount(tag=row['tag'], date=row['date'], count=row['total'])
+        for row in PostTag.objects.filter(post__is_published=True).annotate(
+            date=TruncDate('post__created_at', tzinfo=dt_timezone.utc)
+        ).order_by().values('tag', 'date').annotate(total=Count('pk')).iterator()
+    ]
+    
+    with transaction.atomic():
+        TagDailyCount.objects.all().delete()
+        TagDailyCount.objects.bulk_create(rows, batch_size=1000)
+    
+    return len(rows)
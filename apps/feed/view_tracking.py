@@ -0,0 +1,339 @@
+"""
+Отложенная запись просмотров постов.
+
+PostDetailView не пишет в базу: просмотр проходит через дедупликатор
+(один просмотр от пользователя/IP на пост за DEDUPE_WINDOW секунд)
+и попадает в буфер, который flush() сбрасывает одним bulk_create вместе
+с агрегированным обновлением Post.views_count.
+Настраивается через settings.FEED_VIEW_TRACKING:
+
+- BACKEND 'redis' (по умолчанию) - общие для всех процессов ключи
+  дедупликации и буфер в Redis, сброс только задачей flush_post_views /
+  командой;
+- BACKEND 'memory' (только для разработки) - дедупликация и буфер в памяти
+  процесса, сброс каждые FLUSH_INTERVAL секунд фоновым потоком этого
+  процесса и при выходе. Задача и команда такой буфер пропускают.
+
+record() в базу не пишет ни при каком бэкенде. Буфер ведет число
+несохраненных просмотров каждого поста (pending_views()), чтобы ответ
+показывал views_count с ними и не уменьшался до сброса. Забранные из буфера
+просмотры удаляются только после коммита записи в базу: при ошибке они
+возвращаются в буфер (memory) или остаются в Redis и забираются снова
+через RECOVERY_DELAY секунд (redis).
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from apps.api_auth.models import UserModel
+from .models import Post, PostView
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_VIEW_TRACKING_SETTINGS = {
+    'BACKEND': 'redis',
+    'DEDUPE_WINDOW': 3600,  # секунды
+    'DEDUPE_SLOTS': 6,  # точность окна: DEDUPE_WINDOW / DEDUPE_SLOTS
+    'FLUSH_INTERVAL': 30,
+    'RECOVERY_DELAY': 600,  # секунды, после которых брошенный сброс забирается заново
+    'REDIS_KEY': 'kadio:post_views',
+}
+
+FLUSH_BATCH_SIZE = 1000
+USER_AGENT_MAX_LENGTH = 512
+
+
+def get_viewer_key(user_id, ip_address):
+    """Ключ зрителя: пользователь, а для анонимов - IP-адрес"""
+    return f'u:{user_id}' if user_id else f'ip:{ip_address}'
+
+
+class MemoryViewDeduplicator:
+    """
+    Множества (пост, зритель), разбитые на временные слоты.
+    Окно дедупликации - последние DEDUPE_SLOTS слотов, старые слоты
+    удаляются целиком, поэтому память ограничена просмотрами за окно.
+    """
+
+    def __init__(self, window, slots):
+        self.slot_size = max(1, window // slots)
+        self.slots = slots
+        self._buckets = OrderedDict()  # номер слота -> set ключей
+        self._lock = threading.Lock()
+
+    def add(self, post_id, viewer_key):
+        """Возвращает True, если просмотр новый в пределах окна"""
+        key = (post_id, viewer_key)
+        current = int(time.time()) // self.slot_size
+
+        with self._lock:
+            while self._buckets and next(iter(self._buckets)) <= current - self.slots:
+                self._buckets.popitem(last=False)
+
+            if any(key in keys for keys in self._buckets.values()):
+                return False
+            self._buckets.setdefault(current, set()).add(key)
+            return True
+
+
+class RedisViewDeduplicator:
+    """
+    Дедупликация ключами SET NX с истечением через окно
+    """
+
+    def __init__(self, key, window):
+        self.key = key
+        self.window = window
+
+    def add(self, post_id, viewer_key):
+        from server.redis_client import get_redis_client
+
+        return bool(get_redis_client().set(
+            f'{self.key}:seen:{post_id}:{viewer_key}', 1, nx=True, ex=self.window
+        ))
+
+
+class MemoryViewBuffer:
+    """
+    Буфер просмотров внутри текущего процесса
+    """
+    shared = False
+
+    def __init__(self):
+        self._pending = []
+        self._pending_counts = Counter()
+        self._lock = threading.Lock()
+
+    def push(self, event):
+        with self._lock:
+            self._pending.append(event)
+            self._pending_counts[event['post_id']] += 1
+
+    def pending_count(self, post_id):
+        with self._lock:
+            return self._pending_counts[post_id]
+
+    @contextmanager
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        try:
+            yield pending
+        except Exception:
+            # Запись не удалась - возвращаем просмотры в буфер
+            with self._lock:
+                self._pending = pending + self._pending
+            raise
+        # Просмотры уже в views_count
+        with self._lock:
+            self._pending_counts -= Counter(event['post_id'] for event in pending)
+
+
+# Уменьшает счетчики несохраненных просмотров и удаляет обнулившиеся
+RELEASE_PENDING_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1])) <= 0 then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+"""
+
+
+class RedisViewBuffer:
+    """
+    Буфер просмотров в списке Redis (события в JSON) и хэш
+    несохраненных просмотров по постам
+    """
+    shared = True
+
+    def __init__(self, key, recovery_delay):
+        self.key = key
+        self.pending_key = f'{key}:pending'
+        self.recovery_delay = recovery_delay
+
+    @property
+    def client(self):
+        from server.redis_client import get_redis_client
+
+        return get_redis_client()
+
+    def push(self, event):
+        pipeline = self.client.pipeline()
+        pipeline.rpush(self.key, json.dumps(event))
+        pipeline.hincrby(self.pending_key, event['post_id'], 1)
+        pipeline.execute()
+
+    def pending_count(self, post_id):
+        return int(self.client.hget(self.pending_key, post_id) or 0)
+
+    @contextmanager
+    def drain(self):
+        from server.redis_client import claim_buffer_keys
+
+        # Атомарно забираем накопленный список, новые просмотры пишутся в новый ключ.
+        # Забранные ключи удаляются только после успешной записи в базу
+        with claim_buffer_keys(self.client, self.key, self.recovery_delay) as keys:
+            events = []
+            for key in keys:
+                events.extend(json.loads(item) for item in self.client.lrange(key, 0, -1))
+            yield events
+
+            if events:
+                counts = Counter(event['post_id'] for event in events)
+                self.client.eval(
+                    RELEASE_PENDING_SCRIPT, 1, self.pending_key,
+                    *[value for item in counts.items() for value in item]
+                )
+
+
+class PostViewRecorder:
+    """
+    Принимает просмотры постов в буфер; flush() сохраняет их в базу
+    """
+
+    def __init__(self, deduplicator, buffer):
+        self.deduplicator = deduplicator
+        self.buffer = buffer
+        self._flush_lock = threading.Lock()
+
+    def record(self, post, user=None, ip_address=None, user_agent=''):
+        """
+        Ставит просмотр в очередь на запись.
+        Возвращает False, если просмотр - повтор в пределах окна.
+        """
+        user_id = user.pk if user is not None else None
+        if not self.deduplicator.add(str(post.pk), get_viewer_key(user_id, ip_address)):
+            return False
+
+        self.buffer.push({
+            'post_id': str(post.pk),
+            'user_id': user_id,
+            'ip_address': ip_address,
+            'user_agent': (user_agent or '')[:USER_AGENT_MAX_LENGTH],
+            'viewed_at': timezone.now().timestamp(),
+        })
+        return True
+
+    def pending_views(self, post):
+        """Просмотры поста, которые еще не попали в views_count"""
+        return self.buffer.pending_count(str(post.pk))
+
+    def flush(self):
+        """
+        Сохраняет накопленные просмотры через bulk_create и увеличивает
+        счетчики просмотров постов. Возвращает количество сохраненных просмотров.
+        """
+        if not self._flush_lock.acquire(blocking=False):
+            # Сброс уже выполняется в другом потоке
+            return 0
+        try:
+            with self.buffer.drain() as events:
+                if not events:
+                    return 0
+                return self._save(events)
+        finally:
+            self._flush_lock.release()
+
+    def _save(self, events):
+        # Посты и пользователи могли быть удалены, пока просмотр лежал в буфере
+        post_ids = set(Post.objects.filter(
+            pk__in={event['post_id'] for event in events}
+        ).values_list('pk', flat=True))
+        user_ids = set(UserModel.objects.filter(
+            pk__in={event['user_id'] for event in events if event['user_id']}
+        ).values_list('pk', flat=True))
+
+        views = []
+        for event in events:
+            post_id = uuid.UUID(event['post_id'])
+            if post_id not in post_ids:
+                continue
+            views.append(PostView(
+                post_id=post_id,
+                user_id=event['user_id'] if event['user_id'] in user_ids else None,
+                ip_address=event['ip_address'],
+                user_agent=event['user_agent'],
+                viewed_at=datetime.fromtimestamp(event['viewed_at'], tz=dt_timezone.utc),
+            ))
+
+        counts = list(Counter(view.post_id for view in views).items())
+        with transaction.atomic():
+            PostView.objects.bulk_create(views, batch_size=FLUSH_BATCH_SIZE)
+            for start in range(0, len(counts), FLUSH_BATCH_SIZE):
+                batch = counts[start:start + FLUSH_BATCH_SIZE]
+                Post.objects.filter(
+                    pk__in=[post_id for post_id, _ in batch]
+                ).update(
+                    views_count=F('views_count') + Case(
+                        *[When(pk=post_id, then=Value(count)) for post_id, count in batch],
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    )
+                )
+        return len(views)
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def _flush_periodically(recorder, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            recorder.flush()
+        except Exception as e:
+            logger.error(f"Error flushing post views buffer: {str(e)}")
+        finally:
+            connections.close_all()
+
+
+def _flush_at_exit(recorder):
+    try:
+        recorder.flush()
+    except Exception as e:
+        logger.error(f"Error flushing post views buffer at exit: {str(e)}")
+
+
+def get_post_view_recorder():
+    """Возвращает регистратор просмотров из settings.FEED_VIEW_TRACKING"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                options = {
+                    **DEFAULT_VIEW_TRACKING_SETTINGS,
+                    **getattr(settings, 'FEED_VIEW_TRACKING', {}),
+                }
+                if options['BACKEND'] == 'redis':
+                    recorder = PostViewRecorder(
+                        RedisViewDeduplicator(options['REDIS_KEY'], options['DEDUPE_WINDOW']),
+                        RedisViewBuffer(options['REDIS_KEY'], options['RECOVERY_DELAY']),
+                    )
+                else:
+                    recorder = PostViewRecorder(
+                        MemoryViewDeduplicator(options['DEDUPE_WINDOW'], options['DEDUPE_SLOTS']),
+                        MemoryViewBuffer(),
+                    )
+                    # Буфер виден только этому процессу: сбрасываем его
+                    # фоновым потоком, а не из запроса
+                    threading.Thread(
+                        target=_flush_periodically,
+                        args=(recorder, options['FLUSH_INTERVAL']),
+                        daemon=True,
+                    ).start()
+                    atexit.register(_flush_at_exit, recorder)
+                _recorder = recorder
+    return _recorder
@@ -2,17 +2,25 @@ from rest_framework import generics, status, filters
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q, Count, Case, When, IntegerField
+from django.db.models import Q
 from django.utils import timezone
 from django.http import Http404
 from apps.api_auth.decorators import token_required
-from .models import Post, Comment, Like, PostView, PostRecommendation
+from apps.api_auth.models import UserModel
+from server.pagination import KeysetPagination
+from .models import Post, Comment, Like, PostView, PostRecommendation, PostTag, RecommendationState
 from .serializers import (
     PostListSerializer, PostDetailSerializer, PostCreateUpdateSerializer,
     CommentSerializer, LikeSerializer, PostSearchSerializer,
     PostRecommendationSerializer
 )
-from .utils import RecommendationEngine
+from .utils import RecommendationEngine, CommentTree, get_comment_tree_options
+from .related import RELATED_POSTS_LIMIT
+from .search import post_search_index
+from .trending import get_trending, get_trending_settings
+from .view_tracking import get_post_view_recorder
+from datetime import datetime, timezone as dt_timezone
+import uuid
 
 
 class PostPagination(PageNumberPagination):
@@ -21,11 +29,20 @@ class PostPagination(PageNumberPagination):
     max_page_size = 50
 
 
+class PostCursorPagination(KeysetPagination):
+    """
+    Курсорная пагинация ленты по (created_at, id) или выбранной сортировке
+    """
+    page_size = 10
+    max_page_size = 50
+    ordering = ('-created_at', '-id')
+
+
 class PostListCreateView(generics.ListCreateAPIView):
     """
     Список постов и создание нового поста
     """
-    pagination_class = PostPagination
+    pagination_class = PostCursorPagination
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at', 'likes_count', 'views_count']
     ordering = ['-created_at']
@@ -68,31 +85,23 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def record_view(self, post, request):
         """
-        Записывает просмотр поста
+        Записывает просмотр поста.
+        Просмотр ставится в буфер и сохраняется в базу фоновым сбросом,
+        повторы от одного пользователя/IP в течение часа отбрасываются.
+        В ответе views_count включает еще не сохраненные просмотры из буфера.
         """
         user = getattr(request, 'user', None)
-        ip_address = self.get_client_ip(request)
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        
-        # Проверяем, не было ли уже просмотра от этого пользователя/IP за последний час
-        one_hour_ago = timezone.now() - timezone.timedelta(hours=1)
+        if not isinstance(user, UserModel):
+            user = None
         
-        if user:
-            existing_view = PostView.objects.filter(
-                post=post, user=user, viewed_at__gte=one_hour_ago
-            ).exists()
-        else:
-            existing_view = PostView.objects.filter(
-                post=post, ip_address=ip_address, viewed_at__gte=one_hour_ago
-            ).exists()
-        
-        if not existing_view:
-            PostView.objects.create(
-                post=post,
-                user=user,
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
+        recorder = get_post_view_recorder()
+        recorder.record(
+            post,
+            user=user,
+            ip_address=self.get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
+        post.views_count += recorder.pending_views(post)
     
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -146,6 +155,36 @@ class CommentListCreateView(generics.ListCreateAPIView):
             post_id=post_id, parent=None
         ).select_related('author').order_by('created_at')
     
+    def list(self, request, *args, **kwargs):
+        # Все комментарии поста загружаются одним запросом и собираются в дерево.
+        # ?parent=<id> - постраничный вывод ответов на конкретный комментарий
+        tree = CommentTree.for_post(self.kwargs['post_id'])
+        
+        parent_id = request.query_params.get('parent')
+        if parent_id:
+            try:
+                comments = tree.get_replies(uuid.UUID(parent_id))
+            except ValueError:
+                return Response(
+                    {'error': 'Некорректный идентификатор комментария'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            comments = tree.roots
+        
+        context = {
+            **self.get_serializer_context(),
+            **get_comment_tree_options(request.query_params),
+            'comment_tree': tree,
+        }
+        page = self.paginate_queryset(comments)
+        if page is not None:
+            serializer = CommentSerializer(page, many=True, context=context)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = CommentSerializer(comments, many=True, context=context)
+        return Response(serializer.data)
+    
     @token_required
     def post(self, request, *args, **kwargs):
         post_id = self.kwargs['post_id']
@@ -160,6 +199,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save(post=post)
+            Post.update_counter(post.id, 'comments_count', 1)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -200,6 +240,13 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         return super().delete(request, *args, **kwargs)
+    
+    def perform_destroy(self, instance):
+        # Вместе с комментарием каскадно удаляются ответы на него
+        _, deleted_per_model = instance.delete()
+        deleted_comments = deleted_per_model.get(Comment._meta.label, 0)
+        if deleted_comments:
+            Post.update_counter(instance.post_id, 'comments_count', -deleted_comments)
 
 
 @api_view(['POST', 'DELETE'])
@@ -216,13 +263,13 @@ def toggle_like(request, post_id):
             status=status.HTTP_404_NOT_FOUND
         )
     
-    like, created = Like.objects.get_or_create(
-        post=post,
-        user=request.user
-    )
-    
     if request.method == 'POST':
+        like, created = Like.objects.get_or_create(
+            post=post,
+            user=request.user
+        )
         if created:
+            Post.update_counter(post.id, 'likes_count', 1)
             return Response(
                 {'message': 'Лайк поставлен', 'liked': True},
                 status=status.HTTP_201_CREATED
@@ -234,14 +281,14 @@ def toggle_like(request, post_id):
             )
     
     elif request.method == 'DELETE':
-        if not created:
-            like.delete()
+        deleted, _ = Like.objects.filter(post=post, user=request.user).delete()
+        if deleted:
+            Post.update_counter(post.id, 'likes_count', -deleted)
             return Response(
                 {'message': 'Лайк убран', 'liked': False},
                 status=status.HTTP_200_OK
             )
         else:
-            like.delete()  # Удаляем только что созданный лайк
             return Response(
                 {'message': 'Лайк не был поставлен', 'liked': False},
                 status=status.HTTP_200_OK
@@ -258,23 +305,19 @@ def search_posts(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     data = serializer.validated_data
-    queryset = Post.objects.filter(is_published=True).select_related('author').annotate(
-        likes_count=Count('likes'),
-        comments_count=Count('comments'),
-        views_count=Count('views')
-    )
+    queryset = Post.objects.filter(is_published=True).select_related('author')
     
-    # Поиск по тексту
-    if data.get('query'):
-        query = data['query']
-        queryset = queryset.filter(
-            Q(title__icontains=query) | Q(content__icontains=query)
-        )
+    # Полнотекстовый поиск по заголовку и содержанию
+    query = data.get('query')
+    if query:
+        queryset = post_search_index.search(queryset, query)
     
-    # Поиск по тегам
+    # Поиск по тегам (через индекс PostTag, пост должен иметь все теги)
     if data.get('tags'):
         for tag in data['tags']:
-            queryset = queryset.filter(tags__contains=[tag])
+            queryset = queryset.filter(
+                pk__in=PostTag.objects.filter(tag=tag).values('post_id')
+            )
     
     # Поиск по автору
     if data.get('author'):
@@ -292,14 +335,16 @@ def search_posts(request):
         queryset = queryset.filter(created_at__lte=data['date_to'])
     
     # Сортировка
-    ordering = data.get('ordering', '-created_at')
-    if ordering in ['-likes_count', '-views_count']:
+    ordering = data.get('ordering', 'relevance')
+    if ordering == 'relevance':
+        ordering = '-search_rank' if query else '-created_at'
+    if ordering in ['-search_rank', '-likes_count', '-views_count']:
         queryset = queryset.order_by(ordering, '-created_at')
     else:
         queryset = queryset.order_by(ordering)
     
     # Пагинация
-    paginator = PostPagination()
+    paginator = PostCursorPagination()
     page = paginator.paginate_queryset(queryset, request)
     if page is not None:
         serializer = PostListSerializer(page, many=True, context={'request': request})
@@ -313,21 +358,100 @@ def search_posts(request):
 @token_required
 def get_recommendations(request):
     """
-    Получить рекомендованные посты для пользователя
+    Получить рекомендованные посты для пользователя.
+    Рекомендации читаются из PostRecommendation (рассчитываются фоновой задачей),
+    на лету считаются только для пользователей, которым их еще ни разу не считали.
+    Если сохраненные рекомендации закончились (все просмотрены), отдается
+    пустой список до следующего пересчета задачей
     """
-    engine = RecommendationEngine()
-    recommendations = engine.get_recommendations_for_user(request.user)
+    user = request.user
+    
+    def load_recommendations():
+        return list(
+            PostRecommendation.objects.filter(
+                user=user,
+                post__is_published=True
+            ).exclude(
+                post_id__in=PostView.objects.filter(user=user).values('post_id')
+            ).select_related('user', 'post', 'post__author').order_by('-score', '-created_at')
+        )
+    
+    recommendations = load_recommendations()
+    state = RecommendationState.objects.filter(user=user).first()
+    if not recommendations and state is None:
+        RecommendationEngine().materialize_for_users([user])
+        recommendations = load_recommendations()
+        state = RecommendationState.objects.filter(user=user).first()
+    
+    generated_at = max(
+        (r.updated_at for r in recommendations),
+        default=state.computed_at if state else None
+    )
     
     paginator = PostPagination()
     page = paginator.paginate_queryset(recommendations, request)
     if page is not None:
         serializer = PostRecommendationSerializer(page, many=True, context={'request': request})
-        return paginator.get_paginated_response(serializer.data)
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['generated_at'] = generated_at
+        return response
     
     serializer = PostRecommendationSerializer(recommendations, many=True, context={'request': request})
+    return Response({
+        'results': serializer.data,
+        'generated_at': generated_at
+    })
+
+
+@api_view(['GET'])
+def get_similar_posts(request, post_id):
+    """
+    Похожие посты по общим тегам
+    """
+    try:
+        post = Post.objects.get(id=post_id)
+    except Post.DoesNotExist:
+        return Response(
+            {'error': 'Пост не найден'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        limit = int(request.query_params.get('limit', 5))
+    except ValueError:
+        limit = 5
+    limit = max(1, min(limit, RELATED_POSTS_LIMIT))
+    
+    similar_posts = RecommendationEngine().get_similar_posts(post, limit=limit)
+    serializer = PostListSerializer(similar_posts, many=True, context={'request': request})
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+def get_trending_feed(request):
+    """
+    Трендовые теги и популярные посты за неделю из общего кэша
+    """
+    trending = get_trending()
+    
+    try:
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        limit = 20
+    limit = max(1, min(limit, get_trending_settings()['POPULAR_LIMIT']))
+    
+    popular_ids = [uuid.UUID(post_id) for post_id, _ in trending['popular_posts'][:limit]]
+    posts = Post.objects.filter(is_published=True).select_related('author').in_bulk(popular_ids)
+    popular_posts = [posts[post_id] for post_id in popular_ids if post_id in posts]
+    
+    serializer = PostListSerializer(popular_posts, many=True, context={'request': request})
+    return Response({
+        'tags': [{'tag': tag, 'count': count} for tag, count in trending['tags']],
+        'popular_posts': serializer.data,
+        'generated_at': datetime.fromtimestamp(trending['computed_at'], tz=dt_timezone.utc)
+    })
+
+
 @api_view(['GET'])
 @token_required
 def get_user_posts(request, user_id=None):
@@ -348,13 +472,9 @@ def get_user_posts(request, user_id=None):
     
     queryset = Post.objects.filter(
         author=user, is_published=True
-    ).select_related('author').annotate(
-        likes_count=Count('likes'),
-        comments_count=Count('comments'),
-        views_count=Count('views')
-    ).order_by('-created_at')
+    ).select_related('author').order_by('-created_at')
     
-    paginator = PostPagination()
+    paginator = PostCursorPagination()
     page = paginator.paginate_queryset(queryset, request)
     if page is not None:
         serializer = PostListSerializer(page, many=True, context={'request': request})
@@ -0,0 +1,340 @@
+"""
+Глобальный лидерборд по монетам.
+
+Рейтинг хранится в отсортированной структуре, поэтому место пользователя,
+топ-N и соседи по рейтингу находятся за O(log n), без сортировки всей
+таблицы пользователей. Порядок: монеты по убыванию, при равенстве - id
+по убыванию. Настраивается через settings.LEADERBOARD:
+
+- BACKEND 'redis' (по умолчанию) - общий для всех процессов ZSET в REDIS_URL;
+- BACKEND 'memory' - отсортированный список в памяти процесса (для тестов
+  и разработки). Видит только изменения своего процесса, поэтому
+  пересобирается из базы при первом обращении и затем каждые
+  MEMORY_MAX_AGE секунд.
+
+Монеты обновляются сигналом при сохранении пользователя; задача
+rebuild_leaderboard / команда периодически пересобирают общий рейтинг
+из базы на случай изменений в обход сигналов (queryset.update()).
+
+Лидерборд друзей считается одним запросом по ребрам графа дружбы
+с сортировкой в базе и кэшируется на пользователя и метрику; кэш
+сбрасывается сигналами при изменении показателей пользователя или его
+дружбы.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from apps.api.models import FriendEdge
+from apps.api_auth.models import UserModel
+
+
+DEFAULT_LEADERBOARD_SETTINGS = {
+    'BACKEND': 'redis',
+    'REDIS_KEY': 'kadio:leaderboard:coins',
+    'MEMORY_MAX_AGE': 300,  # секунды, для BACKEND 'memory'
+    'FRIENDS_CACHE_ALIAS': 'default',
+    'FRIENDS_CACHE_TIMEOUT': 600,  # секунды
+}
+
+FRIENDS_LEADERBOARD_METRICS = ('coins', 'diamonds', 'level', 'streak_days')
+# Поля пользователя в ответе лидерборда друзей: их изменение сбрасывает кэш
+FRIENDS_LEADERBOARD_FIELDS = {'email', 'avatar', *FRIENDS_LEADERBOARD_METRICS}
+
+REBUILD_BATCH_SIZE = 1000
+MEMBER_WIDTH = 20  # id дополняется нулями, чтобы равные счета шли по id
+
+
+def get_leaderboard_settings():
+    return {**DEFAULT_LEADERBOARD_SETTINGS, **getattr(settings, 'LEADERBOARD', {})}
+
+
+def load_scores():
+    """Монеты всех пользователей из базы: [(id, монеты), ...]"""
+    return UserModel.objects.values_list('id', 'coins').order_by().iterator(
+        chunk_size=REBUILD_BATCH_SIZE
+    )
+
+
+class MemoryLeaderboard:
+    """
+    Отсортированный список ключей (-монеты, -id) с поиском через bisect.
+    Старше max_age секунд пересобирается из базы при следующем обращении
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self._keys = []
+        self._scores = {}  # id пользователя -> монеты
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.rebuild()
+
+    def rebuild(self):
+        """Перестраивает рейтинг из базы, возвращает количество пользователей"""
+        scores = dict(load_scores())
+        with self._lock:
+            self._scores = scores
+            self._keys = sorted((-score, -user_id) for user_id, score in scores.items())
+            self._loaded_at = time.monotonic()
+            return len(self._keys)
+
+    def update(self, user_id, score):
+        with self._lock:
+            self._ensure_loaded()
+            self._discard(user_id)
+            bisect.insort(self._keys, (-score, -user_id))
+            self._scores[user_id] = score
+
+    def remove(self, user_id):
+        with self._lock:
+            self._ensure_loaded()
+            self._discard(user_id)
+
+    def _discard(self, user_id):
+        score = self._scores.pop(user_id, None)
+        if score is not None:
+            index = bisect.bisect_left(self._keys, (-score, -user_id))
+            del self._keys[index]
+
+    def rank(self, user_id):
+        """Место пользователя с нуля или None"""
+        with self._lock:
+            self._ensure_loaded()
+            score = self._scores.get(user_id)
+            if score is None:
+                return None
+            return bisect.bisect_left(self._keys, (-score, -user_id))
+
+    def score(self, user_id):
+        with self._lock:
+            self._ensure_loaded()
+            return self._scores.get(user_id)
+
+    def range(self, start, stop):
+        """[(id, монеты), ...] для мест с start по stop не включительно"""
+        with self._lock:
+            self._ensure_loaded()
+            return [(-user_id, -score) for score, user_id in self._keys[start:stop]]
+
+    def count(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._keys)
+
+
+class RedisLeaderboard:
+    """
+    ZSET: участник - id, дополненный нулями, счет - монеты
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._checked = False
+
+    @property
+    def client(self):
+        from server.redis_client import get_redis_client
+
+        return get_redis_client()
+
+    @staticmethod
+    def _member(user_id):
+        return str(user_id).zfill(MEMBER_WIDTH)
+
+    def _ensure_loaded(self):
+        # Ключа нет (первый запуск или очищенный Redis) - собираем рейтинг из базы
+        if not self._checked:
+            if not self.client.exists(self.key):
+                self.rebuild()
+            self._checked = True
+
+    def rebuild(self):
+        """
+        Собирает рейтинг во временном ключе и атомарно подменяет им основной
+        """
+        temp_key = f'{self.key}:rebuilding'
+        client = self.client
+        client.delete(temp_key)
+
+        count = 0
+        batch = {}
+        for user_id, score in load_scores():
+            batch[self._member(user_id)] = score
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                client.zadd(temp_key, batch)
+                count += len(batch)
+                batch = {}
+        if batch:
+            client.zadd(temp_key, batch)
+            count += len(batch)
+
+        if count:
+            client.rename(temp_key, self.key)
+        else:
+            client.delete(self.key)
+        self._checked = True
+        return count
+
+    def update(self, user_id, score):
+        self._ensure_loaded()
+        self.client.zadd(self.key, {self._member(user_id): score})
+
+    def remove(self, user_id):
+        self._ensure_loaded()
+        self.client.zrem(self.key, self._member(user_id))
+
+    def rank(self, user_id):
+        self._ensure_loaded()
+        return self.client.zrevrank(self.key, self._member(user_id))
+
+    def score(self, user_id):
+        self._ensure_loaded()
+        score = self.client.zscore(self.key, self._member(user_id))
+        return None if score is None else int(score)
+
+    def range(self, start, stop):
+        self._ensure_loaded()
+        if stop <= start:
+            return []
+        return [
+            (int(member), int(score))
+            for member, score in self.client.zrevrange(self.key, start, stop - 1, withscores=True)
+        ]
+
+    def count(self):
+        self._ensure_loaded()
+        return self.client.zcard(self.key)
+
+
+class Leaderboard:
+    """
+    Запросы к рейтингу поверх хранилища. Места считаются с единицы
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def update(self, user_id, coins):
+        self.storage.update(user_id, coins)
+
+    def remove(self, user_id):
+        self.storage.remove(user_id)
+
+    def rebuild(self):
+        return self.storage.rebuild()
+
+    def rank(self, user_id):
+        """Место пользователя или None, если его нет в рейтинге"""
+        rank = self.storage.rank(user_id)
+        return None if rank is None else rank + 1
+
+    def score(self, user_id):
+        return self.storage.score(user_id)
+
+    def count(self):
+        return self.storage.count()
+
+    def top(self, limit, offset=0):
+        """[(место, id, монеты), ...] с места offset + 1"""
+        return self._ranked(offset, self.storage.range(offset, offset + limit))
+
+    def around(self, user_id, radius):
+        """
+        Пользователь и до radius соседей выше и ниже него:
+        [(место, id, монеты), ...]
+        """
+        rank = self.storage.rank(user_id)
+        if rank is None:
+            return []
+        start = max(rank - radius, 0)
+        return self._ranked(start, self.storage.range(start, rank + radius + 1))
+
+    @staticmethod
+    def _ranked(start, entries):
+        return [
+            (start + index + 1, user_id, coins)
+            for index, (user_id, coins) in enumerate(entries)
+        ]
+
+
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard():
+    """Возвращает лидерборд из settings.LEADERBOARD"""
+    global _leaderboard
+    if _leaderboard is None:
+        with _leaderboard_lock:
+            if _leaderboard is None:
+                options = get_leaderboard_settings()
+                if options['BACKEND'] == 'redis':
+                    storage = RedisLeaderboard(options['REDIS_KEY'])
+                else:
+                    storage = MemoryLeaderboard(options['MEMORY_MAX_AGE'])
+                _leaderboard = Leaderboard(storage)
+    return _leaderboard
+
+
+def _friends_cache():
+    return caches[get_leaderboard_settings()['FRIENDS_CACHE_ALIAS']]
+
+
+def _friends_cache_key(user_id, metric):
+    return f'gamedification:friends_leaderboard:{user_id}:{metric}'
+
+
+def compute_friends_leaderboard(user_id, metric='level'):
+    """
+    Пользователь и его друзья одним запросом, по убыванию метрики:
+    [{'rank', 'id', 'email', 'diamonds', 'coins', 'level', 'streak_days', 'avatar'}, ...]
+    """
+    users = UserModel.objects.filter(
+        Q(id=user_id) |
+        Q(id__in=FriendEdge.objects.filter(user_id=user_id).values('friend_id'))
+    ).order_by(f'-{metric}', '-id').only(
+        'id', 'email', 'avatar', *FRIENDS_LEADERBOARD_METRICS
+    )
+    return [
+        {
+            "rank": rank,
+            "id": user.id,
+            "email": user.email,
+            "diamonds": user.diamonds,
+            "coins": user.coins,
+            "level": user.level,
+            "streak_days": user.streak_days,
+            "avatar": user.avatar.url if user.avatar else None,
+        }
+        for rank, user in enumerate(users, start=1)
+    ]
+
+
+def get_friends_leaderboard(user_id, metric='level'):
+    """Лидерборд друзей пользователя из кэша"""
+    if metric not in FRIENDS_LEADERBOARD_METRICS:
+        raise ValueError(f"Unknown leaderboard metric: {metric}")
+
+    cache = _friends_cache()
+    key = _friends_cache_key(user_id, metric)
+    entries = cache.get(key)
+    if entries is None:
+        entries = compute_friends_leaderboard(user_id, metric)
+        cache.set(key, entries, get_leaderboard_settings()['FRIENDS_CACHE_TIMEOUT'])
+    return entries
+
+
+def invalidate_friends_leaderboard(*user_ids):
+    _friends_cache().delete_many([
+        _friends_cache_key(user_id, metric)
+        for user_id in user_ids
+        for metric in FRIENDS_LEADERBOARD_METRICS
+    ])
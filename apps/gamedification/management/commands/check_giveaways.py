@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
+from django.db.models import Count
 from django.utils import timezone
 from apps.gamedification.models import GiveawayModel
-from apps.gamedification.tasks import check_expired_giveaways
+from apps.gamedification.settlement import settle_expired_giveaways, settle_giveaways
 
 class Command(BaseCommand):
     help = 'Check and complete expired giveaways'
@@ -42,31 +43,13 @@ class Command(BaseCommand):
                     )
                 )
             else:
-                old_winner = giveaway.winner
-                giveaway.end_giveaway()
-                
-                if giveaway.winner:
-                    winner = giveaway.winner
-                    winner.diamonds += giveaway.prize_fond
-                    winner.save()
-                    
-                    # Собранные средства от участников идут организатору
-                    if giveaway.collected_funds > 0:
-                        giveaway.organizator.diamonds += giveaway.collected_funds
-                        giveaway.organizator.save()
-                    
+                settled = settle_giveaways([giveaway.pk])
+                if not settled:
                     self.stdout.write(
-                        self.style.SUCCESS(
-                            f'Completed giveaway "{giveaway.title}". '
-                            f'Winner: {winner.email}, Prize: {giveaway.prize_fond} diamonds'
-                        )
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'Completed giveaway "{giveaway.title}" without participants'
-                        )
+                        self.style.WARNING(f'Giveaway "{giveaway.title}" is already completed')
                     )
+                    return
+                self.write_settled(settled[0], '')
                     
         except GiveawayModel.DoesNotExist:
             self.stdout.write(
@@ -76,59 +59,56 @@ class Command(BaseCommand):
     def check_all_expired_giveaways(self, dry_run):
         now = timezone.now()
         
-        expired_giveaways = GiveawayModel.objects.filter(
+        if not dry_run:
+            settled = settle_expired_giveaways(now)
+            if not settled:
+                self.stdout.write(
+                    self.style.SUCCESS('No expired giveaways found')
+                )
+                return
+            
+            for giveaway in settled:
+                self.write_settled(giveaway, '  ✓ ')
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Successfully completed {len(settled)} giveaways'
+                )
+            )
+            return
+        
+        expired_giveaways = list(GiveawayModel.objects.filter(
             is_active=True,
             end_date__lte=now
-        )
+        ).annotate(participants_count=Count('participants')).order_by('end_date', 'pk'))
         
-        if not expired_giveaways.exists():
+        if not expired_giveaways:
             self.stdout.write(
                 self.style.SUCCESS('No expired giveaways found')
             )
             return
         
         self.stdout.write(
-            f'Found {expired_giveaways.count()} expired giveaways:'
+            f'Found {len(expired_giveaways)} expired giveaways:'
         )
         
         for giveaway in expired_giveaways:
-            participants_count = giveaway.participants.count()
-            
-            if dry_run:
-                self.stdout.write(
-                    f'  - "{giveaway.title}" (ID: {giveaway.id}) '
-                    f'with {participants_count} participants '
-                    f'(ended: {giveaway.end_date})'
-                )
-            else:
-                giveaway.end_giveaway()
-                
-                if giveaway.winner:
-                    winner = giveaway.winner
-                    winner.diamonds += giveaway.prize_fond
-                    winner.save()
-                    
-                    # Собранные средства от участников идут организатору
-                    if giveaway.collected_funds > 0:
-                        giveaway.organizator.diamonds += giveaway.collected_funds
-                        giveaway.organizator.save()
-                    
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'  ✓ Completed "{giveaway.title}". '
-                            f'Winner: {winner.email}, Prize: {giveaway.prize_fond} diamonds'
-                        )
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'  ✓ Completed "{giveaway.title}" without participants'
-                        )
-                    )
-        
-        if not dry_run:
+            self.stdout.write(
+                f'  - "{giveaway.title}" (ID: {giveaway.id}) '
+                f'with {giveaway.participants_count} participants '
+                f'(ended: {giveaway.end_date})'
+            )
+
+    def write_settled(self, giveaway, prefix):
+        if giveaway.winner:
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'Successfully completed {expired_giveaways.count()} giveaways'
+                    f'{prefix}Completed "{giveaway.title}". '
+                    f'Winner: {giveaway.winner.email}, Prize: {giveaway.prize_fond} diamonds'
                 )
-            )
\ No newline at end of file
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'{prefix}Completed "{giveaway.title}" without participants'
+                )
+            )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.gamedification.leaderboard import get_leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the global coins leaderboard from the database'
+
+    def handle(self, *args, **options):
+        users_count = get_leaderboard().rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Ranked {users_count} users')
+        )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.gamedification.snapshots import take_leaderboard_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Store leaderboard snapshots of current balances for the current day, week and month'
+
+    def handle(self, *args, **options):
+        rows_count = take_leaderboard_snapshots()
+        self.stdout.write(
+            self.style.SUCCESS(f'Stored {rows_count} leaderboard snapshot rows')
+        )
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0008_usermodel_coins_index'),
+        ('gamedification', '0002_giveawaymodel_collected_funds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'День'), ('week', 'Неделя'), ('month', 'Месяц')], max_length=10, verbose_name='Период')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('rank', models.PositiveIntegerField(verbose_name='Место')),
+                ('coins', models.IntegerField(verbose_name='Монеты')),
+                ('coins_gained', models.IntegerField(blank=True, null=True, verbose_name='Монет за период')),
+                ('activities_count', models.PositiveIntegerField(default=0, verbose_name='Действий за период')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_snapshots', to='api_auth.usermodel')),
+            ],
+            options={
+                'verbose_name': 'Leaderboard snapshot',
+                'verbose_name_plural': 'Leaderboard snapshots',
+                'indexes': [models.Index(fields=['period', 'period_start', 'rank'], name='gamedificat_period_8a0cb3_idx'), models.Index(fields=['period', 'period_start', '-coins_gained'], name='gamedificat_period_ab430f_idx'), models.Index(fields=['user', 'period', '-period_start'], name='gamedificat_user_id_a8dee6_idx')],
+                'unique_together': {('period', 'period_start', 'user')},
+            },
+        ),
+    ]
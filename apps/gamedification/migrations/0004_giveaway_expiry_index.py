@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0009_balancetransaction'),
+        ('gamedification', '0003_leaderboard_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='giveawaymodel',
+            index=models.Index(fields=['is_active', 'end_date'], name='gamedificat_is_acti_edaddc_idx'),
+        ),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
 from apps.api_auth.models import UserModel
 
+class GiveawayClosed(Exception):
+    """Розыгрыш завершился раньше, чем участие было записано"""
+
+
 class GiveawayModel(models.Model):
     organizator = models.ForeignKey(
         UserModel,
@@ -55,27 +62,42 @@ class GiveawayModel(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def add_sum(self, sum: int):
-        self.collected_funds += sum
-        self.save()
-    
-    def __random_get_winner(self):
-        return self.participants.order_by('?').first()
+        """
+        Атомарно прибавляет sum к собранным средствам, пока розыгрыш открыт
+        (активен и end_date не наступил). Возвращает False, если розыгрыш уже
+        закрыт: тогда вызывающий код должен откатить участие
+        """
+        # Условный UPDATE блокирует строку до коммита: расчет розыгрыша
+        # либо дождется участника, либо участие не пройдет
+        now = timezone.now()
+        updated = GiveawayModel.objects.filter(
+            pk=self.pk, is_active=True, end_date__gt=now
+        ).update(
+            collected_funds=F('collected_funds') + sum,
+            updated_at=now
+        )
+        if not updated:
+            return False
+        self.refresh_from_db(fields=['collected_funds', 'updated_at'])
+        return True
     
     def end_giveaway(self):
-        self.is_active = False
-        self.winner = self.__random_get_winner()
-        
-        # Если есть победитель, начисляем ему призовой фонд в diamonds
-        if self.winner:
-            self.winner.diamonds += self.prize_fond
-            self.winner.save()
-        
-        # Собранные средства от участников идут организатору
-        if self.collected_funds > 0:
-            self.organizator.diamonds += self.collected_funds
-            self.organizator.save()
-        
-        self.save()
+        """
+        Завершает розыгрыш и начисляет выплаты ровно один раз.
+        Возвращает False, если розыгрыш уже был завершен
+        """
+        from .settlement import settle_giveaways
+
+        settled = settle_giveaways([self.pk])
+        if not settled:
+            self.refresh_from_db(fields=['is_active', 'winner', 'updated_at'])
+            return False
+
+        giveaway = settled[0]
+        self.is_active = giveaway.is_active
+        self.winner = giveaway.winner
+        self.updated_at = giveaway.updated_at
+        return True
     
     def __str__(self):
         return self.title
@@ -84,4 +106,65 @@ class GiveawayModel(models.Model):
         verbose_name = 'Giveaway'
         verbose_name_plural = 'Giveaways'
         ordering = ['-start_date']
-        
\ No newline at end of file
+        indexes = [
+            models.Index(fields=['is_active', 'end_date']),
+        ]
+        
+
+class LeaderboardSnapshot(models.Model):
+    """
+    Место пользователя в лидерборде по монетам за день, неделю или месяц.
+    Строки текущих периодов перезаписываются задачей snapshot_leaderboards,
+    после окончания периода остаются его итогом
+    """
+    PERIOD_DAY = 'day'
+    PERIOD_WEEK = 'week'
+    PERIOD_MONTH = 'month'
+    PERIOD_CHOICES = [
+        (PERIOD_DAY, 'День'),
+        (PERIOD_WEEK, 'Неделя'),
+        (PERIOD_MONTH, 'Месяц'),
+    ]
+
+    period = models.CharField(
+        max_length=10,
+        choices=PERIOD_CHOICES,
+        verbose_name='Период'
+    )
+    period_start = models.DateField(
+        verbose_name='Начало периода'
+    )
+    user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        related_name='leaderboard_snapshots'
+    )
+    rank = models.PositiveIntegerField(
+        verbose_name='Место'
+    )
+    coins = models.IntegerField(
+        verbose_name='Монеты'
+    )
+    coins_gained = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Монет за период'
+    )
+    activities_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Действий за период'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.period} {self.period_start}: #{self.rank} {self.user_id}"
+
+    class Meta:
+        verbose_name = 'Leaderboard snapshot'
+        verbose_name_plural = 'Leaderboard snapshots'
+        unique_together = ['period', 'period_start', 'user']
+        indexes = [
+            models.Index(fields=['period', 'period_start', 'rank']),
+            models.Index(fields=['period', 'period_start', '-coins_gained']),
+            models.Index(fields=['user', 'period', '-period_start']),
+        ]
@@ -1,7 +1,7 @@
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 from rest_framework import serializers
 from django.utils import timezone
-from .models import GiveawayModel
+from .models import GiveawayModel, LeaderboardSnapshot
 
 
 class GiveawaySerializer(ModelSerializer):
@@ -43,4 +43,22 @@ class GiveawaySerializer(ModelSerializer):
         
         return data
         
-    
\ No newline at end of file
+    
+
+class LeaderboardSnapshotSerializer(ModelSerializer):
+    id = serializers.IntegerField(source='user_id', read_only=True)
+    email = serializers.EmailField(source='user.email', read_only=True)
+    avatar = SerializerMethodField()
+
+    class Meta:
+        model = LeaderboardSnapshot
+        fields = ['rank', 'id', 'email', 'avatar', 'coins', 'coins_gained', 'activities_count']
+
+    def get_avatar(self, obj):
+        return obj.user.avatar.url if obj.user.avatar else None
+
+
+class LeaderboardHistorySerializer(ModelSerializer):
+    class Meta:
+        model = LeaderboardSnapshot
+        fields = ['period', 'period_start', 'rank', 'coins', 'coins_gained', 'activities_count']
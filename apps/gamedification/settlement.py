@@ -0,0 +1,250 @@
+"""
+Завершение розыгрышей.
+
+Истекшие розыгрыши завершаются пачками, каждая - в одной транзакции:
+
+- победитель выбирается случайным смещением по индексу (розыгрыш,
+  участник) таблицы участников, без ORDER BY RANDOM() по всем строкам;
+- розыгрыши пачки закрываются одним условным UPDATE
+  (is_active = True -> False) вместе с записью победителей. Если часть
+  пачки уже закрыл параллельный процесс, транзакция откатывается и пачка
+  выбирается заново, поэтому каждый розыгрыш рассчитывается ровно один раз;
+- призы победителям и собранные средства организаторам начисляются
+  одним вызовом apply_balance_changes (по UPDATE с F() на валюту).
+
+schedule_giveaway_end() ставит задачу end_giveaway_by_id с ETA на
+end_date, поэтому розыгрыш завершается через секунды после окончания.
+ETA-задача висит в воркере неподтвержденной, и брокер Redis переотправляет
+ее после visibility_timeout, поэтому задачи ставятся только для
+розыгрышей, заканчивающихся в пределах ETA_HORIZON (меньше
+visibility_timeout): при создании или, для более долгих, - задачей
+check_expired_giveaways, которая заодно завершает розыгрыши с потерянной
+задачей. Ключ в общем кэше не дает поставить задачу розыгрыша дважды,
+а повторная доставка безопасна - расчет идемпотентен.
+Настраивается через settings.GIVEAWAY_SETTLEMENT.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models import Case, Count, Value, When
+from django.utils import timezone
+
+from apps.api_auth.ledger import BalanceChange, apply_balance_changes
+from apps.api_auth.models import UserModel
+from .models import GiveawayModel
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTLEMENT_SETTINGS = {
+    'ETA_HORIZON': 1800,  # секунды, больше интервала check_expired_giveaways
+    'CACHE_ALIAS': 'default',
+}
+
+SETTLEMENT_BATCH_SIZE = 100
+SETTLEMENT_ATTEMPTS = 3
+SETTLEMENT_REASON = 'giveaway_settlement'
+
+Participant = GiveawayModel.participants.through
+
+
+def get_settlement_settings():
+    return {**DEFAULT_SETTLEMENT_SETTINGS, **getattr(settings, 'GIVEAWAY_SETTLEMENT', {})}
+
+
+class SettlementConflict(Exception):
+    """Часть пачки уже завершена другим процессом, транзакция откачена"""
+
+
+def _count_participants(giveaway_ids):
+    """Количество участников розыгрышей одним запросом: {id розыгрыша: количество}"""
+    return dict(
+        Participant.objects.filter(
+            giveawaymodel_id__in=giveaway_ids
+        ).order_by().values('giveawaymodel_id').annotate(
+            total=Count('pk')
+        ).values_list('giveawaymodel_id', 'total')
+    )
+
+
+def pick_winner_id(giveaway_id, participants_count):
+    """Id случайного участника или None, если участников нет"""
+    if not participants_count:
+        return None
+    offset = random.randrange(participants_count)
+    winner_ids = list(
+        Participant.objects.filter(
+            giveawaymodel_id=giveaway_id
+        ).order_by('usermodel_id').values_list('usermodel_id', flat=True)[offset:offset + 1]
+    )
+    return winner_ids[0] if winner_ids else None
+
+
+def _settle(giveaway_ids, now):
+    with transaction.atomic():
+        giveaways = GiveawayModel.objects.select_for_update().filter(
+            pk__in=giveaway_ids, is_active=True
+        )
+        if now is not None:
+            giveaways = giveaways.filter(end_date__lte=now)
+        giveaways = list(giveaways.order_by('pk'))
+        if not giveaways:
+            return []
+
+        pks = [giveaway.pk for giveaway in giveaways]
+        counts = _count_participants(pks)
+        winner_ids = {}
+        payouts = []
+        for giveaway in giveaways:
+            reference = f'giveaway:{giveaway.pk}'
+            winner_id = pick_winner_id(giveaway.pk, counts.get(giveaway.pk, 0))
+            if winner_id is not None:
+                winner_ids[giveaway.pk] = winner_id
+                if giveaway.prize_fond > 0:
+                    payouts.append(BalanceChange(winner_id, 'diamonds', giveaway.prize_fond, reference))
+            # Собранные средства от участников идут организатору
+            if giveaway.collected_funds > 0:
+                payouts.append(BalanceChange(giveaway.organizator_id, 'diamonds', giveaway.collected_funds, reference))
+
+        if winner_ids:
+            winner = Case(
+                *[When(pk=pk, then=Value(winner_id)) for pk, winner_id in winner_ids.items()],
+                default=Value(None),
+                output_field=models.BigIntegerField(),
+            )
+        else:
+            winner = None
+
+        settled_at = timezone.now()
+        claimed = GiveawayModel.objects.filter(pk__in=pks, is_active=True).update(
+            is_active=False, winner_id=winner, updated_at=settled_at
+        )
+        if claimed != len(pks):
+            raise SettlementConflict(f"Giveaways already settled: {pks}")
+
+        balances = apply_balance_changes(payouts, SETTLEMENT_REASON)
+
+    winners = UserModel.objects.in_bulk(set(winner_ids.values()))
+    for giveaway in giveaways:
+        giveaway.is_active = False
+        giveaway.updated_at = settled_at
+        giveaway.winner = winners.get(winner_ids.get(giveaway.pk))
+        if giveaway.winner and giveaway.winner.pk in balances:
+            giveaway.winner.diamonds = balances[giveaway.winner.pk]['diamonds']
+    return giveaways
+
+
+def settle_giveaways(giveaway_ids, now=None):
+    """
+    Завершает активные розыгрыши из giveaway_ids и начисляет выплаты.
+    Если передан now, завершаются только розыгрыши с end_date <= now.
+    Возвращает завершенные розыгрыши с выбранными победителями;
+    уже завершенные пропускаются
+    """
+    for attempt in range(1, SETTLEMENT_ATTEMPTS + 1):
+        try:
+            return _settle(giveaway_ids, now)
+        except SettlementConflict:
+            if attempt == SETTLEMENT_ATTEMPTS:
+                raise
+            # Повторный выбор увидит закрытые другим процессом розыгрыши
+            continue
+
+
+def settle_expired_giveaways(now=None, batch_size=SETTLEMENT_BATCH_SIZE):
+    """
+    Завершает все розыгрыши с end_date <= now пачками по batch_size.
+    Пачка с ошибкой рассчитывается поштучно, чтобы сбойный розыгрыш
+    не блокировал остальные. Возвращает завершенные розыгрыши
+    """
+    now = now or timezone.now()
+    settled = []
+    failed_ids = set()
+
+    while True:
+        giveaway_ids = list(
+            GiveawayModel.objects.filter(
+                is_active=True, end_date__lte=now
+            ).exclude(pk__in=failed_ids).order_by('end_date', 'pk').values_list(
+                'pk', flat=True
+            )[:batch_size]
+        )
+        if not giveaway_ids:
+            break
+
+        try:
+            settled.extend(settle_giveaways(giveaway_ids, now))
+        except Exception:
+            logger.exception(f"Error settling giveaways batch {giveaway_ids}, retrying one by one")
+            for giveaway_id in giveaway_ids:
+                try:
+                    settled.extend(settle_giveaways([giveaway_id], now))
+                except Exception:
+                    logger.exception(f"Error settling giveaway {giveaway_id}")
+                    failed_ids.add(giveaway_id)
+
+    return settled
+
+
+def _scheduled_key(giveaway_id):
+    return f'gamedification:giveaway_end_scheduled:{giveaway_id}'
+
+
+def schedule_giveaway_end(giveaway, replace=False):
+    """
+    После коммита ставит задачу завершения розыгрыша на его end_date, если
+    он заканчивается в пределах ETA_HORIZON и задача еще не поставлена
+    (replace=True - поставить заново, даже если задача уже была).
+    Более поздние розыгрыши передает в очередь check_expired_giveaways;
+    если брокер недоступен, розыгрыш завершит она же
+    """
+    from .tasks import end_giveaway_by_id
+
+    options = get_settlement_settings()
+    remaining = (giveaway.end_date - timezone.now()).total_seconds()
+    if remaining > options['ETA_HORIZON']:
+        return
+
+    cache = caches[options['CACHE_ALIAS']]
+    key = _scheduled_key(giveaway.pk)
+
+    def enqueue():
+        if replace:
+            cache.delete(key)
+        # Ключ живет до end_date: пока он есть, задача уже в очереди
+        if not cache.add(key, 1, max(remaining, 0) + 60):
+            return
+        try:
+            end_giveaway_by_id.apply_async(
+                (giveaway.pk,), {'scheduled': True}, eta=giveaway.end_date
+            )
+        except Exception:
+            cache.delete(key)
+            logger.warning(
+                f"Could not schedule end of giveaway {giveaway.pk}, "
+                f"it will be settled by check_expired_giveaways",
+                exc_info=True
+            )
+
+    transaction.on_commit(enqueue)
+
+
+def schedule_upcoming_giveaway_ends(now=None):
+    """
+    Ставит задачи завершения для розыгрышей, которые закончатся в пределах
+    ETA_HORIZON. Возвращает количество просмотренных розыгрышей
+    """
+    now = now or timezone.now()
+    horizon = timedelta(seconds=get_settlement_settings()['ETA_HORIZON'])
+    giveaways = GiveawayModel.objects.filter(
+        is_active=True, end_date__gt=now, end_date__lte=now + horizon
+    ).only('pk', 'end_date')
+    count = 0
+    for giveaway in giveaways:
+        schedule_giveaway_end(giveaway)
+        count += 1
+    return count
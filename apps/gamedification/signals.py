@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.api.friend_graph import get_friend_ids
+from apps.api.models import Friendship
+from apps.api_auth.ledger import balance_changed
+from apps.api_auth.models import UserModel
+from .leaderboard import (
+    FRIENDS_LEADERBOARD_FIELDS, get_leaderboard, invalidate_friends_leaderboard
+)
+
+
+@receiver(post_save, sender=UserModel)
+def update_leaderboard(sender, instance, update_fields=None, **kwargs):
+    """Переносит монеты пользователя в рейтинг после коммита"""
+    if update_fields is not None and 'coins' not in update_fields:
+        return
+    user_id, coins = instance.id, instance.coins
+    transaction.on_commit(lambda: get_leaderboard().update(user_id, coins))
+
+
+@receiver(post_delete, sender=UserModel)
+def remove_from_leaderboard(sender, instance, **kwargs):
+    user_id = instance.id
+    transaction.on_commit(lambda: get_leaderboard().remove(user_id))
+
+
+@receiver(post_save, sender=UserModel)
+def invalidate_friends_leaderboards_of_user(sender, instance, update_fields=None, **kwargs):
+    """Пользователь есть в лидербордах всех своих друзей"""
+    if update_fields is not None and not FRIENDS_LEADERBOARD_FIELDS & set(update_fields):
+        return
+    user_id = instance.id
+    transaction.on_commit(
+        lambda: invalidate_friends_leaderboard(user_id, *get_friend_ids(user_id))
+    )
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_friends_leaderboards_of_pair(sender, instance, **kwargs):
+    user_ids = (instance.from_user_id, instance.to_user_id)
+    transaction.on_commit(lambda: invalidate_friends_leaderboard(*user_ids))
+
+
+@receiver(balance_changed)
+def sync_leaderboards_with_balances(sender, balances, **kwargs):
+    """Леджер меняет балансы через UPDATE, минуя post_save"""
+    leaderboard = get_leaderboard()
+    user_ids = set(balances)
+    for user_id, user_balances in balances.items():
+        leaderboard.update(user_id, user_balances['coins'])
+        user_ids.update(get_friend_ids(user_id))
+    invalidate_friends_leaderboard(*user_ids)
@@ -0,0 +1,103 @@
+"""
+Исторические срезы лидерборда по монетам.
+
+Задача snapshot_leaderboards раз в сутки записывает в LeaderboardSnapshot
+место и монеты каждого пользователя для текущего дня, недели и месяца
+(строки текущих периодов перезаписываются, прошедшие остаются итогом).
+Вместе с местом сохраняются прирост монет относительно итога прошлого
+периода и количество действий пользователя (UserActivity) за период,
+поэтому "топ недели" и история мест читают готовые строки.
+
+Срез фиксирует текущие балансы, поэтому снимается только за сегодня:
+записать им прошедший день значило бы подменить его итог нынешними монетами.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.api_auth.models import UserModel
+from apps.user_activitys.models import UserActivity
+from .models import LeaderboardSnapshot
+
+
+SNAPSHOT_BATCH_SIZE = 1000
+SNAPSHOT_PERIODS = [choice for choice, _ in LeaderboardSnapshot.PERIOD_CHOICES]
+
+
+def get_period_start(period, day):
+    """Первый день периода, в который попадает day"""
+    if period == LeaderboardSnapshot.PERIOD_WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == LeaderboardSnapshot.PERIOD_MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def get_previous_period_start(period, period_start):
+    if period == LeaderboardSnapshot.PERIOD_WEEK:
+        return period_start - timedelta(days=7)
+    if period == LeaderboardSnapshot.PERIOD_MONTH:
+        return (period_start - timedelta(days=1)).replace(day=1)
+    return period_start - timedelta(days=1)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _activities_between(start_day, end_day):
+    """Действия пользователей с начала start_day до конца end_day"""
+    return dict(
+        UserActivity.objects.filter(
+            timestamp__gte=_day_start(start_day),
+            timestamp__lt=_day_start(end_day + timedelta(days=1))
+        ).order_by().values('user_id').annotate(
+            total=Count('pk')
+        ).values_list('user_id', 'total')
+    )
+
+
+def take_leaderboard_snapshots():
+    """
+    Записывает срезы лидерборда по текущим монетам за сегодняшние день,
+    неделю и месяц. Возвращает количество записанных строк
+    """
+    day = timezone.localdate()
+    standings = list(
+        UserModel.objects.order_by('-coins', '-id').values_list('id', 'coins')
+    )
+
+    count = 0
+    for period in SNAPSHOT_PERIODS:
+        period_start = get_period_start(period, day)
+        previous_coins = dict(
+            LeaderboardSnapshot.objects.filter(
+                period=period,
+                period_start=get_previous_period_start(period, period_start)
+            ).values_list('user_id', 'coins')
+        )
+        activities = _activities_between(period_start, day)
+
+        rows = []
+        for rank, (user_id, coins) in enumerate(standings, start=1):
+            previous = previous_coins.get(user_id)
+            rows.append(LeaderboardSnapshot(
+                period=period,
+                period_start=period_start,
+                user_id=user_id,
+                rank=rank,
+                coins=coins,
+                coins_gained=None if previous is None else coins - previous,
+                activities_count=activities.get(user_id, 0),
+            ))
+
+        with transaction.atomic():
+            LeaderboardSnapshot.objects.filter(
+                period=period, period_start=period_start
+            ).delete()
+            LeaderboardSnapshot.objects.bulk_create(rows, batch_size=SNAPSHOT_BATCH_SIZE)
+        count += len(rows)
+
+    return count
@@ -1,98 +1,96 @@
 from celery import shared_task
 from django.utils import timezone
 from .models import GiveawayModel
-from apps.api_auth.models import UserModel
+from .leaderboard import get_leaderboard
+from .settlement import (
+    schedule_giveaway_end, schedule_upcoming_giveaway_ends, settle_expired_giveaways,
+    settle_giveaways
+)
+from .snapshots import take_leaderboard_snapshots
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _log_settled(giveaway):
+    if giveaway.winner:
+        logger.info(
+            f"Giveaway '{giveaway.title}' completed. "
+            f"Winner: {giveaway.winner.email}, Prize: {giveaway.prize_fond} diamonds"
+        )
+    else:
+        logger.info(
+            f"Giveaway '{giveaway.title}' completed without participants"
+        )
+    if giveaway.collected_funds > 0:
+        logger.info(f"Organizer {giveaway.organizator_id} received {giveaway.collected_funds} diamonds from participants")
+
+
 @shared_task
 def check_expired_giveaways():
     """
-    Проверяет и завершает истекшие конкурсы
+    Завершает истекшие конкурсы пачками, выплаты начисляются ровно один раз
+    (страховка для конкурсов, чья ETA-задача end_giveaway_by_id потерялась),
+    и ставит ETA-задачи конкурсам, которые скоро закончатся
     """
-    now = timezone.now()
-    
-    # Находим все активные конкурсы, которые должны быть завершены
-    expired_giveaways = GiveawayModel.objects.filter(
-        is_active=True,
-        end_date__lte=now
-    )
+    settled = settle_expired_giveaways()
+    for giveaway in settled:
+        _log_settled(giveaway)
     
-    completed_count = 0
+    if settled:
+        logger.info(f"Completed {len(settled)} expired giveaways")
     
-    for giveaway in expired_giveaways:
-        try:
-            # Завершаем конкурс
-            giveaway.end_giveaway()
-            
-            # Если есть победитель, начисляем ему призовой фонд
-            if giveaway.winner:
-                winner = giveaway.winner
-                winner.diamonds += giveaway.prize_fond
-                winner.save()
-                
-                logger.info(
-                    f"Giveaway '{giveaway.title}' completed. "
-                    f"Winner: {winner.email}, Prize: {giveaway.prize_fond} diamonds"
-                )
-            
-            # Собранные средства от участников идут организатору
-            if giveaway.collected_funds > 0:
-                giveaway.organizator.diamonds += giveaway.collected_funds
-                giveaway.organizator.save()
-                logger.info(f"Organizer {giveaway.organizator.username} received {giveaway.collected_funds} diamonds from participants")
-            else:
-                logger.info(
-                    f"Giveaway '{giveaway.title}' completed without participants"
-                )
-            
-            completed_count += 1
-            
-        except Exception as e:
-            logger.error(
-                f"Error completing giveaway '{giveaway.title}': {str(e)}"
-            )
+    schedule_upcoming_giveaway_ends()
     
-    if completed_count > 0:
-        logger.info(f"Completed {completed_count} expired giveaways")
-    
-    return f"Processed {completed_count} expired giveaways"
+    return f"Processed {len(settled)} expired giveaways"
 
 @shared_task
-def end_giveaway_by_id(giveaway_id):
+def end_giveaway_by_id(giveaway_id, scheduled=False):
     """
-    Завершает конкретный конкурс по ID
+    Завершает конкретный конкурс по ID.
+    scheduled=True - запуск по ETA из schedule_giveaway_end: конкурс
+    завершается, только если его end_date наступил
     """
+    now = timezone.now() if scheduled else None
     try:
-        giveaway = GiveawayModel.objects.get(id=giveaway_id, is_active=True)
-        giveaway.end_giveaway()
-        
-        if giveaway.winner:
-            winner = giveaway.winner
-            winner.diamonds += giveaway.prize_fond
-            winner.save()
-            
-            logger.info(
-                f"Giveaway '{giveaway.title}' manually completed. "
-                f"Winner: {winner.email}, Prize: {giveaway.prize_fond} diamonds"
-            )
-            return f"Giveaway completed. Winner: {winner.email}"
-        
-        # Собранные средства от участников идут организатору
-        if giveaway.collected_funds > 0:
-            giveaway.organizator.diamonds += giveaway.collected_funds
-            giveaway.organizator.save()
-            logger.info(f"Organizer {giveaway.organizator.username} received {giveaway.collected_funds} diamonds from participants")
-        else:
-            logger.info(
-                f"Giveaway '{giveaway.title}' completed without participants"
-            )
-            return "Giveaway completed without participants"
-            
-    except GiveawayModel.DoesNotExist:
-        logger.error(f"Giveaway with ID {giveaway_id} not found or already completed")
-        return "Giveaway not found or already completed"
+        settled = settle_giveaways([giveaway_id], now)
     except Exception as e:
         logger.error(f"Error completing giveaway {giveaway_id}: {str(e)}")
-        return f"Error: {str(e)}"
\ No newline at end of file
+        return f"Error: {str(e)}"
+
+    if not settled:
+        if scheduled:
+            giveaway = GiveawayModel.objects.filter(
+                pk=giveaway_id, is_active=True, end_date__gt=now
+            ).first()
+            if giveaway:
+                # Задача пришла раньше end_date (сдвиг часов) - переносим
+                schedule_giveaway_end(giveaway, replace=True)
+                return "Giveaway has not ended yet, rescheduled"
+        logger.error(f"Giveaway with ID {giveaway_id} not found or already completed")
+        return "Giveaway not found or already completed"
+
+    giveaway = settled[0]
+    _log_settled(giveaway)
+    if giveaway.winner:
+        return f"Giveaway completed. Winner: {giveaway.winner.email}"
+    return "Giveaway completed without participants"
+
+
+@shared_task
+def rebuild_leaderboard():
+    """
+    Пересобирает лидерборд из базы (исправляет изменения монет в обход сигналов)
+    """
+    users_count = get_leaderboard().rebuild()
+    logger.info(f"Rebuilt leaderboard: {users_count} users")
+    return f"Rebuilt leaderboard: {users_count} users"
+
+
+@shared_task
+def snapshot_leaderboards():
+    """
+    Записывает срезы лидерборда за текущие день, неделю и месяц
+    """
+    rows_count = take_leaderboard_snapshots()
+    logger.info(f"Stored {rows_count} leaderboard snapshot rows")
+    return f"Stored {rows_count} leaderboard snapshot rows"
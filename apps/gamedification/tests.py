@@ -1,3 +1,202 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.api_auth import activity
+from apps.api_auth.models import BalanceTransaction, UserModel
+from apps.gamedification import settlement
+from apps.gamedification.models import GiveawayModel
+from apps.gamedification.settlement import settle_expired_giveaways, settle_giveaways
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+Participant = GiveawayModel.participants.through
+
+
+def create_user(name, coins=0, diamonds=0):
+    user = UserModel(username=name, email=f'{name}@example.com', coins=coins, diamonds=diamonds)
+    user.set_password('password')
+    user.generate_token()
+    return user
+
+
+def create_giveaway(organizator, ends_in=timedelta(hours=1), **kwargs):
+    now = timezone.now()
+    return GiveawayModel.objects.create(
+        organizator=organizator,
+        title='Giveaway',
+        description='Giveaway',
+        prize_fond=kwargs.pop('prize_fond', 100),
+        giveaway_cost=kwargs.pop('giveaway_cost', 10),
+        start_date=now - timedelta(hours=1),
+        end_date=now + ends_in,
+        **kwargs
+    )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GiveawayJoinTests(TestCase):
+
+    def setUp(self):
+        tracker = activity.LastActiveTracker(
+            activity.MemoryActivityBuffer(), staleness=60, flush_interval=30, auto_flush=False
+        )
+        patcher = mock.patch.object(activity, '_tracker', tracker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.organizator = create_user('organizator')
+        self.user = create_user('participant', diamonds=25)
+        self.giveaway = create_giveaway(self.organizator)
+
+    def join(self):
+        return self.client.post(
+            f'/api/game/giveaways/{self.giveaway.pk}/',
+            HTTP_AUTHORIZATION=f'Token {self.user.token}',
+        )
+
+    def test_join_debits_and_collects(self):
+        self.assertEqual(self.join().status_code, 200)
+
+        self.user.refresh_from_db()
+        self.giveaway.refresh_from_db()
+        self.assertEqual(self.user.diamonds, 15)
+        self.assertEqual(self.giveaway.collected_funds, 10)
+        self.assertTrue(Participant.objects.filter(giveawaymodel=self.giveaway, usermodel=self.user).exists())
+
+    def test_duplicate_join_is_rejected_without_second_debit(self):
+        self.join()
+        response = self.join()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], "You already participated in this giveaway")
+        self.user.refresh_from_db()
+        self.giveaway.refresh_from_db()
+        self.assertEqual(self.user.diamonds, 15)
+        self.assertEqual(self.giveaway.collected_funds, 10)
+        self.assertEqual(BalanceTransaction.objects.filter(reason='giveaway_participation').count(), 1)
+
+    def test_join_racing_settlement_is_rolled_back(self):
+        add_sum = GiveawayModel.add_sum
+
+        def settled_before_add_sum(giveaway, amount):
+            # Розыгрыш завершили между проверками представления и записью участия
+            GiveawayModel.objects.filter(pk=giveaway.pk).update(is_active=False)
+            return add_sum(giveaway, amount)
+
+        with mock.patch.object(GiveawayModel, 'add_sum', settled_before_add_sum):
+            response = self.join()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], "This giveaway has ended")
+        self.user.refresh_from_db()
+        self.giveaway.refresh_from_db()
+        self.assertEqual(self.user.diamonds, 25)
+        self.assertEqual(self.giveaway.collected_funds, 0)
+        self.assertFalse(Participant.objects.filter(giveawaymodel=self.giveaway).exists())
+        self.assertFalse(BalanceTransaction.objects.exists())
+
+    def test_join_without_funds_is_rolled_back(self):
+        poor = create_user('poor', diamonds=5)
+        response = self.client.post(
+            f'/api/game/giveaways/{self.giveaway.pk}/',
+            HTTP_AUTHORIZATION=f'Token {poor.token}',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.giveaway.refresh_from_db()
+        self.assertEqual(self.giveaway.collected_funds, 0)
+        self.assertFalse(Participant.objects.filter(giveawaymodel=self.giveaway).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SettlementTests(TestCase):
+
+    def setUp(self):
+        self.organizator = create_user('organizator')
+        self.participants = [create_user(f'participant{i}') for i in range(3)]
+        self.giveaway = create_giveaway(self.organizator, ends_in=-timedelta(minutes=1))
+        for user in self.participants:
+            Participant.objects.create(giveawaymodel=self.giveaway, usermodel=user)
+        GiveawayModel.objects.filter(pk=self.giveaway.pk).update(collected_funds=30)
+
+    def total_diamonds(self):
+        return sum(UserModel.objects.values_list('diamonds', flat=True))
+
+    def test_settlement_pays_once(self):
+        settled = settle_giveaways([self.giveaway.pk])
+        self.assertEqual(settle_giveaways([self.giveaway.pk]), [])
+
+        self.assertEqual(len(settled), 1)
+        self.giveaway.refresh_from_db()
+        self.assertFalse(self.giveaway.is_active)
+        self.assertIn(self.giveaway.winner, self.participants)
+        self.assertEqual(self.giveaway.winner.diamonds, 100)
+        self.organizator.refresh_from_db()
+        self.assertEqual(self.organizator.diamonds, 30)
+        self.assertEqual(self.total_diamonds(), 130)
+        self.assertEqual(BalanceTransaction.objects.filter(reason=settlement.SETTLEMENT_REASON).count(), 2)
+
+    def test_end_giveaway_twice_pays_once(self):
+        self.assertTrue(self.giveaway.end_giveaway())
+        self.assertFalse(self.giveaway.end_giveaway())
+        self.assertEqual(self.total_diamonds(), 130)
+
+    def test_settlement_conflict_rolls_back_and_pays_once(self):
+        count_participants = settlement._count_participants
+        calls = []
+
+        def settled_concurrently(giveaway_ids):
+            # В первой попытке розыгрыш закрывает параллельный процесс
+            # между выбором пачки и условным UPDATE
+            calls.append(giveaway_ids)
+            if len(calls) == 1:
+                GiveawayModel.objects.filter(pk__in=giveaway_ids).update(is_active=False)
+            return count_participants(giveaway_ids)
+
+        with mock.patch.object(settlement, '_count_participants', settled_concurrently):
+            settled = settle_giveaways([self.giveaway.pk])
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([giveaway.pk for giveaway in settled], [self.giveaway.pk])
+        self.assertEqual(self.total_diamonds(), 130)
+        self.assertEqual(BalanceTransaction.objects.filter(reason=settlement.SETTLEMENT_REASON).count(), 2)
+
+    def test_persistent_conflict_pays_nothing(self):
+        count_participants = settlement._count_participants
+
+        def settled_concurrently(giveaway_ids):
+            GiveawayModel.objects.filter(pk__in=giveaway_ids).update(is_active=False)
+            return count_participants(giveaway_ids)
+
+        with mock.patch.object(settlement, '_count_participants', settled_concurrently):
+            with self.assertRaises(settlement.SettlementConflict):
+                settle_giveaways([self.giveaway.pk])
+
+        self.giveaway.refresh_from_db()
+        self.assertTrue(self.giveaway.is_active)
+        self.assertEqual(self.total_diamonds(), 0)
+        self.assertFalse(BalanceTransaction.objects.exists())
+
+    def test_giveaway_without_participants_closes_cleanly(self):
+        empty = create_giveaway(self.organizator, ends_in=-timedelta(minutes=1))
+
+        settled = settle_giveaways([empty.pk])
+
+        self.assertEqual([giveaway.pk for giveaway in settled], [empty.pk])
+        empty.refresh_from_db()
+        self.assertFalse(empty.is_active)
+        self.assertIsNone(empty.winner)
+        self.assertFalse(BalanceTransaction.objects.filter(reference=f'giveaway:{empty.pk}').exists())
+
+    def test_settle_expired_skips_running_giveaways(self):
+        running = create_giveaway(self.organizator)
+
+        settled = settle_expired_giveaways()
+
+        self.assertEqual([giveaway.pk for giveaway in settled], [self.giveaway.pk])
+        running.refresh_from_db()
+        self.assertTrue(running.is_active)
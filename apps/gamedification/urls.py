@@ -3,6 +3,10 @@ from . import views
 
 urlpatterns = [
     path('leaderboard/global/', views.LiderboardView.as_view()),
+    path('leaderboard/me/', views.LeaderboardMeView.as_view()),
+    path('leaderboard/around/', views.LeaderboardAroundView.as_view()),
+    path('leaderboard/history/', views.LeaderboardHistoryView.as_view()),
+    path('leaderboard/snapshots/<str:period>/', views.LeaderboardSnapshotView.as_view()),
     path('leaderboard/frends/', views.UserFrendsLiderboardView.as_view()),
     path('giveaways/', views.GiveawaysView.as_view()),
     path('giveaways/<int:pk>/', views.GiveawayView.as_view()),
@@ -1,71 +1,173 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from datetime import date
 
+from apps.api_auth.ledger import InsufficientFunds, debit
 from apps.api_auth.models import UserModel
-from apps.api.models import Friendship
-from .models import GiveawayModel
-from .serializers import GiveawaySerializer
+from .leaderboard import (
+    FRIENDS_LEADERBOARD_METRICS, get_friends_leaderboard, get_leaderboard
+)
+from .models import GiveawayClosed, GiveawayModel, LeaderboardSnapshot
+from .serializers import (
+    GiveawaySerializer, LeaderboardHistorySerializer, LeaderboardSnapshotSerializer
+)
+from .settlement import schedule_giveaway_end
+from .snapshots import SNAPSHOT_PERIODS, get_period_start
 
 from apps.api_auth.decorators import token_required
 
+Participant = GiveawayModel.participants.through
+
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_MAX_RADIUS = 25
+
+
+def _int_param(request, name, default, minimum, maximum):
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        value = default
+    return max(minimum, min(value, maximum))
+
+
+def _leaderboard_response_data(entries):
+    """Места из лидерборда с пользователями, загруженными одним запросом"""
+    users = UserModel.objects.in_bulk([user_id for _, user_id, _ in entries])
+    response_data = []
+    for rank, user_id, _ in entries:
+        user = users.get(user_id)
+        if user is None:
+            continue
+        response_data.append({
+            "rank": rank,
+            "id": user.id,
+            "email": user.email,
+            "diamonds": user.diamonds,
+            "coins": user.coins,
+            "avatar": user.avatar.url if user.avatar else None,
+        })
+    return response_data
+
+
 class LiderboardView(APIView):
     def get(self, request):
-        users_limit = request.query_params.get('limit', 10)
-        try:
-            users_limit = int(users_limit)
-        except ValueError:
-            users_limit = 10
-            
-        users = UserModel.objects.all().order_by('-coins')[:users_limit]
-        response_data = [
-            {
-                "id": user.id,
-                "email": user.email,
-                "diamonds": user.diamonds,
-                "coins": user.coins,
-                "avatar": user.avatar.url if user.avatar else None,
-            }
-            for user in users
-        ]
+        users_limit = _int_param(request, 'limit', 10, 1, LEADERBOARD_MAX_LIMIT)
+        offset = _int_param(request, 'offset', 0, 0, 10 ** 9)
+        
+        # Топ по монетам из отсортированного рейтинга, без сортировки таблицы
+        entries = get_leaderboard().top(users_limit, offset)
+        response_data = _leaderboard_response_data(entries)
         
         return Response(response_data, status=status.HTTP_200_OK)
 
+
+class LeaderboardMeView(APIView):
+    @token_required
+    def get(self, request):
+        """Место текущего пользователя в глобальном лидерборде"""
+        leaderboard = get_leaderboard()
+        return Response({
+            "id": request.user.id,
+            "rank": leaderboard.rank(request.user.id),
+            "coins": leaderboard.score(request.user.id),
+            "total": leaderboard.count(),
+        }, status=status.HTTP_200_OK)
+
+
+class LeaderboardAroundView(APIView):
+    @token_required
+    def get(self, request):
+        """Пользователи выше и ниже текущего в глобальном лидерборде"""
+        radius = _int_param(request, 'radius', 5, 0, LEADERBOARD_MAX_RADIUS)
+        entries = get_leaderboard().around(request.user.id, radius)
+        return Response(_leaderboard_response_data(entries), status=status.HTTP_200_OK)
+
 class UserFrendsLiderboardView(APIView):
     @token_required
     def get(self, request):
         user = request.user
         
-        # Получаем друзей пользователя (принятые заявки в дружбу)
-        sent_friendships = user.friendship_requests_sent.filter(status='accepted')
-        received_friendships = user.friendship_requests_received.filter(status='accepted')
-        
-        # Собираем всех друзей
-        friends = []
-        for friendship in sent_friendships:
-            friends.append(friendship.to_user)
-        for friendship in received_friendships:
-            friends.append(friendship.from_user)
-        friends.append(user)
-        # Сортируем друзей по уровню (по убыванию)
-        friends_sorted = sorted(friends, key=lambda friend: friend.level, reverse=True)
-        
-        # Формируем ответ
-        response_data = [
-            {
-                "id": user.id,
-                "email": user.email,
-                "diamonds": user.diamonds,
-                "coins": user.coins,
-                "avatar": user.avatar.url if user.avatar else None,
-            }
-            for user in friends_sorted
-        ]
+        metric = request.query_params.get('metric', 'level')
+        if metric not in FRIENDS_LEADERBOARD_METRICS:
+            return Response({
+                "error": f"metric must be one of: {', '.join(FRIENDS_LEADERBOARD_METRICS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Друзья вместе с самим пользователем, отсортированные в базе; кэшируется
+        response_data = get_friends_leaderboard(user.id, metric)
+        
+        # Окно мест вокруг пользователя
+        if 'radius' in request.query_params:
+            radius = _int_param(request, 'radius', 5, 0, LEADERBOARD_MAX_RADIUS)
+            position = next(
+                index for index, entry in enumerate(response_data) if entry["id"] == user.id
+            )
+            response_data = response_data[max(position - radius, 0):position + radius + 1]
         
         return Response(response_data, status=status.HTTP_200_OK)
     
     
+class LeaderboardSnapshotView(APIView):
+    def get(self, request, period):
+        """Топ за день, неделю или месяц из сохраненных срезов"""
+        if period not in SNAPSHOT_PERIODS:
+            return Response({
+                "error": f"period must be one of: {', '.join(SNAPSHOT_PERIODS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            day = date.fromisoformat(request.query_params['date'])
+        except KeyError:
+            day = timezone.localdate()
+        except ValueError:
+            return Response({"error": "date must be in YYYY-MM-DD format"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        order = request.query_params.get('order', 'rank')
+        if order not in ('rank', 'gained'):
+            return Response({"error": "order must be 'rank' or 'gained'"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        users_limit = _int_param(request, 'limit', 10, 1, LEADERBOARD_MAX_LIMIT)
+        offset = _int_param(request, 'offset', 0, 0, 10 ** 9)
+        
+        period_start = get_period_start(period, day)
+        snapshots = LeaderboardSnapshot.objects.filter(
+            period=period, period_start=period_start
+        ).select_related('user')
+        if order == 'gained':
+            snapshots = snapshots.filter(coins_gained__isnull=False).order_by('-coins_gained', 'rank')
+        else:
+            snapshots = snapshots.order_by('rank')
+        
+        serializer = LeaderboardSnapshotSerializer(snapshots[offset:offset + users_limit], many=True)
+        return Response({
+            "period": period,
+            "period_start": period_start,
+            "results": serializer.data,
+        }, status=status.HTTP_200_OK)
+
+
+class LeaderboardHistoryView(APIView):
+    @token_required
+    def get(self, request):
+        """История мест текущего пользователя по сохраненным срезам"""
+        period = request.query_params.get('period', LeaderboardSnapshot.PERIOD_DAY)
+        if period not in SNAPSHOT_PERIODS:
+            return Response({
+                "error": f"period must be one of: {', '.join(SNAPSHOT_PERIODS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        history_limit = _int_param(request, 'limit', 30, 1, LEADERBOARD_MAX_LIMIT)
+        snapshots = LeaderboardSnapshot.objects.filter(
+            user=request.user, period=period
+        ).order_by('-period_start')[:history_limit]
+        
+        serializer = LeaderboardHistorySerializer(snapshots, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
 class GiveawaysView(APIView):
     
     def get(self, request):
@@ -84,19 +186,22 @@ class GiveawaysView(APIView):
             user = request.user
             prize_fond = serializer.validated_data['prize_fond']
             
-            # Проверяем, достаточно ли diamonds у организатора
-            if user.diamonds < prize_fond:
+            try:
+                with transaction.atomic():
+                    # Устанавливаем текущего пользователя как организатора
+                    giveaway = serializer.save(organizator=user)
+                    
+                    # Списываем diamonds с баланса организатора условным UPDATE
+                    if prize_fond > 0:
+                        debit(user, 'diamonds', prize_fond, 'giveaway_prize_fund', f'giveaway:{giveaway.pk}')
+                    
+                    # Завершение по end_date ставится в очередь после коммита
+                    schedule_giveaway_end(giveaway)
+            except InsufficientFunds:
                 return Response(
                     {"error": "You don't have enough diamonds to create this giveaway"}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            # Списываем diamonds с баланса организатора
-            user.diamonds -= prize_fond
-            user.save()
-            
-            # Устанавливаем текущего пользователя как организатора
-            serializer.save(organizator=user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -129,21 +234,27 @@ class GiveawayView(APIView):
             return Response({"error": "This giveaway has not started yet"}, status=status.HTTP_400_BAD_REQUEST)
         
         user = request.user
-        if user in giveaway.participants.all():
+        try:
+            with transaction.atomic():
+                # Добавляем стоимость участия к призовому фонду, только пока
+                # розыгрыш открыт; строка розыгрыша заблокирована до коммита
+                if not giveaway.add_sum(giveaway.giveaway_cost):
+                    raise GiveawayClosed
+                
+                # Добавляем участника; повторное участие упирается в уникальность
+                # и откатывается до списания
+                Participant.objects.create(giveawaymodel_id=giveaway.pk, usermodel_id=user.pk)
+                
+                # Списываем diamonds условным UPDATE
+                if giveaway.giveaway_cost > 0:
+                    debit(user, 'diamonds', giveaway.giveaway_cost, 'giveaway_participation', f'giveaway:{giveaway.pk}')
+        except GiveawayClosed:
+            return Response({"error": "This giveaway has ended"}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
             return Response({"error": "You already participated in this giveaway"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Проверяем, достаточно ли у пользователя diamonds
-        if user.diamonds < giveaway.giveaway_cost:
+        except InsufficientFunds:
             return Response({"error": "You don't have enough diamonds to participate"}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Списываем diamonds и добавляем участника
-        user.diamonds -= giveaway.giveaway_cost
-        user.save()
-        giveaway.participants.add(user)
-        
-        # Добавляем стоимость участия к призовому фонду
-        giveaway.add_sum(giveaway.giveaway_cost)
-        
         # Возвращаем обновленную информацию о конкурсе
         serializer = GiveawaySerializer(giveaway)
         return Response({
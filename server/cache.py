@@ -0,0 +1,85 @@
+"""
+Stale-while-revalidate caching of computed values in a Django cache.
+
+Each entry stores the value with the time it was computed. Within
+fresh_timeout the value is served as is; after that it is still served
+(until stale_timeout, when the cache drops it) while a single background
+thread recomputes it, so readers never wait for a recomputation unless the
+entry is missing altogether. Values refreshed by a scheduled job are
+created with revalidate=False: readers then only read what the job
+stored and compute the value themselves only if the entry is missing.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache of compute(*args) results under keys '<name>:<args>'
+    """
+
+    def __init__(self, name, compute, fresh_timeout, stale_timeout, cache_alias='default',
+                 revalidate=True):
+        self.name = name
+        self.compute = compute
+        self.fresh_timeout = fresh_timeout
+        self.stale_timeout = max(stale_timeout, fresh_timeout)
+        self.cache_alias = cache_alias
+        self.revalidate = revalidate
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def key(self, *args):
+        return ':'.join([self.name, *map(str, args)])
+
+    def get(self, *args):
+        """Returns the cached value, recomputing it if missing or stale"""
+        return self.get_entry(*args)['value']
+
+    def get_entry(self, *args):
+        """Like get(), but returns {'value': ..., 'computed_at': unix time}"""
+        entry = self.cache.get(self.key(*args))
+        if entry is None:
+            return self._store(args)
+
+        if self.revalidate and time.time() - entry['computed_at'] > self.fresh_timeout:
+            self._revalidate(args)
+        return entry
+
+    def refresh(self, *args):
+        """Recomputes and stores the value"""
+        return self._store(args)['value']
+
+    def invalidate(self, *args):
+        self.cache.delete(self.key(*args))
+
+    def _store(self, args):
+        entry = {'value': self.compute(*args), 'computed_at': time.time()}
+        self.cache.set(self.key(*args), entry, self.stale_timeout)
+        return entry
+
+    def _revalidate(self, args):
+        # Только один пересчет на ключ, пока блокировка не истекла
+        lock_key = f'{self.key(*args)}:revalidating'
+        if not self.cache.add(lock_key, 1, self.fresh_timeout):
+            return
+        threading.Thread(
+            target=self._revalidate_in_background, args=(args, lock_key), daemon=True
+        ).start()
+
+    def _revalidate_in_background(self, args, lock_key):
+        try:
+            self.refresh(*args)
+        except Exception as e:
+            logger.error(f"Error revalidating cache {self.key(*args)}: {str(e)}")
+        finally:
+            self.cache.delete(lock_key)
+            connections.close_all()
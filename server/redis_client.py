@@ -0,0 +1,76 @@
+"""
+Shared Redis connection for subsystems that can keep their state in Redis
+(activity buffers, leaderboards). Uses settings.REDIS_URL.
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_redis_client(url=None):
+    """
+    Returns a cached redis.Redis client for the URL (settings.REDIS_URL by default)
+    """
+    url = url or settings.REDIS_URL
+    client = _clients.get(url)
+    if client is None:
+        import redis
+
+        with _clients_lock:
+            client = _clients.get(url)
+            if client is None:
+                client = redis.Redis.from_url(url)
+                _clients[url] = client
+    return client
+
+
+@contextmanager
+def claim_buffer_keys(client, key, recovery_delay):
+    """
+    Atomically moves the buffer key to a new processing key and yields the
+    list of processing keys to read. The keys are deleted only when the block
+    finishes without an exception. Otherwise they stay in Redis and are
+    claimed again by a later call once they are older than recovery_delay
+    seconds, so a failed or crashed flush does not lose the buffer.
+    """
+    import redis
+
+    prefix = f'{key}:flushing:'
+
+    def claim(source):
+        processing_key = f'{prefix}{int(time.time() * 1000)}:{uuid.uuid4().hex}'
+        try:
+            client.rename(source, processing_key)
+        except redis.ResponseError:
+            # Ключа нет или его уже забрал другой процесс
+            return None
+        return processing_key
+
+    keys = []
+    # Имя ключа начинается с времени забора в миллисекундах
+    threshold = int((time.time() - recovery_delay) * 1000)
+    for abandoned in client.scan_iter(match=f'{prefix}*'):
+        abandoned = abandoned.decode() if isinstance(abandoned, bytes) else abandoned
+        created = abandoned[len(prefix):].split(':', 1)[0]
+        if created.isdigit() and int(created) > threshold:
+            # Ключ еще может обрабатываться другим процессом
+            continue
+        claimed = claim(abandoned)
+        if claimed:
+            keys.append(claimed)
+
+    claimed = claim(key)
+    if claimed:
+        keys.append(claimed)
+
+    yield keys
+
+    if keys:
+        client.delete(*keys)
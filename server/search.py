@@ -0,0 +1,302 @@
+"""
+Pluggable full-text search over model text fields.
+
+A SearchIndex describes which fields of a model are searchable and their
+weights. Documents live in a side table named after the index and are
+kept in sync by the owning app (usually from post_save/post_delete):
+
+- 'sqlite'   - FTS5 virtual table (unicode61 tokenizer), ranked with bm25;
+- 'postgres' - table with a weighted tsvector column and a GIN index,
+               ranked with ts_rank;
+- 'basic'    - no side table, icontains over the fields (other databases).
+
+The backend is chosen from the database vendor unless
+settings.FULL_TEXT_SEARCH['BACKEND'] names one explicitly. Every query term
+is matched as a prefix and all terms must match. Indexed backends restrict
+the match to the primary keys of the filtered queryset inside the index
+query, so MAX_RESULTS caps the best matches among the objects that pass
+the filters, not the raw index hits.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Case, FloatField, Q, Value, When
+
+
+DEFAULT_SEARCH_SETTINGS = {
+    'BACKEND': 'auto',
+    # Сколько лучших совпадений (среди прошедших фильтры) передается в основной запрос
+    'MAX_RESULTS': 1000,
+}
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 16
+
+
+def get_search_settings():
+    return {**DEFAULT_SEARCH_SETTINGS, **getattr(settings, 'FULL_TEXT_SEARCH', {})}
+
+
+def parse_terms(query):
+    """Splits the user query into lowercase word terms"""
+    return [term.lower() for term in TERM_RE.findall(query or '')][:MAX_TERMS]
+
+
+class BasicSearchBackend:
+    """
+    Fallback without an index: every term must occur in one of the fields
+    """
+    vendor = 'basic'
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create_index(self, index):
+        pass
+
+    def drop_index(self, index):
+        pass
+
+    def update(self, index, instances):
+        pass
+
+    def delete(self, index, pks):
+        pass
+
+    def rebuild(self, index, batch_size=1000):
+        return 0
+
+    def search(self, index, queryset, terms, limit):
+        for term in terms:
+            condition = Q()
+            for field in index.fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class IndexedSearchBackend(BasicSearchBackend):
+    """
+    Base for backends that keep documents in a side table keyed by object_id
+    """
+
+    def update(self, index, instances):
+        rows = [self._row(index, instance) for instance in instances]
+        if rows:
+            with self.connection.cursor() as cursor:
+                self._upsert(cursor, index, rows)
+
+    def delete(self, index, pks):
+        values = [self._prep_pk(index, pk) for pk in pks]
+        if values:
+            placeholders = ', '.join(['%s'] * len(values))
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self._table(index)} WHERE object_id IN ({placeholders})',
+                    values,
+                )
+
+    def rebuild(self, index, batch_size=1000):
+        """Recreates the index from the model table, returns indexed rows"""
+        self.drop_index(index)
+        self.create_index(index)
+        count = 0
+        batch = []
+        queryset = index.model._default_manager.using(self.connection.alias)
+        for instance in queryset.only('pk', *index.fields).iterator(chunk_size=batch_size):
+            batch.append(instance)
+            if len(batch) >= batch_size:
+                self.update(index, batch)
+                count += len(batch)
+                batch = []
+        self.update(index, batch)
+        return count + len(batch)
+
+    def search(self, index, queryset, terms, limit):
+        if not terms:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+        # Фильтры queryset применяются в самом запросе к индексу, до LIMIT
+        pks_sql, pks_params = queryset.order_by().values('pk').query.get_compiler(
+            using=queryset.db
+        ).as_sql()
+        with self.connection.cursor() as cursor:
+            cursor.execute(*self._match_sql(index, terms, limit, pks_sql, pks_params))
+            matches = cursor.fetchall()
+
+        pk_field = index.model._meta.pk
+        ranks = [(pk_field.to_python(object_id), float(rank)) for object_id, rank in matches]
+        return queryset.filter(pk__in=[pk for pk, _ in ranks]).annotate(
+            search_rank=Case(
+                *[When(pk=pk, then=Value(rank)) for pk, rank in ranks],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+    def _table(self, index):
+        return self.connection.ops.quote_name(index.table)
+
+    def _prep_pk(self, index, pk):
+        return index.model._meta.pk.get_db_prep_value(pk, self.connection)
+
+    def _row(self, index, instance):
+        return [self._prep_pk(index, instance.pk)] + [
+            index.get_text(instance, field) for field in index.fields
+        ]
+
+
+class SQLiteSearchBackend(IndexedSearchBackend):
+    """
+    FTS5 virtual table: object_id UNINDEXED plus one column per field
+    """
+    vendor = 'sqlite'
+
+    def create_index(self, index):
+        columns = ', '.join(index.fields)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self._table(index)} '
+                f"USING fts5(object_id UNINDEXED, {columns}, "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def drop_index(self, index):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self._table(index)}')
+
+    def _upsert(self, cursor, index, rows):
+        # В FTS5 нет ограничения уникальности, поэтому удаляем старые документы
+        placeholders = ', '.join(['%s'] * len(rows))
+        cursor.execute(
+            f'DELETE FROM {self._table(index)} WHERE object_id IN ({placeholders})',
+            [row[0] for row in rows],
+        )
+        values = ', '.join(['%s'] * (len(index.fields) + 1))
+        cursor.executemany(
+            f'INSERT INTO {self._table(index)} (object_id, {", ".join(index.fields)}) '
+            f'VALUES ({values})',
+            rows,
+        )
+
+    def _match_sql(self, index, terms, limit, pks_sql, pks_params):
+        table = self._table(index)
+        weights = ', '.join(str(float(weight)) for weight in index.fields.values())
+        match = ' '.join('"{}"*'.format(term.replace('"', '')) for term in terms)
+        return (
+            f'SELECT object_id, -bm25({table}, 0, {weights}) AS rank FROM {table} '
+            f'WHERE {table} MATCH %s AND object_id IN ({pks_sql}) '
+            f'ORDER BY rank DESC LIMIT %s',
+            [match, *pks_params, limit],
+        )
+
+
+class PostgresSearchBackend(IndexedSearchBackend):
+    """
+    Table (object_id, document tsvector) with a GIN index.
+    Field weights map to tsvector labels A-D in declaration order.
+    """
+    vendor = 'postgresql'
+    config = 'simple'
+    labels = 'ABCD'
+
+    def create_index(self, index):
+        table = self._table(index)
+        pk_type = index.model._meta.pk.rel_db_type(self.connection)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} '
+                f'(object_id {pk_type} PRIMARY KEY, document tsvector NOT NULL)'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.connection.ops.quote_name(index.table + "_gin")} '
+                f'ON {table} USING GIN (document)'
+            )
+
+    def drop_index(self, index):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self._table(index)}')
+
+    def _document_sql(self, index):
+        return ' || '.join(
+            f"setweight(to_tsvector('{self.config}', %s), '{self.labels[min(i, 3)]}')"
+            for i, _ in enumerate(index.fields)
+        )
+
+    def _upsert(self, cursor, index, rows):
+        cursor.executemany(
+            f'INSERT INTO {self._table(index)} (object_id, document) '
+            f'VALUES (%s, {self._document_sql(index)}) '
+            f'ON CONFLICT (object_id) DO UPDATE SET document = EXCLUDED.document',
+            rows,
+        )
+
+    def _match_sql(self, index, terms, limit, pks_sql, pks_params):
+        table = self._table(index)
+        # Метки A, B, C, D в порядке полей; ts_rank принимает веса как {D, C, B, A}
+        weights = [float(weight) for weight in index.fields.values()][:4]
+        weights += [0.0] * (4 - len(weights))
+        max_weight = max(weights) or 1.0
+        weights = ', '.join(str(weight / max_weight) for weight in reversed(weights))
+        query = ' & '.join(f'{term}:*' for term in terms)
+        return (
+            f"SELECT object_id, ts_rank('{{{weights}}}'::float4[], document, query) AS rank "
+            f"FROM {table}, to_tsquery('{self.config}', %s) query "
+            f'WHERE document @@ query AND object_id IN ({pks_sql}) '
+            f'ORDER BY rank DESC LIMIT %s',
+            [query, *pks_params, limit],
+        )
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+    'basic': BasicSearchBackend,
+}
+
+
+def get_search_backend(connection):
+    name = get_search_settings()['BACKEND']
+    if name == 'auto':
+        name = connection.vendor
+    return SEARCH_BACKENDS.get(name, BasicSearchBackend)(connection)
+
+
+class SearchIndex:
+    """
+    Full-text index over fields of a model: {field name: weight}.
+    Fields should be listed from the most to the least important.
+    """
+
+    def __init__(self, table, model, fields):
+        self.table = table
+        self.model = model
+        self.fields = dict(fields)
+
+    @property
+    def backend(self):
+        return get_search_backend(connections[router.db_for_write(self.model)])
+
+    def get_text(self, instance, field):
+        """Text of the field to index; override for non-text fields"""
+        return getattr(instance, field) or ''
+
+    def update(self, instances):
+        self.backend.update(self, instances)
+
+    def delete(self, pks):
+        self.backend.delete(self, pks)
+
+    def rebuild(self, batch_size=1000):
+        return self.backend.rebuild(self, batch_size=batch_size)
+
+    def search(self, queryset, query):
+        """
+        Filters the queryset to objects matching the query and annotates
+        search_rank (higher is more relevant)
+        """
+        backend = get_search_backend(connections[queryset.db])
+        return backend.search(
+            self, queryset, parse_terms(query), get_search_settings()['MAX_RESULTS']
+        )
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -196,6 +198,88 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Кэш токенов аутентификации (apps.api_auth.authentication)
+# BACKEND: 'django' - общий кэш из CACHES[CACHE_ALIAS] (Redis), сброс виден всем процессам;
+# 'locmem' - LRU-кэш в памяти процесса (только для разработки в одном процессе)
+AUTH_TOKEN_CACHE = {
+    'BACKEND': 'django',
+    'CACHE_ALIAS': 'default',
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 300,  # секунды
+}
+
+# Отложенная запись last_active (apps.api_auth.activity)
+# BACKEND: 'redis' - общий буфер в REDIS_URL, сбрасывается задачей flush_last_active;
+# 'memory' - буфер в памяти процесса (только для разработки, сбрасывается из запросов)
+LAST_ACTIVE_TRACKING = {
+    'BACKEND': 'redis',
+    'STALENESS': 60,  # секунды, точность last_active
+    'FLUSH_INTERVAL': 30,  # секунды между сбросами буфера в базу
+}
+
+# Дерево комментариев постов (apps.feed.utils.CommentTree)
+FEED_COMMENT_TREE = {
+    'MAX_DEPTH': 5,  # уровней вложенности в ответе, включая верхний
+    'REPLIES_PER_LEVEL': 10,  # ответов на комментарий по умолчанию (?replies_limit=)
+    'MAX_REPLIES_PER_LEVEL': 50,
+}
+
+# Отложенная запись просмотров постов (apps.feed.view_tracking)
+# BACKEND: 'redis' - общие буфер и дедупликация в REDIS_URL, сброс задачей flush_post_views;
+# 'memory' - в памяти процесса (только для разработки, сброс фоновым потоком процесса)
+FEED_VIEW_TRACKING = {
+    'BACKEND': 'redis',
+    'DEDUPE_WINDOW': 3600,  # секунды, один просмотр от пользователя/IP на пост
+    'FLUSH_INTERVAL': 30,  # секунды между сбросами буфера в базу
+}
+
+# Полнотекстовый поиск (server.search)
+# BACKEND: 'auto' - по движку базы (SQLite FTS5 / PostgreSQL tsvector), 'basic' - без индекса
+FULL_TEXT_SEARCH = {
+    'BACKEND': 'auto',
+    'MAX_RESULTS': 1000,  # лучших совпадений среди прошедших фильтры, из которых строится выдача
+}
+
+# Трендовые теги и популярные посты (apps.feed.trending), кэш CACHES[CACHE_ALIAS]
+# Значение обновляет только задача refresh_feed_trending, запросы его читают
+FEED_TRENDING = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 3600,  # секунды, должно быть больше интервала refresh-feed-trending
+    'DAYS': 7,
+    'TAGS_LIMIT': 20,
+    'POPULAR_LIMIT': 100,
+}
+
+# Рекомендации друзей (apps.api.utils), кэш CACHES[CACHE_ALIAS] на пользователя
+FRIEND_RECOMMENDATIONS = {
+    'CACHE_ALIAS': 'default',
+    'FRESH_TIMEOUT': 300,  # секунды, после этого рейтинг пересчитывается в фоне
+    'STALE_TIMEOUT': 3600,  # секунды
+    'MAX_RESULTS': 50,
+}
+
+# Кэш множеств id друзей (apps.api.friend_graph), сбрасывается сигналами
+FRIEND_GRAPH = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 3600,  # секунды
+}
+
+# Глобальный лидерборд по монетам (apps.gamedification.leaderboard)
+# BACKEND: 'redis' - общий ZSET в REDIS_URL, 'memory' - рейтинг в памяти процесса
+# (только для разработки: пересобирается из базы каждые MEMORY_MAX_AGE секунд)
+LEADERBOARD = {
+    'BACKEND': 'redis',
+    'FRIENDS_CACHE_TIMEOUT': 600,  # секунды, кэш лидерборда друзей на пользователя
+}
+
+# Завершение розыгрышей (apps.gamedification.settlement)
+# ETA-задачи ставятся только розыгрышам, заканчивающимся в пределах ETA_HORIZON:
+# он должен быть больше интервала check-expired-giveaways и меньше visibility_timeout брокера
+GIVEAWAY_SETTLEMENT = {
+    'ETA_HORIZON': 1800,  # секунды
+    'CACHE_ALIAS': 'default',
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -221,17 +305,69 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Redis
+REDIS_URL = 'redis://localhost:6379/0'
+
+# Общий для веб-процессов и Celery кэш: значения, которые заполняют задачи
+# по расписанию и сбрасывают сигналы, видны всем процессам
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'kadio',
+    }
+}
+
 # Celery Configuration
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Неподтвержденные (в т.ч. ETA) задачи переотправляются через visibility_timeout,
+# он должен быть больше GIVEAWAY_SETTLEMENT['ETA_HORIZON']
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': 3600,  # секунды
+}
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_BEAT_SCHEDULE = {
     'check-expired-giveaways': {
         'task': 'apps.gamedification.tasks.check_expired_giveaways',
-        'schedule': 60.0,  # Проверяем каждую минуту
+        # Конкурсы завершаются ETA-задачами; здесь - страховка и постановка
+        # задач конкурсам, которые закончатся в пределах ETA_HORIZON
+        'schedule': 900.0,
+    },
+    'flush-last-active': {
+        'task': 'apps.api_auth.tasks.flush_last_active',
+        'schedule': 30.0,  # Сбрасываем буфер активности каждые 30 секунд
+    },
+    'flush-post-views': {
+        'task': 'apps.feed.tasks.flush_post_views',
+        'schedule': 30.0,  # Сохраняем буфер просмотров постов каждые 30 секунд
+    },
+    'refresh-feed-trending': {
+        'task': 'apps.feed.tasks.refresh_feed_trending',
+        'schedule': 300.0,  # Обновляем кэш трендов каждые 5 минут
+    },
+    'rebuild-user-similarity': {
+        'task': 'apps.feed.tasks.rebuild_user_similarity_task',
+        'schedule': 3600.0,  # Пересчитываем похожих пользователей раз в час
+    },
+    'rebuild-related-posts': {
+        'task': 'apps.feed.tasks.rebuild_related_posts_task',
+        'schedule': 86400.0,  # Полный пересчет похожих постов раз в сутки
+    },
+    'compute-post-recommendations': {
+        'task': 'apps.feed.tasks.compute_post_recommendations',
+        'schedule': 1800.0,  # Пересчитываем рекомендации каждые 30 минут
+    },
+    'rebuild-leaderboard': {
+        'task': 'apps.gamedification.tasks.rebuild_leaderboard',
+        'schedule': 3600.0,  # Сверяем лидерборд с базой раз в час
+    },
+    'snapshot-leaderboards': {
+        'task': 'apps.gamedification.tasks.snapshot_leaderboards',
+        'schedule': crontab(hour=23, minute=55),  # Итоги дня перед его окончанием
     },
 }